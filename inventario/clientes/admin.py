@@ -1,3 +1,22 @@
 from django.contrib import admin
 
+from inventario.admin_escalable import AdminEscalable
+from .models import Cliente
+
+
 # Register your models here.
+@admin.register(Cliente)
+class ClienteAdmin(AdminEscalable):
+    list_display = [
+        'apellido', 'nombre', 'documento', 'email', 'telefono', 'cantidad_compras', 'total_compras', 'ultima_compra',
+    ]
+    search_fields = ['=documento', '=email', '^apellido']
+    readonly_fields = ['cantidad_compras', 'total_compras', 'ultima_compra']
+    ordering = ['-id']
+    # Solo las columnas con índice (ver Cliente.Meta.indexes)
+    sortable_by = ['total_compras', 'cantidad_compras']
+
+    def has_delete_permission(self, request, obj=None):
+        # Borrar un cliente borra sus ventas en cascada y la confirmación
+        # lista cada una de ellas
+        return False
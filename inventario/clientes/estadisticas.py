@@ -0,0 +1,79 @@
+# -----------------------------------------------------------------------------
+# clientes/estadisticas.py
+# Estadísticas de compras de cada cliente guardadas en Cliente.
+# -----------------------------------------------------------------------------
+"""
+`total_compras`, `cantidad_compras` y `ultima_compra` se actualizan con un
+UPDATE atómico (F() y GREATEST) dentro de la misma transacción que registra
+la venta, así el listado de clientes ordena y filtra por esos campos sin
+agregar Venta en cada página.
+
+Las ventas que se borran o modifican por fuera de ese camino (el admin, por
+ejemplo) no se descuentan: `recalcular()` (comando
+recalcular_estadisticas_clientes) rehace los valores desde Venta.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from ventas.models import Venta
+from .models import Cliente
+
+TAMANIO_LOTE = 1000
+
+
+def registrar_ventas(ventas):
+    """Suma las ventas a las estadísticas de sus clientes (un UPDATE por cliente)."""
+    por_cliente = defaultdict(lambda: [Decimal(0), 0, None])
+    for venta in ventas:
+        acumulado = por_cliente[venta.cliente_id]
+        fecha = venta.fecha or timezone.localdate()
+        acumulado[0] += venta.total
+        acumulado[1] += 1
+        acumulado[2] = fecha if acumulado[2] is None else max(acumulado[2], fecha)
+
+    # En orden de id para que dos lotes concurrentes no se bloqueen mutuamente
+    for cliente_id in sorted(por_cliente):
+        total, cantidad, fecha = por_cliente[cliente_id]
+        Cliente.objects.filter(pk=cliente_id).update(
+            total_compras=F('total_compras') + total,
+            cantidad_compras=F('cantidad_compras') + cantidad,
+            # COALESCE porque en SQLite MAX() con un NULL devuelve NULL
+            ultima_compra=Greatest(Coalesce('ultima_compra', Value(fecha)), Value(fecha)),
+        )
+
+
+def registrar_venta(venta):
+    registrar_ventas([venta])
+
+
+def recalcular(tamanio_lote=TAMANIO_LOTE):
+    """Recalcula las estadísticas de todos los clientes desde Venta, por lotes de ids. Devuelve la cantidad."""
+    ventas = Venta.objects.filter(cliente=OuterRef('pk')).order_by().values('cliente')
+    total = ventas.annotate(v=Sum('total')).values('v')
+    cantidad = ventas.annotate(v=Count('pk')).values('v')
+    ultima = ventas.annotate(v=Max('fecha')).values('v')
+
+    procesados = 0
+    desde = 0
+    while True:
+        ids = list(
+            Cliente.objects.filter(pk__gt=desde).order_by('pk').values_list('pk', flat=True)[:tamanio_lote]
+        )
+        if not ids:
+            return procesados
+        with transaction.atomic():
+            Cliente.objects.filter(pk__in=ids).update(
+                total_compras=Coalesce(
+                    Subquery(total), Value(Decimal(0)),
+                    output_field=DecimalField(max_digits=14, decimal_places=2),
+                ),
+                cantidad_compras=Coalesce(Subquery(cantidad), Value(0)),
+                ultima_compra=Subquery(ultima),
+            )
+        procesados += len(ids)
+        desde = ids[-1]
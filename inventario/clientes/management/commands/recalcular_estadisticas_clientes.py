@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from clientes import estadisticas
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde las ventas el total comprado, la cantidad de compras y la última compra de cada cliente. '
+        'Corrige los desvíos por ventas borradas o editadas fuera del registro de ventas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=estadisticas.TAMANIO_LOTE, help='Clientes actualizados por transacción'
+        )
+
+    def handle(self, *args, **options):
+        procesados = estadisticas.recalcular(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Estadísticas recalculadas para {procesados} clientes.'))
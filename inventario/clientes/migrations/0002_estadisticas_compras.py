@@ -0,0 +1,89 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:38
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+INDICE_ULTIMA_COMPRA = models.Index(
+    models.OrderBy(models.F('ultima_compra'), descending=True, nulls_last=True),
+    models.OrderBy(models.F('id'), descending=True),
+    name='cliente_ultima_compra_idx',
+)
+
+
+def _indice_ultima_compra(schema_editor):
+    # SQLite no acepta NULLS LAST en un índice, pero en DESC ya deja los NULL al final
+    if schema_editor.connection.vendor == 'sqlite':
+        return models.Index(fields=['-ultima_compra', '-id'], name=INDICE_ULTIMA_COMPRA.name)
+    return INDICE_ULTIMA_COMPRA
+
+
+def crear_indice_ultima_compra(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('clientes', 'Cliente'), _indice_ultima_compra(schema_editor))
+
+
+def borrar_indice_ultima_compra(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('clientes', 'Cliente'), _indice_ultima_compra(schema_editor))
+
+
+def calcular_estadisticas(apps, schema_editor):
+    Cliente = apps.get_model('clientes', 'Cliente')
+    Venta = apps.get_model('ventas', 'Venta')
+    ventas = Venta.objects.filter(cliente=OuterRef('pk')).order_by().values('cliente')
+    Cliente.objects.update(
+        total_compras=Coalesce(
+            Subquery(ventas.annotate(v=Sum('total')).values('v')), Value(Decimal(0)),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+        cantidad_compras=Coalesce(Subquery(ventas.annotate(v=Count('pk')).values('v')), Value(0)),
+        ultima_compra=Subquery(ventas.annotate(v=Max('fecha')).values('v')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+        ('ventas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='cantidad_compras',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='total_compras',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='ultima_compra',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['-total_compras', '-id'], name='cliente_total_compras_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['-cantidad_compras', '-id'], name='cliente_cant_compras_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='cliente',
+                    index=INDICE_ULTIMA_COMPRA,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(crear_indice_ultima_compra, borrar_indice_ultima_compra),
+            ],
+        ),
+        migrations.RunPython(calcular_estadisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:11
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+INDICE_APELLIDO = models.Index(django.db.models.functions.text.Upper('apellido'), name='cliente_apellido_upper_idx')
+
+
+def _indice_apellido(schema_editor):
+    # Igual que producto_nombre_upper_idx: LIKE 'abc%' necesita text_pattern_ops
+    if schema_editor.connection.vendor == 'postgresql':
+        from django.contrib.postgres.indexes import OpClass
+        return models.Index(
+            OpClass(django.db.models.functions.text.Upper('apellido'), name='text_pattern_ops'),
+            name=INDICE_APELLIDO.name,
+        )
+    return INDICE_APELLIDO
+
+
+def crear_indice_apellido(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('clientes', 'Cliente'), _indice_apellido(schema_editor))
+
+
+def borrar_indice_apellido(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('clientes', 'Cliente'), _indice_apellido(schema_editor))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_estadisticas_compras'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='cliente',
+                    index=INDICE_APELLIDO,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(crear_indice_apellido, borrar_indice_apellido),
+            ],
+        ),
+    ]
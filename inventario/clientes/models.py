@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Upper
 
 class Cliente(models.Model):
     nombre = models.CharField(max_length=100)
@@ -8,5 +10,24 @@ class Cliente(models.Model):
     telefono = models.CharField(max_length=15, blank=True, null=True)
     direccion = models.TextField(blank=True, null=True)
 
+    # Estadísticas de compras, mantenidas por clientes/estadisticas.py al
+    # registrar cada venta (recalcular_estadisticas_clientes las rehace)
+    total_compras = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    cantidad_compras = models.PositiveIntegerField(default=0, editable=False)
+    ultima_compra = models.DateField(blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # El id desempata para que la paginación sea estable
+            models.Index(fields=['-total_compras', '-id'], name='cliente_total_compras_idx'),
+            models.Index(fields=['-cantidad_compras', '-id'], name='cliente_cant_compras_idx'),
+            # Los clientes sin compras van al final también en Postgres (en
+            # SQLite la migración crea el índice sin NULLS LAST)
+            models.Index(F('ultima_compra').desc(nulls_last=True), F('id').desc(), name='cliente_ultima_compra_idx'),
+            # Búsqueda del admin por prefijo del apellido (en Postgres con
+            # text_pattern_ops, ver la migración 0003)
+            models.Index(Upper('apellido'), name='cliente_apellido_upper_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nombre} {self.apellido} - {self.documento}"
\ No newline at end of file
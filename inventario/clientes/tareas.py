@@ -0,0 +1,9 @@
+# Tareas en segundo plano de clientes (ver tareas/cola.py)
+from tareas.cola import tarea
+
+from . import estadisticas
+
+
+@tarea()
+def recalcular_estadisticas():
+    return {'clientes': estadisticas.recalcular()}
@@ -1,3 +1,57 @@
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from productos.models import Producto
+from ventas import registro
+from . import estadisticas
+from .models import Cliente
+
+
+class EstadisticasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ana = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='1', email='ana@example.com')
+        self.luis = Cliente.objects.create(nombre='Luis', apellido='Gómez', documento='2', email='luis@example.com')
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='1 kg', precio=Decimal('10.00'), stock=10)
+
+    def vender(self, codigo, cliente, cantidad):
+        return registro.registrar_lote([{
+            'codigo': codigo, 'cliente': cliente.pk,
+            'items': [{'producto': self.producto.pk, 'cantidad': cantidad, 'precio_unitario': '10.00'}],
+        }])[0]
+
+    def test_las_ventas_suman_a_las_estadisticas(self):
+        self.vender('A1', self.ana, 2)
+        self.vender('A2', self.ana, 1)
+        self.ana.refresh_from_db()
+        self.assertEqual(self.ana.total_compras, Decimal('30.00'))
+        self.assertEqual(self.ana.cantidad_compras, 2)
+        self.assertEqual(self.ana.ultima_compra, timezone.localdate())
+
+    def test_una_venta_duplicada_no_suma(self):
+        self.vender('A1', self.ana, 2)
+        self.assertEqual(self.vender('A1', self.ana, 2)['estado'], registro.DUPLICADA)
+        self.ana.refresh_from_db()
+        self.assertEqual(self.ana.cantidad_compras, 1)
+
+    def test_recalcular(self):
+        self.vender('A1', self.ana, 2)
+        Cliente.objects.update(total_compras=0, cantidad_compras=0)
+        estadisticas.recalcular()
+        self.ana.refresh_from_db()
+        self.assertEqual((self.ana.total_compras, self.ana.cantidad_compras), (Decimal('20.00'), 1))
 
-# Create your tests here.
+    def test_filtro_por_total_minimo(self):
+        self.vender('A1', self.ana, 2)
+        url = reverse('lista_clientes')
+        respuesta = self.client.get(url, {'total_minimo': '15'})
+        self.assertEqual(list(respuesta.context['clientes']), [self.ana])
+        # Un valor que no es un número finito no filtra
+        for valor in ('NaN', 'Infinity', 'abc'):
+            respuesta = self.client.get(url, {'total_minimo': valor})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(len(respuesta.context['clientes']), 2)
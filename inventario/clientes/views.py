@@ -1,6 +1,9 @@
+from decimal import Decimal, InvalidOperation
+
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
-from django.db.models import Q
+from django.db.models import F, Q
+from django.utils.dateparse import parse_date
 from .models import Cliente
 from .forms import ClienteForm
 
@@ -10,6 +13,14 @@ class ClienteListView(ListView):
     context_object_name = 'clientes'
     paginate_by = 10
 
+    # Cada orden usa uno de los índices de Cliente; el id desempata
+    ORDENES = {
+        'nombre': ('Nombre', ['apellido', 'nombre', 'id']),
+        'total': ('Mayor total comprado', ['-total_compras', '-id']),
+        'compras': ('Más compras', ['-cantidad_compras', '-id']),
+        'reciente': ('Compra más reciente', [F('ultima_compra').desc(nulls_last=True), F('id').desc()]),
+    }
+
     def get_queryset(self):
         queryset = super().get_queryset()
         q = self.request.GET.get('q')
@@ -17,7 +28,36 @@ class ClienteListView(ListView):
             queryset = queryset.filter(
                 Q(nombre__icontains=q) | Q(apellido__icontains=q) | Q(documento__icontains=q)
             )
-        return queryset
+
+        # Filtros sobre las estadísticas de compras (clientes/estadisticas.py)
+        try:
+            minimo = Decimal(self.request.GET.get('total_minimo') or 0)
+            # NaN e Infinity son Decimal válidos pero no sirven de filtro
+            if not minimo.is_finite() or minimo <= 0:
+                minimo = None
+        except InvalidOperation:
+            minimo = None
+        if minimo is not None:
+            queryset = queryset.filter(total_compras__gte=minimo)
+        try:
+            desde = parse_date(self.request.GET.get('compro_desde') or '')
+        except ValueError:
+            desde = None
+        if desde:
+            queryset = queryset.filter(ultima_compra__gte=desde)
+
+        _, orden = self.ORDENES.get(self.request.GET.get('orden'), self.ORDENES['nombre'])
+        return queryset.order_by(*orden)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['ordenes'] = [(clave, etiqueta) for clave, (etiqueta, _) in self.ORDENES.items()]
+        context['orden'] = self.request.GET.get('orden') if self.request.GET.get('orden') in self.ORDENES else 'nombre'
+        # Mantener filtros y orden en la paginación
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['querystring'] = params.urlencode()
+        return context
 
 class ClienteCreateView(CreateView):
     model = Cliente
@@ -0,0 +1,75 @@
+# -----------------------------------------------------------------------------
+# inventario/admin_escalable.py
+# Base para los ModelAdmin de tablas con millones de filas.
+# -----------------------------------------------------------------------------
+"""
+El admin de Django, tal como viene, recorre la tabla entera más de una vez
+por página: un COUNT(*) para el total filtrado, otro para el total sin
+filtrar y una búsqueda con `icontains` que ningún índice resuelve.
+AdminEscalable cambia eso:
+
+- `show_full_result_count = False`: no cuenta la tabla sin filtrar.
+- PaginadorEstimado: sin filtros ni búsqueda, el total de la paginación sale
+  de las estadísticas de Postgres en lugar de un COUNT(*). El número de la
+  última página es aproximado.
+- Búsqueda por índice: '=campo' compara el término completo por igualdad y
+  '^campo' por prefijo sin distinguir mayúsculas (en Postgres lo resuelve un
+  índice sobre UPPER(campo)). El término no se parte en palabras y los
+  campos se combinan con OR.
+
+Cada admin define además `ordering` sobre una columna indexada: el admin
+siempre ordena y, si no, lo hace por el `Meta.ordering` del modelo.
+"""
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Por debajo de esto se cuenta de verdad: es barato y evita depender de
+# estadísticas de una tabla que todavía no se analizó
+UMBRAL_ESTIMACION = 100_000
+
+
+def estimar_filas(queryset):
+    """
+    Cantidad aproximada de filas de la tabla según pg_class.reltuples (suma
+    las particiones si la tabla está particionada). None si el queryset
+    está filtrado, la base no es Postgres o la tabla es chica.
+    """
+    conexion = connections[queryset.db]
+    if conexion.vendor != 'postgresql' or queryset.query.where or queryset.query.distinct:
+        return None
+    tabla = queryset.model._meta.db_table
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT SUM(GREATEST(reltuples, 0)) FROM pg_class WHERE oid = %s::regclass"
+            " OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+            [tabla, tabla],
+        )
+        estimado = int(cursor.fetchone()[0] or 0)
+    return estimado if estimado >= UMBRAL_ESTIMACION else None
+
+
+class PaginadorEstimado(Paginator):
+    @cached_property
+    def count(self):
+        estimado = estimar_filas(self.object_list)
+        return super().count if estimado is None else estimado
+
+
+class AdminEscalable(admin.ModelAdmin):
+    show_full_result_count = False
+    paginator = PaginadorEstimado
+
+    def get_search_results(self, request, queryset, search_term):
+        termino = search_term.strip()
+        campos = self.get_search_fields(request)
+        if not termino or not all(campo[0] in '=^' for campo in campos):
+            return super().get_search_results(request, queryset, search_term)
+        condicion = Q()
+        for campo in campos:
+            lookup = 'exact' if campo[0] == '=' else 'istartswith'
+            condicion |= Q(**{f'{campo[1:]}__{lookup}': termino})
+        # Los campos de búsqueda siguen FK, nunca M2M: no hay duplicados
+        return queryset.filter(condicion), False
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventario.settings')
 
 application = get_asgi_application()
+
+# Índice de SKU en memoria para los lectores de código de barras
+from productos.sku_index import calentar  # noqa: E402
+
+calentar()
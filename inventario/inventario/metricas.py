@@ -0,0 +1,156 @@
+# -----------------------------------------------------------------------------
+# inventario/metricas.py
+# Métricas en formato Prometheus: latencia por ruta, consultas, stock y ventas.
+# -----------------------------------------------------------------------------
+"""
+Las métricas se exponen en /metrics en formato de texto de Prometheus.
+
+Con varios procesos (gunicorn, uwsgi) hay que definir la variable de entorno
+PROMETHEUS_MULTIPROC_DIR apuntando a un directorio vacío antes de arrancar:
+cada proceso escribe sus valores en archivos mapeados en memoria y /metrics
+suma los de todos. Sin la variable los valores viven en el propio proceso
+(alcanza con runserver).
+
+/metrics solo responde a usuarios staff con sesión o, si METRICAS_TOKEN está
+configurado, a quien mande la cabecera `Authorization: Bearer <token>` (así
+lo consulta Prometheus).
+
+Las ventas y operaciones de stock se cuentan al confirmarse la transacción:
+una venta que se revierte no suma.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+LATENCIA = Histogram(
+    'inventario_http_request_duration_seconds', 'Duración de las peticiones por ruta',
+    ['ruta', 'metodo', 'estado'],
+)
+CONSULTAS = Histogram(
+    'inventario_http_db_queries', 'Consultas SQL por petición',
+    ['ruta'], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+OPERACIONES_STOCK = Counter(
+    'inventario_stock_operaciones', 'Operaciones de stock por tipo de movimiento', ['tipo'],
+)
+UNIDADES_STOCK = Counter(
+    'inventario_stock_unidades', 'Unidades movidas por tipo de movimiento', ['tipo'],
+)
+VENTAS = Counter('inventario_ventas', 'Ventas registradas', ['origen'])
+ITEMS_POR_VENTA = Histogram(
+    'inventario_items_por_venta', 'Items por venta', buckets=(1, 2, 3, 5, 10, 20, 50),
+)
+PROCESAMIENTO_IMAGEN = Histogram(
+    'inventario_procesamiento_imagen_seconds', 'Duración del redimensionado de imágenes de productos',
+)
+CACHE = Counter('inventario_cache_consultas', 'Lecturas de caché por resultado', ['cache', 'resultado'])
+TAREAS = Counter('inventario_tareas', 'Ejecuciones de tareas en segundo plano por resultado', ['tarea', 'estado'])
+DURACION_TAREAS = Histogram(
+    'inventario_tareas_duracion_seconds', 'Duración de las tareas en segundo plano', ['tarea'],
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900),
+)
+
+
+# -----------------------------------------------------------------------------
+# Registro desde el código de la aplicación
+# -----------------------------------------------------------------------------
+def _al_confirmar(funcion):
+    # Fuera de una transacción on_commit ejecuta en el momento
+    transaction.on_commit(funcion, robust=True)
+
+
+def registrar_stock(tipo, cantidad):
+    def registrar():
+        OPERACIONES_STOCK.labels(tipo).inc()
+        UNIDADES_STOCK.labels(tipo).inc(abs(cantidad))
+    _al_confirmar(registrar)
+
+
+def registrar_venta(origen, cantidad_items):
+    def registrar():
+        VENTAS.labels(origen).inc()
+        ITEMS_POR_VENTA.observe(cantidad_items)
+    _al_confirmar(registrar)
+
+
+def registrar_cache(nombre, acierto):
+    CACHE.labels(nombre, 'acierto' if acierto else 'fallo').inc()
+
+
+def registrar_tarea(nombre, estado, segundos):
+    TAREAS.labels(nombre, estado).inc()
+    DURACION_TAREAS.labels(nombre).observe(segundos)
+
+
+# -----------------------------------------------------------------------------
+# Middleware
+# -----------------------------------------------------------------------------
+class _ContadorConsultas:
+    def __init__(self):
+        self.cantidad = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.cantidad += 1
+        return execute(sql, params, many, context)
+
+
+def _ruta(request):
+    # El patrón de la URL y no la ruta concreta, para no crear una serie por id
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return 'sin_ruta'
+    return coincidencia.view_name or coincidencia.route
+
+
+class MetricasMiddleware:
+    """Va primero en MIDDLEWARE para medir la petición completa."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path == '/metrics':
+            return self.get_response(request)
+
+        contador = _ContadorConsultas()
+        inicio = time.perf_counter()
+        estado = 500
+        try:
+            with connections['default'].execute_wrapper(contador):
+                response = self.get_response(request)
+            estado = response.status_code
+            return response
+        finally:
+            ruta = _ruta(request)
+            LATENCIA.labels(ruta, request.method, str(estado)).observe(time.perf_counter() - inicio)
+            CONSULTAS.labels(ruta).observe(contador.cantidad)
+
+
+# -----------------------------------------------------------------------------
+# Vista
+# -----------------------------------------------------------------------------
+def _autorizado(request):
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_active and usuario.is_staff:
+        return True
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    return bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}")
+
+
+def vista_metricas(request):
+    if not _autorizado(request):
+        return HttpResponse(status=401)
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return HttpResponse(generate_latest(registro), content_type=CONTENT_TYPE_LATEST)
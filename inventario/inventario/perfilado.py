@@ -0,0 +1,262 @@
+# -----------------------------------------------------------------------------
+# inventario/perfilado.py
+# Perfilado opcional de peticiones: muestras de pila, cProfile y consultas SQL.
+# -----------------------------------------------------------------------------
+"""
+Una petición se perfila si la pide un usuario staff (cabecera
+`X-Perfilar: 1` o parámetro `?_perfilar=1`; `cprofile` en lugar de `1` usa
+cProfile) o si sale sorteada según PERFILES_MUESTREO (0.0 = nunca).
+
+Mientras dura la petición un hilo toma muestras de la pila del hilo que la
+atiende cada PERFILES_INTERVALO_MS milisegundos y se registran todas las
+consultas SQL con su momento de inicio y duración. El perfil se guarda como
+JSON en PERFILES_DIR; se conservan como mucho PERFILES_MAXIMO archivos y
+ninguno más viejo que PERFILES_DIAS días.
+
+Las pilas se pueden descargar en formato "collapsed" (una línea por pila,
+`marco;marco;marco cantidad`), que leen flamegraph.pl y speedscope.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO = getattr(settings, 'PERFILES_DIR', os.path.join(settings.BASE_DIR, 'perfiles'))
+MUESTREO = getattr(settings, 'PERFILES_MUESTREO', 0.0)
+INTERVALO = getattr(settings, 'PERFILES_INTERVALO_MS', 5) / 1000
+MAXIMO = getattr(settings, 'PERFILES_MAXIMO', 200)
+DIAS = getattr(settings, 'PERFILES_DIAS', 7)
+MAX_CONSULTAS = 1000
+PREFIJO_EXCLUIDO = '/perfiles/'
+
+
+# -----------------------------------------------------------------------------
+# Captura
+# -----------------------------------------------------------------------------
+class Muestreador(threading.Thread):
+    """Toma muestras periódicas de la pila de otro hilo."""
+
+    def __init__(self, hilo_id, intervalo):
+        super().__init__(daemon=True)
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self.detener = threading.Event()
+
+    def run(self):
+        while not self.detener.wait(self.intervalo):
+            marco = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}:{marco.f_lineno}")
+                marco = marco.f_back
+            if pila:
+                self.pilas[";".join(reversed(pila))] += 1
+
+
+class RegistroSql:
+    """execute_wrapper que anota cada consulta con su inicio y duración (ms)."""
+
+    def __init__(self, inicio):
+        self.inicio = inicio
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        comienzo = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.consultas) < MAX_CONSULTAS:
+                self.consultas.append({
+                    'inicio_ms': round((comienzo - self.inicio) * 1000, 2),
+                    'duracion_ms': round((time.perf_counter() - comienzo) * 1000, 2),
+                    'alias': context['connection'].alias,
+                    'sql': sql[:1000],
+                })
+
+
+def _modo(request):
+    pedido = request.headers.get('X-Perfilar') or request.GET.get('_perfilar')
+    if pedido and getattr(request, 'user', None) is not None and request.user.is_staff:
+        return 'cprofile' if pedido == 'cprofile' else 'muestras'
+    if MUESTREO and random.random() < MUESTREO:
+        return 'muestras'
+    return None
+
+
+class PerfiladoMiddleware:
+    """Debe ir después de AuthenticationMiddleware para saber si el usuario es staff."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        modo = None if request.path.startswith(PREFIJO_EXCLUIDO) else _modo(request)
+        if modo is None:
+            return self.get_response(request)
+
+        inicio = time.perf_counter()
+        sql = RegistroSql(inicio)
+        muestreador = Muestreador(threading.get_ident(), INTERVALO)
+        perfil_c = cProfile.Profile() if modo == 'cprofile' else None
+
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(sql))
+            muestreador.start()
+            if perfil_c:
+                perfil_c.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if perfil_c:
+                    perfil_c.disable()
+                muestreador.detener.set()
+                muestreador.join()
+
+        duracion = time.perf_counter() - inicio
+        try:
+            guardar({
+                'id': uuid.uuid4().hex,
+                'fecha': timezone.now().isoformat(),
+                'metodo': request.method,
+                'ruta': request.get_full_path()[:500],
+                'estado': response.status_code,
+                'usuario': request.user.get_username() if request.user.is_authenticated else None,
+                'modo': modo,
+                'duracion_ms': round(duracion * 1000, 2),
+                'intervalo_ms': INTERVALO * 1000,
+                'muestras': dict(muestreador.pilas),
+                'sql': sql.consultas,
+                'cprofile': _resumen_cprofile(perfil_c) if perfil_c else None,
+            })
+        except OSError as e:
+            logger.warning("No se pudo guardar el perfil de %s: %s", request.path, e)
+        return response
+
+
+def _resumen_cprofile(perfil, limite=60):
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(limite)
+    return salida.getvalue()
+
+
+# -----------------------------------------------------------------------------
+# Almacenamiento
+# -----------------------------------------------------------------------------
+def _ruta(perfil_id):
+    if not perfil_id.isalnum():
+        raise Http404
+    return os.path.join(DIRECTORIO, f"{perfil_id}.json")
+
+
+def guardar(perfil):
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    ruta = _ruta(perfil['id'])
+    with open(f"{ruta}.tmp", 'w', encoding='utf-8') as archivo:
+        json.dump(perfil, archivo)
+    os.replace(f"{ruta}.tmp", ruta)
+    purgar()
+
+
+def _archivos():
+    """[(mtime, ruta)] de los perfiles guardados, del más nuevo al más viejo."""
+    try:
+        nombres = [n for n in os.listdir(DIRECTORIO) if n.endswith('.json')]
+    except FileNotFoundError:
+        return []
+    archivos = []
+    for nombre in nombres:
+        ruta = os.path.join(DIRECTORIO, nombre)
+        try:
+            archivos.append((os.path.getmtime(ruta), ruta))
+        except FileNotFoundError:
+            pass
+    return sorted(archivos, reverse=True)
+
+
+def purgar():
+    limite = time.time() - DIAS * 86400
+    for posicion, (mtime, ruta) in enumerate(_archivos()):
+        if posicion >= MAXIMO or mtime < limite:
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+
+def cargar(perfil_id):
+    try:
+        with open(_ruta(perfil_id), encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        raise Http404("Perfil no encontrado")
+
+
+def pilas_colapsadas(perfil):
+    return "".join(
+        f"{pila} {cantidad}\n"
+        for pila, cantidad in sorted(perfil['muestras'].items(), key=lambda item: -item[1])
+    )
+
+
+# -----------------------------------------------------------------------------
+# Vistas (solo staff)
+# -----------------------------------------------------------------------------
+@staff_member_required
+def lista_perfiles(request):
+    perfiles = []
+    for _, ruta in _archivos():
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                perfil = json.load(archivo)
+        except (OSError, ValueError):
+            continue
+        resumen = {
+            clave: perfil.get(clave)
+            for clave in ('id', 'fecha', 'metodo', 'ruta', 'estado', 'usuario', 'modo', 'duracion_ms')
+        }
+        resumen['consultas'] = len(perfil.get('sql', []))
+        resumen['total_muestras'] = sum(perfil.get('muestras', {}).values())
+        perfiles.append(resumen)
+    return render(request, 'perfiles/lista.html', {'perfiles': perfiles})
+
+
+@staff_member_required
+def detalle_perfil(request, perfil_id):
+    perfil = cargar(perfil_id)
+    consultas = perfil.get('sql', [])
+    return render(request, 'perfiles/detalle.html', {
+        'perfil': perfil,
+        'consultas': consultas,
+        'tiempo_sql_ms': round(sum(c['duracion_ms'] for c in consultas), 2),
+        'pilas': sorted(perfil['muestras'].items(), key=lambda item: -item[1])[:30],
+    })
+
+
+@staff_member_required
+def pilas_perfil(request, perfil_id):
+    """Pilas en formato collapsed, para flamegraph.pl o speedscope."""
+    perfil = cargar(perfil_id)
+    response = HttpResponse(pilas_colapsadas(perfil), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="perfil_{perfil_id}.folded"'
+    return response
@@ -0,0 +1,76 @@
+# -----------------------------------------------------------------------------
+# inventario/seguimiento.py
+# Seguimiento de campos modificados para que save() escriba solo lo que cambió.
+# -----------------------------------------------------------------------------
+"""
+Un modelo con SeguimientoCambiosMixin recuerda los valores con los que se
+leyó de la base. Al guardar una instancia existente sin `update_fields`, el
+mixin lo completa con los campos que cambiaron desde entonces; si no cambió
+ninguno, Django no ejecuta el UPDATE (ni envía pre_save/post_save).
+
+- CAMPOS_SIEMPRE: se agregan a todo UPDATE (auto_now, números de cambio
+  asignados en pre_save), también cuando se pasa `update_fields` a mano.
+- CAMPOS_EXCLUIDOS: nunca los escribe un save() de una instancia existente
+  porque los mantiene otro código con update() (por ejemplo, el stock).
+
+Las instancias nuevas y las construidas a mano con un pk (sin leerlas) se
+guardan completas, como siempre.
+"""
+from django.db import models
+
+
+class SeguimientoCambiosMixin:
+    CAMPOS_SIEMPRE = ()
+    CAMPOS_EXCLUIDOS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia.marcar_guardado()
+        return instancia
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if hasattr(self, '_valores_cargados'):
+            self.marcar_guardado(fields)
+
+    def _valor(self, campo):
+        # Sin pasar por el descriptor: los diferidos no se cargan y las
+        # imágenes se comparan por nombre de archivo
+        valor = self.__dict__.get(campo.attname)
+        if isinstance(campo, models.FileField):
+            valor = getattr(valor, 'name', valor) or None
+        return valor
+
+    def marcar_guardado(self, nombres=None):
+        """Toma los valores actuales como los guardados (todos o solo `nombres`)."""
+        valores = getattr(self, '_valores_cargados', {})
+        for campo in self._meta.concrete_fields:
+            if campo.attname in self.__dict__ and (nombres is None or campo.name in nombres or campo.attname in nombres):
+                valores[campo.attname] = self._valor(campo)
+        self._valores_cargados = valores
+
+    def campos_modificados(self):
+        """Nombres de los campos que cambiaron desde la lectura; None si la instancia no se leyó de la base."""
+        cargados = getattr(self, '_valores_cargados', None)
+        if cargados is None or self._state.adding:
+            return None
+        return [
+            campo.name for campo in self._meta.concrete_fields
+            if not campo.primary_key
+            and campo.name not in self.CAMPOS_EXCLUIDOS
+            and campo.attname in cargados
+            and self._valor(campo) != cargados[campo.attname]
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            campos = kwargs.get('update_fields')
+            if campos is None:
+                campos = self.campos_modificados()
+            if campos:
+                campos = list(campos) + [c for c in self.CAMPOS_SIEMPRE if c not in campos]
+            if campos is not None:
+                kwargs['update_fields'] = campos
+        super().save(*args, **kwargs)
+        self.marcar_guardado()
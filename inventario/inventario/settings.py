@@ -44,12 +44,15 @@ INSTALLED_APPS = [
     'productos',
     'clientes',
     'ventas',
+    'tareas',
     'allauth',
     'allauth.account',
     'allauth.socialaccount',
 ]
 
 MIDDLEWARE = [
+    # Métricas de latencia y consultas por ruta (ver inventario/metricas.py)
+    'inventario.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # allauth middleware required for account handling
@@ -59,6 +62,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Perfilado opcional de peticiones (ver inventario/perfilado.py)
+    'inventario.perfilado.PerfiladoMiddleware',
 ]
 
 ROOT_URLCONF = 'inventario.urls'
@@ -165,3 +170,77 @@ ACCOUNT_ALLOW_REGISTRATION = False
 # Redirects
 LOGIN_REDIRECT_URL = '/'
 LOGIN_URL = 'account_login'
+
+# Stock fragmentado (productos muy vendidos)
+# Cantidad de sub-contadores que se crean al activar el modo fragmentado
+STOCK_SHARDS_POR_DEFECTO = int(os.environ.get('STOCK_SHARDS_POR_DEFECTO', 8))
+# Segundos que se cachea la suma de los fragmentos
+STOCK_SHARDS_CACHE_TTL = 2
+
+# Índice de SKU en memoria (productos/sku_index.py)
+# Segundos que un proceso responde desde su copia antes de buscar cambios en la base
+SKU_INDEX_TTL = 2
+
+# Reservas de stock de las ventas en curso (productos/reservas.py)
+# Minutos que dura una reserva desde la última modificación de la línea
+RESERVAS_MINUTOS = 10
+
+# Archivo de movimientos de stock (manage.py archivar_movimientos)
+# Meses de movimientos que quedan en la base; los anteriores se pasan a archivos
+MOVIMIENTOS_MESES_ACTIVOS = int(os.environ.get('MOVIMIENTOS_MESES_ACTIVOS', 24))
+MOVIMIENTOS_ARCHIVO_DIR = Path(os.environ.get('MOVIMIENTOS_ARCHIVO_DIR', BASE_DIR / 'archivo'))
+
+# Cálculo de stock mínimo sugerido (manage.py calcular_stock_minimo)
+# Días que tarda en llegar la mercadería desde que se pide
+REPOSICION_LEAD_TIME_DIAS = 7
+# Probabilidad de no quedarse sin stock mientras se espera la reposición
+REPOSICION_NIVEL_SERVICIO = 0.95
+
+# Panel de control (productos/kpis.py)
+# Fragmentos de VentaProductoDia: reparte las sumas concurrentes entre varias filas
+KPI_SHARDS = 8
+# Frecuencia de las tareas periódicas del panel (las encola run_workers):
+# consolidación de los deltas de indicadores y recálculo completo
+KPI_CONSOLIDAR_SEGUNDOS = 60
+KPI_RECALCULO_HORAS = 24
+# Segundos que se cachea el resumen de indicadores del panel
+KPI_CACHE_TTL = 30
+
+# Stock en vivo (productos/en_vivo.py): se releen los productos modificados en
+# los últimos segundos, por las transacciones que confirman fuera de orden.
+# El feed de cambios (productos/cambios.py) no depende del reloj
+CAMBIOS_MARGEN_SEGUNDOS = 2
+
+# Perfilado de peticiones (inventario/perfilado.py)
+# Fracción de peticiones que se perfilan sin pedirlo (0.0 = solo a pedido de staff)
+PERFILES_MUESTREO = float(os.environ.get('PERFILES_MUESTREO', '0'))
+# Milisegundos entre muestras de la pila
+PERFILES_INTERVALO_MS = 5
+PERFILES_DIR = os.environ.get('PERFILES_DIR', str(BASE_DIR / 'perfiles'))
+# Retención: cantidad máxima de perfiles y días que se conservan
+PERFILES_MAXIMO = 200
+PERFILES_DIAS = 7
+
+# Métricas Prometheus (inventario/metricas.py)
+# Sin token, /metrics solo responde a usuarios staff; con token, también a
+# "Authorization: Bearer <token>"
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+
+# Stock en vivo por Server-Sent Events (productos/en_vivo.py, requiere ASGI)
+# Segundos entre consultas de cambios; los cambios del intervalo se agrupan en un evento
+EN_VIVO_INTERVALO = 1.0
+
+# Tareas en segundo plano (tareas/cola.py, comando run_workers)
+# Procesos trabajadores por defecto de run_workers
+TAREAS_PROCESOS = int(os.environ.get('TAREAS_PROCESOS', 2))
+# Ejecuta las tareas al encolarlas, sin trabajadores (desarrollo)
+TAREAS_INMEDIATAS = os.environ.get('TAREAS_INMEDIATAS', '0') == '1'
+# Primer espera antes de reintentar una tarea fallida; se duplica en cada intento
+TAREAS_ESPERA_REINTENTO = 10
+# Cada cuántos segundos el trabajador renueva el latido de la tarea que ejecuta
+TAREAS_LATIDO = 30
+# Una tarea en curso sin latido por más de estos segundos se da por abandonada
+# (el trabajador se cayó) y vuelve a la cola
+TAREAS_TIEMPO_MAXIMO = 300
+# Días que se conservan las tareas terminadas
+TAREAS_DIAS_RETENCION = 14
@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from prometheus_client import REGISTRY
+
+from clientes.models import Cliente
+from productos import stock
+from productos.models import Producto
+from ventas.models import ItemVenta, Venta
+from . import metricas, perfilado
+
+
+class PerfiladoTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+    def test_staff_pide_el_perfil(self):
+        with mock.patch.object(perfilado, 'DIRECTORIO', self.directorio):
+            respuesta = self.client.get('/admin/', HTTP_X_PERFILAR='1')
+            self.assertEqual(respuesta.status_code, 200)
+            perfil_id = os.listdir(self.directorio)[0].removesuffix('.json')
+            perfil = perfilado.cargar(perfil_id)
+        self.assertEqual((perfil['ruta'], perfil['modo'], perfil['usuario']), ('/admin/', 'muestras', 'staff'))
+        self.assertTrue(perfil['sql'])
+
+    def test_sin_pedirlo_no_perfila(self):
+        with mock.patch.object(perfilado, 'DIRECTORIO', self.directorio):
+            self.client.get('/admin/')
+        self.assertEqual(os.listdir(self.directorio), [])
+
+    def test_si_no_puede_guardar_lo_registra_y_responde(self):
+        with mock.patch.object(perfilado, 'guardar', side_effect=OSError("disco lleno")):
+            with self.assertLogs('inventario.perfilado', 'WARNING') as registro:
+                respuesta = self.client.get('/admin/', HTTP_X_PERFILAR='1')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn("disco lleno", registro.output[0])
+
+
+class MetricasTests(TestCase):
+    def ventas(self):
+        return REGISTRY.get_sample_value('inventario_ventas_total', {'origen': 'prueba'}) or 0
+
+    def test_anonimo_y_usuario_comun_no_acceden(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+    def test_staff_con_sesion(self):
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        respuesta = self.client.get('/metrics')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn(b'inventario_http_request_duration_seconds', respuesta.content)
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro').status_code, 401)
+
+    def test_sin_token_configurado_no_acepta_ninguno(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 401)
+
+    def test_las_ventas_se_cuentan_al_confirmar(self):
+        antes = self.ventas()
+        with self.captureOnCommitCallbacks(execute=True):
+            metricas.registrar_venta('prueba', 2)
+            self.assertEqual(self.ventas(), antes)
+        self.assertEqual(self.ventas(), antes + 1)
+
+    def test_una_venta_revertida_no_suma(self):
+        antes = self.ventas()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    metricas.registrar_venta('prueba', 2)
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(self.ventas(), antes)
+
+
+class SeguimientoCambiosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        creado = Producto.objects.create(nombre='Yerba', descripcion='1 kg', precio=Decimal('10.00'), stock=10)
+        self.producto = Producto.objects.get(pk=creado.pk)
+
+    def updates(self, instancia):
+        with CaptureQueriesContext(connection) as consultas:
+            instancia.save()
+        prefijo = f'UPDATE "{instancia._meta.db_table}"'
+        return [c['sql'] for c in consultas.captured_queries if c['sql'].startswith(prefijo)]
+
+    def test_escribe_solo_los_campos_modificados(self):
+        self.producto.precio = Decimal('12.00')
+        with mock.patch.object(Producto, 'programar_procesamiento_imagen') as procesar:
+            sql, = self.updates(self.producto)
+        self.assertIn('"precio"', sql)
+        self.assertIn('"version"', sql)
+        self.assertNotIn('"nombre"', sql)
+        self.assertNotIn('"imagen"', sql)
+        procesar.assert_not_called()
+
+    def test_sin_cambios_no_escribe(self):
+        with self.assertNumQueries(0):
+            self.producto.save()
+
+    def test_no_pisa_el_stock_que_cambio_otro_camino(self):
+        stock.decrementar(Producto.objects.get(pk=self.producto.pk), 4)
+        self.producto.stock = 99
+        self.producto.nombre = 'Yerba mate'
+        self.producto.save()
+        self.assertEqual(Producto.objects.get(pk=self.producto.pk).stock, 6)
+
+    def test_item_de_venta_recalcula_el_subtotal(self):
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='1', email='ana@example.com')
+        venta = Venta.objects.create(codigo='V1', cliente=cliente)
+        creado = ItemVenta.objects.create(venta=venta, producto=self.producto, cantidad=1, precio_unitario=5)
+        item = ItemVenta.objects.get(pk=creado.pk)
+        item.cantidad = 3
+        sql, = self.updates(item)
+        self.assertIn('"subtotal"', sql)
+        self.assertNotIn('"precio_unitario"', sql)
+        self.assertEqual(ItemVenta.objects.get(pk=item.pk).subtotal, Decimal('15.00'))
@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from . import metricas, perfilado
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,6 +26,11 @@ urlpatterns = [
     path("", include("productos.urls")),
     path("clientes/", include("clientes.urls")),
     path("ventas/", include("ventas.urls")),
+    path("tareas/", include("tareas.urls")),
+    path("metrics", metricas.vista_metricas, name="metricas"),
+    path("perfiles/", perfilado.lista_perfiles, name="lista_perfiles"),
+    path("perfiles/<str:perfil_id>/", perfilado.detalle_perfil, name="detalle_perfil"),
+    path("perfiles/<str:perfil_id>/pilas/", perfilado.pilas_perfil, name="pilas_perfil"),
 ]
 
 if settings.DEBUG:
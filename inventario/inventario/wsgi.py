@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventario.settings')
 
 application = get_wsgi_application()
+
+# Índice de SKU en memoria para los lectores de código de barras
+from productos.sku_index import calentar  # noqa: E402
+
+calentar()
@@ -1,9 +1,202 @@
-from django.contrib import admin
-from .models import Producto
+from django.contrib import admin, messages
+from django.db.models import F, Q
+from django.template.response import TemplateResponse
+from inventario.admin_escalable import AdminEscalable
+from .forms import AjustePreciosForm
+from .models import (
+    Deposito, HistorialPrecio, MovimientoStock, Producto, StockDeposito, ValuacionMensual, ValuacionProducto,
+)
+from . import bajas, precios, stock
+
+
+class RangoStockFilter(admin.SimpleListFilter):
+    """Rangos fijos: filtrar por el campo crea una opción por cada valor de stock distinto."""
+    title = "stock"
+    parameter_name = 'rango_stock'
+    RANGOS = {
+        'sin': ("Sin stock", Q(stock__lte=0)),
+        'bajo': ("Bajo el mínimo", Q(stock__lt=F('stock_minimo'))),
+        '1-10': ("De 1 a 10", Q(stock__range=(1, 10))),
+        '11-100': ("De 11 a 100", Q(stock__range=(11, 100))),
+        'mas-100': ("Más de 100", Q(stock__gt=100)),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(clave, etiqueta) for clave, (etiqueta, _) in self.RANGOS.items()]
+
+    def queryset(self, request, queryset):
+        rango = self.RANGOS.get(self.value())
+        return queryset.filter(rango[1]) if rango else queryset
+
+
+class StockDepositoInline(admin.TabularInline):
+    """Solo lectura: el stock por depósito cambia con movimientos, ajustes y transferencias."""
+    model = StockDeposito
+    fields = ['deposito', 'stock']
+    readonly_fields = ['deposito', 'stock']
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('deposito')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 # Register your models here.
 @admin.register(Producto)
-class ProductoAdmin(admin.ModelAdmin):
-    list_display = ['nombre', 'precio', 'stock', 'necesita_reposicion']
-    list_filter = ['stock']
-    search_fields = ['nombre']
\ No newline at end of file
+class ProductoAdmin(AdminEscalable):
+    list_display = ['nombre', 'sku', 'precio', 'stock', 'reposicion', 'shards', 'archivado']
+    # Sin índice sobre stock a propósito: cada venta lo actualiza y un índice
+    # impediría las actualizaciones HOT de la fila
+    list_filter = ['archivado', RangoStockFilter]
+    search_fields = ['=sku', '^nombre']
+    ordering = ['-id']
+    inlines = [StockDepositoInline]
+    actions = ['ajustar_precios', 'activar_stock_fragmentado', 'desactivar_stock_fragmentado', 'archivar']
+
+    def get_queryset(self, request):
+        # El admin también muestra los archivados
+        return Producto.todos.all()
+
+    # Sin orden por esta columna: ordenar por una comparación entre columnas
+    # recorre la tabla entera. Para ver los que faltan está el filtro "Bajo el mínimo"
+    @admin.display(description="Necesita reposición", boolean=True)
+    def reposicion(self, obj):
+        return obj.necesita_reposicion
+
+    def has_delete_permission(self, request, obj=None):
+        # Borrar un producto con mucho historial bloquea tablas: se archiva y
+        # lo purga el comando purgar_productos
+        return False
+
+    def get_readonly_fields(self, request, obj=None):
+        # El stock de un producto existente cambia solo con movimientos y ajustes
+        return ['stock'] if obj else []
+
+    @admin.action(description="Ajustar precios", permissions=['change'])
+    def ajustar_precios(self, request, queryset):
+        """Pide los parámetros del ajuste en una página intermedia y lo aplica a los productos seleccionados."""
+        form = AjustePreciosForm(request.POST if 'aplicar' in request.POST or 'previsualizar' in request.POST else None)
+        vista_previa = None
+        sin_precio, no_positivos = 0, []
+        if form.is_valid():
+            datos = form.cleaned_data
+            if 'aplicar' in request.POST:
+                try:
+                    cambiados = precios.aplicar(
+                        queryset, datos['modo'], datos['valor'], datos['paso'], datos['direccion'],
+                        usuario=request.user.username, motivo=datos['motivo'],
+                    )
+                except precios.PrecioNoPositivo as error:
+                    self.message_user(request, f"{error}. No se modificó ningún precio.", messages.ERROR)
+                else:
+                    self.message_user(request, f"Precio actualizado en {cambiados} productos", messages.SUCCESS)
+                    return None
+            expresion = precios.expresion_precio(datos['modo'], datos['valor'], datos['paso'], datos['direccion'])
+            vista_previa = precios.previsualizar(queryset, expresion)
+            sin_precio, no_positivos = precios.no_positivos(queryset, expresion)
+
+        return TemplateResponse(request, "admin/productos/producto/ajustar_precios.html", {
+            **self.admin_site.each_context(request),
+            'title': "Ajustar precios",
+            'opts': self.model._meta,
+            'form': form,
+            'productos': queryset,
+            'cantidad': queryset.count(),
+            'vista_previa': vista_previa,
+            'sin_precio': sin_precio,
+            'no_positivos': no_positivos,
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        })
+
+    @admin.action(description="Activar stock fragmentado (productos muy vendidos)", permissions=['change'])
+    def activar_stock_fragmentado(self, request, queryset):
+        for producto in queryset:
+            stock.activar_fragmentos(producto)
+        self.message_user(request, f"Stock fragmentado activado en {queryset.count()} productos", messages.SUCCESS)
+
+    @admin.action(description="Archivar (dar de baja)", permissions=['change'])
+    def archivar(self, request, queryset):
+        archivados = sum(bajas.archivar(producto) for producto in queryset.filter(archivado=False))
+        self.message_user(request, f"{archivados} productos archivados", messages.SUCCESS)
+
+    @admin.action(description="Desactivar stock fragmentado", permissions=['change'])
+    def desactivar_stock_fragmentado(self, request, queryset):
+        for producto in queryset.filter(shards__gt=0):
+            stock.desactivar_fragmentos(producto)
+        self.message_user(request, "Stock fragmentado desactivado", messages.SUCCESS)
+
+
+@admin.register(Deposito)
+class DepositoAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'codigo', 'principal', 'activo']
+    list_filter = ['activo']
+    search_fields = ['nombre', 'codigo']
+
+    def has_delete_permission(self, request, obj=None):
+        # Los movimientos y el stock lo referencian: se desactiva
+        return False
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(AdminEscalable):
+    """Solo lectura: los movimientos los registran las vistas de stock, las ventas y la conciliación."""
+    list_display = ['fecha', 'producto', 'deposito', 'tipo', 'cantidad', 'origen', 'usuario', 'motivo']
+    list_select_related = ['producto', 'deposito']
+    list_filter = ['tipo', 'origen', 'deposito']
+    search_fields = ['=producto__sku', '^producto__nombre']
+    # Índice movimiento_fecha_idx; en Postgres la tabla está particionada por fecha
+    date_hierarchy = 'fecha'
+    ordering = ['-fecha']
+    sortable_by = ['fecha']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(HistorialPrecio)
+class HistorialPrecioAdmin(AdminEscalable):
+    list_display = ['producto', 'precio_anterior', 'precio_nuevo', 'fecha', 'usuario', 'motivo']
+    list_select_related = ['producto']
+    search_fields = ['=producto__sku', '^producto__nombre']
+    date_hierarchy = 'fecha'
+    readonly_fields = ['producto', 'precio_anterior', 'precio_nuevo', 'fecha', 'usuario', 'motivo']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ValuacionProducto)
+class ValuacionProductoAdmin(AdminEscalable):
+    """Solo lectura: lo mantiene el comando valuar_inventario."""
+    list_display = ['producto', 'cantidad', 'valor', 'ultimo_costo', 'sin_capa']
+    list_select_related = ['producto']
+    search_fields = ['=producto__sku', '^producto__nombre']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ValuacionMensual)
+class ValuacionMensualAdmin(AdminEscalable):
+    list_display = ['producto', 'mes', 'unidades_vendidas', 'costo_vendido', 'costo_otras_salidas', 'valor_cierre']
+    list_select_related = ['producto']
+    search_fields = ['=producto__sku', '^producto__nombre']
+    date_hierarchy = 'mes'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,139 @@
+# -----------------------------------------------------------------------------
+# productos/bajas.py
+# Baja de productos: archivado inmediato y purga diferida por lotes.
+# -----------------------------------------------------------------------------
+"""
+Dar de baja un producto solo lo marca como archivado: es un UPDATE de una
+fila, el manager por defecto deja de mostrarlo y el feed de cambios y el
+índice de SKU lo informan como eliminado. Sus ventas no se tocan.
+
+La purga (comando purgar_productos) corre después, fuera de las peticiones,
+sobre los productos archivados hace más de N días. Borra movimientos y demás
+filas dependientes en lotes de `tamanio_lote`, cada uno en su propia
+transacción, para no retener bloqueos:
+
+- Los movimientos se resumen antes en ResumenMovimientoMensual si el
+  producto tiene ventas (el producto queda archivado para siempre y su
+  historial mensual se conserva).
+- Un producto sin ventas se borra por completo al final.
+"""
+import datetime
+import time
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from ventas.models import ItemVenta
+from .models import (
+    HistorialPrecio, MovimientoStock, Producto, ResumenMovimientoMensual, StockShard, VentaProductoDia,
+)
+from . import cambios, kpis, sku_index
+
+TAMANIO_LOTE = 1000
+ARCHIVO_PURGA = 'purga'
+CAMPOS_RESUMEN = ('entradas', 'salidas', 'ajustes', 'cantidad_movimientos')
+
+
+def archivar(producto):
+    """Da de baja el producto. Devuelve False si ya estaba archivado."""
+    with transaction.atomic():
+        # El stock se relee bloqueado: una venta concurrente no puede dejar
+        # el valor de inventario descontado con un stock viejo
+        bloqueado = (
+            Producto.todos.select_for_update().filter(pk=producto.pk)
+            .values('archivado', 'precio', 'stock', 'stock_minimo').first()
+        )
+        if bloqueado is None or bloqueado['archivado']:
+            return False
+        Producto.todos.filter(pk=producto.pk).update(archivado=True, fecha_archivado=timezone.now(), **cambios.marcas())
+        cambios.registrar_baja(producto)
+        kpis.registrar_producto((bloqueado['precio'], bloqueado['stock'], bloqueado['stock_minimo']), None)
+        sku_index.marcar_cambio(borrado=True)
+    producto.archivado = True
+    producto.stock = bloqueado['stock']
+    producto.marcar_guardado(['archivado', 'stock'])
+    sku_index.indice.quitar(producto.pk)
+    return True
+
+
+# -----------------------------------------------------------------------------
+# Purga
+# -----------------------------------------------------------------------------
+def _borrar_por_lotes(queryset, tamanio_lote, pausa):
+    borrados = 0
+    while True:
+        ids = list(queryset.order_by().values_list('id', flat=True)[:tamanio_lote])
+        if not ids:
+            return borrados
+        with transaction.atomic():
+            borrados += queryset.model.objects.filter(id__in=ids).delete()[0]
+        if pausa:
+            time.sleep(pausa)
+
+
+def _resumir_movimientos(producto_id, ids):
+    """Suma esos movimientos del producto a sus resúmenes mensuales (un GROUP BY)."""
+    totales = (
+        MovimientoStock.objects.filter(producto_id=producto_id, id__in=ids).order_by()
+        .annotate(mes=TruncMonth('fecha')).values('mes')
+        .annotate(
+            entradas=Sum('cantidad', filter=Q(tipo='entrada'), default=0),
+            salidas=Sum('cantidad', filter=Q(tipo='salida'), default=0),
+            ajustes=Sum('cantidad', filter=Q(tipo='ajuste'), default=0),
+            cantidad_movimientos=Count('id'),
+        )
+    )
+    por_mes = {}
+    for fila in totales:
+        mes = fila.pop('mes')
+        por_mes[mes.date() if isinstance(mes, datetime.datetime) else mes] = fila
+
+    existentes = {
+        r.mes: r for r in ResumenMovimientoMensual.objects.select_for_update().filter(
+            producto_id=producto_id, mes__in=list(por_mes)
+        )
+    }
+    nuevos, actualizados = [], []
+    for mes, valores in por_mes.items():
+        resumen = existentes.get(mes)
+        if resumen is None:
+            nuevos.append(ResumenMovimientoMensual(producto_id=producto_id, mes=mes, archivo=ARCHIVO_PURGA, **valores))
+        else:
+            for campo, valor in valores.items():
+                setattr(resumen, campo, getattr(resumen, campo) + valor)
+            actualizados.append(resumen)
+    ResumenMovimientoMensual.objects.bulk_create(nuevos)
+    ResumenMovimientoMensual.objects.bulk_update(actualizados, list(CAMPOS_RESUMEN))
+
+
+def purgar_producto(producto, tamanio_lote=TAMANIO_LOTE, pausa=0):
+    """Purga un producto archivado. Devuelve True si se borró, False si quedó archivado por tener ventas."""
+    con_ventas = ItemVenta.objects.filter(producto_id=producto.pk).exists()
+    movimientos = MovimientoStock.objects.filter(producto_id=producto.pk)
+    while True:
+        ids = list(movimientos.order_by().values_list('id', flat=True)[:tamanio_lote])
+        if not ids:
+            break
+        # Resumen y borrado de cada lote en la misma transacción: si la purga
+        # se corta, nada queda contado dos veces
+        with transaction.atomic():
+            if con_ventas:
+                _resumir_movimientos(producto.pk, ids)
+            movimientos.filter(id__in=ids).delete()
+        if pausa:
+            time.sleep(pausa)
+    if con_ventas:
+        return False
+
+    for modelo in (HistorialPrecio, VentaProductoDia, ResumenMovimientoMensual, StockShard):
+        _borrar_por_lotes(modelo.objects.filter(producto_id=producto.pk), tamanio_lote, pausa)
+    with transaction.atomic():
+        Producto.todos.filter(pk=producto.pk, archivado=True).delete()
+    return True
+
+
+def archivados_para_purgar(dias):
+    limite = timezone.now() - datetime.timedelta(days=dias)
+    return Producto.todos.filter(archivado=True, fecha_archivado__lte=limite).order_by('fecha_archivado')
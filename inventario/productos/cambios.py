@@ -0,0 +1,159 @@
+# -----------------------------------------------------------------------------
+# productos/cambios.py
+# Feed de cambios del catálogo para sincronizar clientes externos.
+# -----------------------------------------------------------------------------
+"""
+Cada escritura sobre un producto le asigna un número nuevo en
+`Producto.secuencia`, tomado de una secuencia de la base
+(`productos_cambio_seq` en Postgres), y anota en `Producto.transaccion` el id
+de la transacción que la hace. Las bajas dejan un registro en
+ProductoEliminado con los mismos dos datos. Un cliente guarda el último
+cursor recibido ("transaccion.secuencia") y pide solo lo que cambió después.
+
+Dos transacciones pueden confirmar en distinto orden que el de sus números.
+Por eso en Postgres el feed solo entrega cambios de transacciones anteriores
+a la más vieja que sigue en curso (`pg_snapshot_xmin`): todo lo que se
+confirme después tiene un id mayor y queda por delante del cursor, sin
+importar cuánto dure la transacción. En SQLite las escrituras son
+serializadas, la transacción queda en 0 y alcanza con la secuencia.
+
+Todas las actualizaciones directas (`update()`, `bulk_update()`) sobre
+Producto deben incluir `**marcas()` para que el cambio aparezca en el feed.
+"""
+from django.db import connection
+from django.db.models import BigIntegerField, Expression, Q
+from django.utils import timezone
+
+from .models import Producto, ProductoEliminado, TransaccionActual
+
+SECUENCIA = 'productos_cambio_seq'
+LIMITE_POR_DEFECTO = 500
+LIMITE_MAXIMO = 5000
+CAMPOS = ['id', 'sku', 'nombre', 'descripcion', 'precio', 'stock', 'stock_minimo', 'fecha_actualizacion', 'secuencia']
+
+# Sin secuencias (SQLite en desarrollo) las escrituras ya son serializadas,
+# alcanza con el máximo actual más uno
+_SIGUIENTE_SIN_SECUENCIA = (
+    "(SELECT COALESCE(MAX(valor), 0) + 1 FROM ("
+    f"SELECT MAX(secuencia) AS valor FROM {Producto._meta.db_table} "
+    f"UNION ALL SELECT MAX(secuencia) FROM {ProductoEliminado._meta.db_table}"
+    ") ultimos)"
+)
+_SIGUIENTE_POSTGRES = f"nextval('{SECUENCIA}')"
+_TRANSACCION_POSTGRES = TransaccionActual.SQL_POSTGRES
+
+
+class SiguienteSecuencia(Expression):
+    """Próximo número de cambio, para usar dentro de un UPDATE."""
+    output_field = BigIntegerField()
+
+    def as_sql(self, compiler, connection):
+        return _SIGUIENTE_SIN_SECUENCIA, []
+
+    def as_postgresql(self, compiler, connection):
+        return _SIGUIENTE_POSTGRES, []
+
+
+def numeracion():
+    """(secuencia, transaccion) para una fila que se guarda con save()."""
+    if connection.vendor == 'postgresql':
+        sql = f"SELECT {_SIGUIENTE_POSTGRES}, {_TRANSACCION_POSTGRES}"
+    else:
+        sql = f"SELECT {_SIGUIENTE_SIN_SECUENCIA}, 0"
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        return tuple(cursor.fetchone())
+
+
+def marcas():
+    """Campos a incluir en cada update() de Producto."""
+    return {
+        'fecha_actualizacion': timezone.now(),
+        'secuencia': SiguienteSecuencia(),
+        'transaccion': TransaccionActual(),
+    }
+
+
+def registrar_baja(producto):
+    secuencia, transaccion = numeracion()
+    ProductoEliminado.objects.create(
+        producto_id=producto.pk, sku=producto.sku, secuencia=secuencia, transaccion=transaccion,
+    )
+
+
+def leer_cursor(texto):
+    """
+    Cursor recibido por el feed: "transaccion.secuencia". Un número solo es un
+    cursor anterior a la columna `transaccion` y se toma como (0, número).
+    ValueError si no es válido.
+    """
+    transaccion, _, secuencia = str(texto).rpartition('.')
+    cursor = (int(transaccion or 0), int(secuencia))
+    if min(cursor) < 0:
+        raise ValueError(texto)
+    return cursor
+
+
+def escribir_cursor(cursor):
+    return f"{cursor[0]}.{cursor[1]}"
+
+
+def tope_confirmado():
+    """
+    Id de la transacción más vieja que todavía puede estar en curso: lo que
+    escribieron las anteriores ya está confirmado o se descartó. None fuera
+    de Postgres. También lo usa valuacion.py.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def leer(cursor=(0, 0), limite=LIMITE_POR_DEFECTO):
+    """
+    Cambios posteriores a `cursor` (ver leer_cursor), ordenados por
+    transacción y secuencia. Devuelve (productos, eliminados, nuevo cursor,
+    hay_mas).
+    """
+    tope = tope_confirmado()
+    productos = Producto.objects.order_by('transaccion', 'secuencia', 'id').values(*CAMPOS, 'transaccion')
+    eliminados = ProductoEliminado.objects.order_by('transaccion', 'secuencia', 'id').values(
+        'producto_id', 'sku', 'secuencia', 'transaccion'
+    )
+    if tope is not None:
+        productos = productos.filter(transaccion__lt=tope)
+        eliminados = eliminados.filter(transaccion__lt=tope)
+
+    def clave(cambio):
+        return (cambio[1]['transaccion'], cambio[1]['secuencia'])
+
+    posteriores = Q(transaccion__gt=cursor[0]) | Q(transaccion=cursor[0], secuencia__gt=cursor[1])
+    cambios = sorted(
+        [('producto', fila) for fila in productos.filter(posteriores)[:limite + 1]]
+        + [('eliminado', fila) for fila in eliminados.filter(posteriores)[:limite + 1]],
+        key=clave,
+    )
+    hay_mas = len(cambios) > limite
+    pagina = cambios[:limite]
+    if hay_mas:
+        # Nunca se corta una página en medio de filas con el mismo número
+        # (un UPDATE que les asigna un número calculado una sola vez)
+        ultima = clave(pagina[-1])
+        mismas = {'transaccion': ultima[0], 'secuencia': ultima[1]}
+        pagina = (
+            [cambio for cambio in pagina if clave(cambio) < ultima]
+            + [('producto', fila) for fila in productos.filter(**mismas)]
+            + [('eliminado', fila) for fila in eliminados.filter(**mismas)]
+        )
+
+    nuevo_cursor = clave(pagina[-1]) if pagina else cursor
+    for _, fila in pagina:
+        del fila['transaccion']
+    return (
+        [fila for tipo, fila in pagina if tipo == 'producto'],
+        [fila for tipo, fila in pagina if tipo == 'eliminado'],
+        nuevo_cursor,
+        hay_mas,
+    )
@@ -0,0 +1,378 @@
+# -----------------------------------------------------------------------------
+# productos/carga.py
+# Prueba de carga de ventas y movimientos de stock concurrentes.
+# -----------------------------------------------------------------------------
+"""
+Simula varios cajeros que registran ventas (`ventas:crear_venta`) y
+movimientos (`productos:movimiento_create`) al mismo tiempo sobre un grupo
+chico de productos compartidos, para forzar la contención sobre las mismas
+filas. El stock inicial de cada producto se reparte entre el depósito
+principal y uno de prueba, y cada operación elige uno de los dos. Cada
+cajero es un hilo con su propio cliente:
+
+- sin URL se usa el cliente de pruebas de Django contra la base configurada
+  (sirve con la base de tests o la de desarrollo);
+- con URL se hacen peticiones HTTP reales a un servidor que use la misma base.
+
+Al terminar se verifican los invariantes: ningún stock negativo, stock igual
+al historial de movimientos, stock por depósito que suma el total y total de
+cada venta igual a la suma de sus items. Un tipo de operación rechazado en
+todos sus intentos también cuenta como falla: casi siempre es un formulario
+que dejó de coincidir con los datos que envía la prueba.
+"""
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.middleware.csrf import CSRF_ALLOWED_CHARS
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from clientes import estadisticas as estadisticas_clientes
+from clientes.models import Cliente
+from ventas.models import Venta
+from . import conciliacion, kpis, stock
+from .models import Deposito, MovimientoStock, Producto, StockShard
+
+USUARIO = "prueba_carga"
+
+
+@dataclass
+class Resultado:
+    """Resultado de una operación: qué se hizo, cuánto tardó y cómo terminó."""
+    operacion: str
+    segundos: float
+    estado: str  # 'ok', 'rechazada' (sin stock / formulario inválido) o 'error'
+    detalle: str = ""
+
+
+@dataclass
+class Escenario:
+    """Datos creados para la corrida; se identifican por un prefijo común."""
+    prefijo: str
+    usuario: User
+    cliente: Cliente
+    depositos: list = field(default_factory=list)  # ids: el principal y el de prueba
+    productos: list = field(default_factory=list)
+
+
+# -----------------------------------------------------------------------------
+# Preparación y limpieza
+# -----------------------------------------------------------------------------
+@transaction.atomic
+def preparar(cantidad_productos, stock_inicial, fragmentos=0):
+    prefijo = f"CARGA-{uuid.uuid4().hex[:6].upper()}"
+    # Un usuario por corrida, sin contraseña; limpiar() lo borra con el resto
+    usuario = User(username=f"{USUARIO}_{prefijo.lower()}", is_superuser=True, is_staff=True)
+    usuario.set_unusable_password()
+    usuario.save()
+    cliente = Cliente.objects.create(
+        nombre="Prueba", apellido="Carga", documento=prefijo, email=f"{prefijo.lower()}@carga.invalid"
+    )
+
+    principal = Deposito.id_principal()
+    deposito = Deposito.objects.create(nombre=f"Depósito {prefijo}", codigo=prefijo)
+    escenario = Escenario(prefijo=prefijo, usuario=usuario, cliente=cliente, depositos=[principal, deposito.pk])
+    for i in range(cantidad_productos):
+        producto = Producto.objects.create(
+            nombre=f"{prefijo} {i}", descripcion="Producto de prueba de carga",
+            precio=random.randint(100, 5000) / 100, stock=stock_inicial, stock_minimo=0, sku=f"{prefijo}-{i}",
+        )
+        # Igual que el alta desde la vista: el stock inicial queda en el historial
+        MovimientoStock.objects.create(
+            producto=producto, tipo="entrada", cantidad=stock_inicial, motivo="Stock inicial", usuario=USUARIO,
+            deposito_id=principal,
+        )
+        # La mitad pasa al depósito de prueba, como una transferencia desde la vista
+        mitad = stock_inicial // 2
+        if mitad:
+            stock.transferir(producto, principal, deposito, mitad)
+            MovimientoStock.objects.bulk_create([
+                MovimientoStock(producto=producto, tipo=tipo, cantidad=mitad, motivo=prefijo, usuario=USUARIO,
+                                origen="transferencia", deposito_id=deposito_id)
+                for tipo, deposito_id in (("salida", principal), ("entrada", deposito.pk))
+            ])
+        if fragmentos:
+            stock.activar_fragmentos(producto, fragmentos)
+        escenario.productos.append(producto)
+    return escenario
+
+
+def limpiar(escenario):
+    """
+    Borra las ventas, productos, cliente, depósito y usuario creados para la
+    corrida, y recalcula los indicadores y las estadísticas de clientes, que
+    sumaron las ventas y movimientos de la prueba.
+    """
+    with transaction.atomic():
+        Venta.objects.filter(cliente=escenario.cliente).delete()
+        Producto.todos.filter(pk__in=[p.pk for p in escenario.productos]).delete()
+        escenario.cliente.delete()
+        Deposito.objects.filter(codigo=escenario.prefijo).delete()
+        escenario.usuario.delete()
+    kpis.recalcular()
+    estadisticas_clientes.recalcular()
+
+
+# -----------------------------------------------------------------------------
+# Clientes
+# -----------------------------------------------------------------------------
+class ClienteLocal:
+    """Cliente de pruebas de Django: las peticiones se atienden en el mismo proceso."""
+
+    def __init__(self, usuario):
+        self.client = Client(raise_request_exception=False)
+        self.client.force_login(usuario)
+
+    def post(self, ruta, datos):
+        return self.client.post(ruta, datos).status_code
+
+    def cerrar(self):
+        # Cada hilo abre su propia conexión a la base
+        connection.close()
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClienteHttp:
+    """
+    Peticiones HTTP reales. La sesión se crea directamente en la base (el
+    servidor debe usar la misma) y el token CSRF se fija en la cookie.
+    """
+
+    def __init__(self, usuario, url_base):
+        self.url_base = url_base.rstrip('/')
+        local = Client()
+        local.force_login(usuario)
+        self.token = get_random_string(32, CSRF_ALLOWED_CHARS)
+        self.opener = urllib.request.build_opener(_SinRedirecciones())
+        self.cookies = "; ".join([
+            f"{settings.SESSION_COOKIE_NAME}={local.cookies[settings.SESSION_COOKIE_NAME].value}",
+            f"{settings.CSRF_COOKIE_NAME}={self.token}",
+        ])
+
+    def post(self, ruta, datos):
+        cuerpo = urllib.parse.urlencode({**datos, 'csrfmiddlewaretoken': self.token}).encode()
+        peticion = urllib.request.Request(
+            self.url_base + ruta, data=cuerpo,
+            headers={'Cookie': self.cookies, 'Referer': self.url_base + ruta},
+        )
+        try:
+            with self.opener.open(peticion) as respuesta:
+                respuesta.read()
+                return respuesta.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def cerrar(self):
+        connection.close()
+
+
+# -----------------------------------------------------------------------------
+# Cajeros
+# -----------------------------------------------------------------------------
+def _datos_venta(escenario, codigo, max_items):
+    productos = random.sample(escenario.productos, random.randint(1, min(max_items, len(escenario.productos))))
+    datos = {
+        'codigo': codigo,
+        'cliente': escenario.cliente.pk,
+        'items-TOTAL_FORMS': len(productos),
+        'items-INITIAL_FORMS': 0,
+    }
+    for i, producto in enumerate(productos):
+        datos[f'items-{i}-producto'] = producto.pk
+        datos[f'items-{i}-deposito'] = random.choice(escenario.depositos)
+        datos[f'items-{i}-cantidad'] = random.randint(1, 3)
+        datos[f'items-{i}-precio_unitario'] = producto.precio
+    return datos
+
+
+def _clasificar(estado_http):
+    # Las vistas redirigen cuando registran y vuelven a mostrar el formulario (200) si lo rechazan
+    if estado_http == 302:
+        return 'ok'
+    if estado_http == 200:
+        return 'rechazada'
+    return 'error'
+
+
+def cajero(numero, escenario, operaciones, proporcion_movimientos, max_items, url, resultados, barrera):
+    cliente = ClienteHttp(escenario.usuario, url) if url else ClienteLocal(escenario.usuario)
+    propios = []
+    try:
+        barrera.wait()
+        for n in range(operaciones):
+            if random.random() < proporcion_movimientos:
+                operacion = 'movimiento'
+                producto = random.choice(escenario.productos)
+                ruta = reverse('productos:movimiento_create', args=[producto.pk])
+                datos = {
+                    'tipo': random.choice(['entrada', 'salida']),
+                    'deposito': random.choice(escenario.depositos),
+                    'cantidad': random.randint(1, 5),
+                    'motivo': escenario.prefijo,
+                }
+            else:
+                operacion = 'venta'
+                ruta = reverse('ventas:crear_venta')
+                datos = _datos_venta(escenario, f"{escenario.prefijo}-{numero}-{n}", max_items)
+
+            inicio = time.perf_counter()
+            try:
+                estado = _clasificar(cliente.post(ruta, datos))
+                detalle = ""
+            except Exception as e:
+                estado, detalle = 'error', type(e).__name__
+            propios.append(Resultado(operacion, time.perf_counter() - inicio, estado, detalle))
+    finally:
+        cliente.cerrar()
+        resultados.extend(propios)
+
+
+# -----------------------------------------------------------------------------
+# Esperas por bloqueos
+# -----------------------------------------------------------------------------
+class MonitorBloqueos(threading.Thread):
+    """
+    Muestrea cada `intervalo` segundos cuántas sesiones de la base están
+    esperando un bloqueo. Solo en Postgres (pg_stat_activity).
+    """
+
+    def __init__(self, intervalo=0.05):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.muestras = []
+        self.detener = threading.Event()
+
+    @staticmethod
+    def disponible():
+        return connection.vendor == 'postgresql'
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self.detener.is_set():
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE wait_event_type = 'Lock' AND datname = current_database()"
+                    )
+                    self.muestras.append(cursor.fetchone()[0])
+                    self.detener.wait(self.intervalo)
+        finally:
+            connection.close()
+
+    def resumen(self):
+        con_espera = [m for m in self.muestras if m]
+        return {
+            'muestras': len(self.muestras),
+            'muestras_con_espera': len(con_espera),
+            'maximo_esperando': max(self.muestras, default=0),
+            # Aproximación: sesiones esperando * duración de cada muestra
+            'segundos_espera': sum(con_espera) * self.intervalo,
+        }
+
+
+# -----------------------------------------------------------------------------
+# Corrida y resultados
+# -----------------------------------------------------------------------------
+def ejecutar(escenario, cajeros, operaciones, proporcion_movimientos=0.3, max_items=3, url=None):
+    """Corre la carga y devuelve (resultados, segundos totales, resumen de bloqueos o None)."""
+    resultados = []
+    barrera = threading.Barrier(cajeros + 1)
+    hilos = [
+        threading.Thread(
+            target=cajero,
+            args=(i, escenario, operaciones, proporcion_movimientos, max_items, url, resultados, barrera),
+        )
+        for i in range(cajeros)
+    ]
+    monitor = MonitorBloqueos() if MonitorBloqueos.disponible() else None
+
+    for hilo in hilos:
+        hilo.start()
+    if monitor:
+        monitor.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+    if monitor:
+        monitor.detener.set()
+        monitor.join()
+    return resultados, segundos, monitor.resumen() if monitor else None
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, max(0, round(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+def estadisticas(resultados, segundos):
+    """{operacion: {...}} con cantidades por estado, throughput y percentiles de latencia en ms."""
+    por_operacion = {}
+    for operacion in sorted({r.operacion for r in resultados}):
+        propios = [r for r in resultados if r.operacion == operacion]
+        tiempos = sorted(r.segundos * 1000 for r in propios)
+        estados = Counter(r.estado for r in propios)
+        por_operacion[operacion] = {
+            'total': len(propios),
+            'ok': estados['ok'],
+            'rechazadas': estados['rechazada'],
+            'errores': estados['error'],
+            'por_segundo': len(propios) / segundos if segundos else 0.0,
+            'p50': percentil(tiempos, 50),
+            'p95': percentil(tiempos, 95),
+            'p99': percentil(tiempos, 99),
+            'detalle_errores': Counter(r.detalle for r in propios if r.estado == 'error' and r.detalle),
+        }
+    return por_operacion
+
+
+def verificar(escenario, resultados=()):
+    """Devuelve la lista de invariantes violados (vacía si todo está bien)."""
+    ids = [p.pk for p in escenario.productos]
+    problemas = []
+
+    for operacion, datos in estadisticas(resultados, 1).items():
+        if datos['total'] and datos['rechazadas'] == datos['total']:
+            problemas.append(f"Todas las operaciones de {operacion} fueron rechazadas ({datos['total']})")
+
+    negativos = Producto.objects.filter(pk__in=ids, stock__lt=0).count()
+    negativos += StockShard.objects.filter(producto_id__in=ids, stock__lt=0).count()
+    if negativos:
+        problemas.append(f"{negativos} contadores de stock negativos")
+    for producto_id, actual, esperado in conciliacion.diferencias_stock(ids=ids):
+        problemas.append(f"Producto {producto_id}: stock {actual}, según movimientos {esperado}")
+    registrado = conciliacion.stock_registrado(ids=ids)
+    for producto in Producto.objects.filter(pk__in=ids):
+        por_deposito = dict(stock.stock_por_deposito(producto))
+        if sum(por_deposito.values()) != registrado[producto.pk]:
+            problemas.append(
+                f"Producto {producto.pk}: stock {registrado[producto.pk]}, "
+                f"suma por depósito {sum(por_deposito.values())}"
+            )
+        if any(valor < 0 for valor in por_deposito.values()):
+            problemas.append(f"Producto {producto.pk}: stock negativo en un depósito")
+
+    limites = Venta.objects.filter(cliente=escenario.cliente).aggregate(desde=Min('pk'), hasta=Max('pk'))
+    if limites['desde'] is not None:
+        for venta_id, total, suma in conciliacion.diferencias_ventas(limites['desde'], limites['hasta']):
+            problemas.append(f"Venta {venta_id}: total {total}, suma de items {suma}")
+    return problemas
@@ -0,0 +1,92 @@
+# -----------------------------------------------------------------------------
+# productos/cargador.py
+# Mapa de identidad de Producto por petición: cada producto se lee una sola vez.
+# -----------------------------------------------------------------------------
+"""
+Las vistas piden los productos al cargador de la petición
+(`cargador.de(request)`) en lugar de consultarlos cada una por su cuenta. El
+primer pedido de un pk lo lee de la base y los siguientes devuelven la misma
+instancia, así la vista, el formulario y la plantilla comparten el objeto y
+los cambios que hace stock.py sobre `producto.stock` se ven en todos lados.
+
+Las páginas con varios productos usan `cargar(pks)` o `asignar(objetos)`,
+que leen los que faltan con una sola consulta.
+
+Lee también los productos archivados (ver bajas.py), porque las ventas
+viejas los siguen mostrando; `obtener()` y `obtener_o_404()` los tratan como
+inexistentes.
+
+El cargador vive lo que dura la petición; no es una caché entre peticiones.
+"""
+from django.http import Http404
+
+from .models import Producto
+
+ATRIBUTO = '_cargador_productos'
+
+
+class CargadorProductos:
+    def __init__(self, queryset=None):
+        self.queryset = queryset if queryset is not None else Producto.todos.all()
+        self._productos = {}  # pk -> Producto (None si no existe)
+
+    def cargar(self, pks):
+        """Devuelve {pk: Producto} de los pks que existen, leyendo los que faltan en una consulta."""
+        pks = {int(pk) for pk in pks}
+        faltantes = pks - self._productos.keys()
+        if faltantes:
+            encontrados = {p.pk: p for p in self.queryset.filter(pk__in=faltantes)}
+            for pk in faltantes:
+                self._productos[pk] = encontrados.get(pk)
+        return {pk: self._productos[pk] for pk in pks if self._productos[pk] is not None}
+
+    def obtener(self, pk):
+        """El producto con ese pk, o None si no existe o está archivado."""
+        producto = self.cargar([pk]).get(int(pk))
+        if producto is None or producto.archivado:
+            return None
+        return producto
+
+    def obtener_o_404(self, pk):
+        try:
+            producto = self.obtener(pk)
+        except (TypeError, ValueError):
+            producto = None
+        if producto is None:
+            raise Http404("Producto no encontrado")
+        return producto
+
+    def registrar(self, producto):
+        """
+        Agrega un producto leído por otro camino (un formulario, un select_for_update).
+        Si ya había una instancia con ese pk se devuelve esa, para que haya una sola.
+        """
+        actual = self._productos.get(producto.pk)
+        if actual is not None:
+            return actual
+        self._productos[producto.pk] = producto
+        return producto
+
+    def asignar(self, objetos, campo='producto'):
+        """Completa `objeto.<campo>` en objetos con FK a Producto, con una consulta para todos."""
+        objetos = list(objetos)
+        atributo = f'{campo}_id'
+        productos = self.cargar(getattr(o, atributo) for o in objetos if getattr(o, atributo) is not None)
+        for objeto in objetos:
+            producto = productos.get(getattr(objeto, atributo))
+            if producto is not None:
+                setattr(objeto, campo, producto)
+        return objetos
+
+    def olvidar(self, pk):
+        """Descarta la instancia guardada; el próximo pedido la vuelve a leer."""
+        self._productos.pop(int(pk), None)
+
+
+def de(request):
+    """Cargador de la petición; se crea con el primer uso."""
+    cargador = getattr(request, ATRIBUTO, None)
+    if cargador is None:
+        cargador = CargadorProductos()
+        setattr(request, ATRIBUTO, cargador)
+    return cargador
@@ -0,0 +1,221 @@
+# -----------------------------------------------------------------------------
+# productos/conciliacion.py
+# Comparación de los contadores desnormalizados contra sus fuentes.
+# -----------------------------------------------------------------------------
+"""
+`Producto.stock` debería coincidir con el historial de movimientos
+(entradas - salidas, incluidos los meses archivados) y `Venta.total` con la
+suma de sus items. Cada comparación se hace con una consulta agrupada por
+tabla para un rango de ids, nunca producto por producto, así el trabajo se
+puede repartir en rangos y correr en paralelo.
+
+Los movimientos de tipo "ajuste" son informativos y no cambian el stock.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from ventas.models import ItemVenta, Venta
+from .models import MovimientoStock, Producto, ResumenMovimientoMensual, StockDeposito, StockShard
+from . import cambios, kpis, stock
+
+TAMANIO_LOTE = 1000
+
+MOTIVO_CONCILIACION = "Conciliación de stock"
+
+OMITIDO_NEGATIVO = "el historial da stock negativo"
+OMITIDO_DEPOSITOS = "los depósitos no alcanzan para la baja"
+
+
+def _filtro_rango(campo, desde_id, hasta_id):
+    filtro = Q()
+    if desde_id is not None:
+        filtro &= Q(**{f"{campo}__gte": desde_id})
+    if hasta_id is not None:
+        filtro &= Q(**{f"{campo}__lte": hasta_id})
+    return filtro
+
+
+# -----------------------------------------------------------------------------
+# Stock
+# -----------------------------------------------------------------------------
+def stock_esperado(desde_id=None, hasta_id=None, ids=None):
+    """{producto_id: stock según el historial} para los productos del rango."""
+    filtro = _filtro_rango('producto_id', desde_id, hasta_id)
+    if ids is not None:
+        filtro &= Q(producto_id__in=ids)
+
+    signo = Case(
+        When(tipo='entrada', then=F('cantidad')),
+        When(tipo='salida', then=-F('cantidad')),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    esperado = dict(
+        MovimientoStock.objects.filter(filtro).order_by()
+        .values('producto_id').annotate(neto=Sum(signo))
+        .values_list('producto_id', 'neto')
+    )
+    # Meses que ya se pasaron a archivo (ver archivar_movimientos)
+    archivados = (
+        ResumenMovimientoMensual.objects.filter(filtro).order_by()
+        .values('producto_id').annotate(neto=Sum(F('entradas') - F('salidas')))
+        .values_list('producto_id', 'neto')
+    )
+    for producto_id, neto in archivados:
+        esperado[producto_id] = esperado.get(producto_id, 0) + neto
+    return esperado
+
+
+def stock_registrado(desde_id=None, hasta_id=None, ids=None):
+    """{producto_id: stock actual} tomando la suma de fragmentos en los productos fragmentados."""
+    filtro_productos = _filtro_rango('pk', desde_id, hasta_id)
+    filtro = _filtro_rango('producto_id', desde_id, hasta_id)
+    if ids is not None:
+        filtro_productos &= Q(pk__in=ids)
+        filtro &= Q(producto_id__in=ids)
+
+    actual = dict(Producto.objects.filter(filtro_productos).order_by().values_list('pk', 'stock'))
+    fragmentados = (
+        StockShard.objects.filter(filtro, producto__shards__gt=0)
+        .order_by().values('producto_id').annotate(total=Sum('stock'))
+        .values_list('producto_id', 'total')
+    )
+    actual.update(fragmentados)
+    return actual
+
+
+def diferencias_stock(desde_id=None, hasta_id=None, ids=None):
+    """Lista de (producto_id, stock actual, stock esperado) que no coinciden."""
+    esperado = stock_esperado(desde_id, hasta_id, ids)
+    return [
+        (producto_id, actual, esperado.get(producto_id, 0))
+        for producto_id, actual in sorted(stock_registrado(desde_id, hasta_id, ids).items())
+        if actual != esperado.get(producto_id, 0)
+    ]
+
+
+@transaction.atomic
+def reparar_stock(producto_ids, fuente='stock', usuario='Sistema'):
+    """
+    Corrige las diferencias de los productos indicados. Bloquea las filas y
+    vuelve a calcular antes de escribir, así no se pisan ventas concurrentes.
+
+    - fuente='stock': el stock actual es el correcto; se registran
+      movimientos compensatorios para que el historial coincida.
+    - fuente='movimientos': el historial es el correcto; se actualiza el stock.
+      Los productos cuyo historial da negativo, o cuya baja no cubren los
+      depósitos, no se tocan: quedan en la lista de omitidos para revisarlos
+      a mano.
+
+    Devuelve (corregidos, omitidos) con omitidos como lista de
+    (producto_id, stock actual, stock esperado, motivo).
+    """
+    productos = {p.pk: p for p in Producto.objects.select_for_update().filter(pk__in=producto_ids).order_by('pk')}
+    diferencias = diferencias_stock(ids=list(productos))
+
+    if fuente == 'stock':
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(
+                producto_id=producto_id,
+                tipo="entrada" if actual > esperado else "salida",
+                cantidad=abs(actual - esperado),
+                motivo=MOTIVO_CONCILIACION,
+                usuario=usuario,
+                origen="conciliacion",
+            )
+            for producto_id, actual, esperado in diferencias
+        ], batch_size=TAMANIO_LOTE)
+        return len(diferencias), []
+
+    # En los productos fragmentados el stock actual es la suma de los
+    # fragmentos y una baja hasta un valor no negativo siempre alcanza. En los
+    # simples la columna puede no coincidir con los depósitos: se bloquean sus
+    # filas y se suman antes de decidir.
+    en_depositos = defaultdict(int)
+    filas = StockDeposito.objects.select_for_update().filter(
+        producto_id__in=[producto_id for producto_id, _, _ in diferencias if not productos[producto_id].shards]
+    ).order_by('producto_id', 'deposito_id').values_list('producto_id', 'stock')
+    for producto_id, valor in filas:
+        en_depositos[producto_id] += valor
+
+    simples, omitidos = [], []
+    ahora = timezone.now()
+    for producto_id, actual, esperado in diferencias:
+        producto = productos[producto_id]
+        if esperado < 0:
+            omitidos.append((producto_id, actual, esperado, OMITIDO_NEGATIVO))
+        elif producto.shards:
+            stock.fijar(producto, esperado)
+        elif en_depositos[producto_id] < actual - esperado:
+            omitidos.append((producto_id, actual, esperado, OMITIDO_DEPOSITOS))
+        else:
+            # La diferencia del total se corrige en el depósito principal
+            stock.aplicar_en_depositos(producto_id, esperado - actual)
+            producto.stock = esperado
+            producto.fecha_actualizacion = ahora
+            producto.secuencia = cambios.SiguienteSecuencia()
+            producto.transaccion = cambios.TransaccionActual()
+            kpis.registrar_cambio_stock(producto, actual)
+            simples.append(producto)
+    Producto.objects.bulk_update(
+        simples, ['stock', 'fecha_actualizacion', 'secuencia', 'transaccion'], batch_size=TAMANIO_LOTE
+    )
+    return len(diferencias) - len(omitidos), omitidos
+
+
+# -----------------------------------------------------------------------------
+# Ventas
+# -----------------------------------------------------------------------------
+def _suma_items():
+    # Round: SQLite suma los decimales como flotantes y arrastra error en los últimos dígitos
+    return Round(
+        Coalesce(Sum('items__subtotal'), Value(0), output_field=Venta._meta.get_field('total')),
+        2, output_field=Venta._meta.get_field('total'),
+    )
+
+
+def diferencias_ventas(desde_id=None, hasta_id=None):
+    """Lista de (venta_id, total registrado, suma de items) que no coinciden."""
+    return list(
+        Venta.objects.filter(_filtro_rango('pk', desde_id, hasta_id)).order_by()
+        .annotate(suma=_suma_items()).exclude(total=F('suma'))
+        .values_list('pk', 'total', 'suma')
+    )
+
+
+def subtotales_incorrectos(desde_id=None, hasta_id=None):
+    """Items cuyo subtotal no es cantidad * precio_unitario."""
+    return ItemVenta.objects.filter(_filtro_rango('venta_id', desde_id, hasta_id)).exclude(
+        subtotal=Round(F('cantidad') * F('precio_unitario'), 2)
+    )
+
+
+@transaction.atomic
+def reparar_ventas(desde_id=None, hasta_id=None):
+    """Recalcula subtotales y totales de ventas del rango. Devuelve (items, ventas) corregidos."""
+    items = subtotales_incorrectos(desde_id, hasta_id).update(subtotal=F('cantidad') * F('precio_unitario'))
+
+    ventas = []
+    for venta_id, _, suma in diferencias_ventas(desde_id, hasta_id):
+        ventas.append(Venta(pk=venta_id, total=suma))
+    Venta.objects.bulk_update(ventas, ['total'], batch_size=TAMANIO_LOTE)
+    return items, len(ventas)
+
+
+# -----------------------------------------------------------------------------
+# Rangos de ids para correr en paralelo
+# -----------------------------------------------------------------------------
+def partir_rango(modelo, partes, desde_id=None, hasta_id=None):
+    """Divide el rango de ids de `modelo` en hasta `partes` intervalos [desde, hasta]."""
+    limites = modelo.objects.filter(_filtro_rango('pk', desde_id, hasta_id)).aggregate(
+        primero=Min('pk'), ultimo=Max('pk')
+    )
+    primero, ultimo = limites['primero'], limites['ultimo']
+    if primero is None:
+        return []
+    paso = -(-(ultimo - primero + 1) // partes)  # división redondeando hacia arriba
+    return [(inicio, min(inicio + paso - 1, ultimo)) for inicio in range(primero, ultimo + 1, paso)]
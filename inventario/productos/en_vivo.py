@@ -0,0 +1,164 @@
+# -----------------------------------------------------------------------------
+# productos/en_vivo.py
+# Cambios de stock en vivo (Server-Sent Events) para los listados de productos.
+# -----------------------------------------------------------------------------
+"""
+Cada proceso ASGI tiene un único Difusor: mientras haya al menos una página
+suscripta, consulta cada EN_VIVO_INTERVALO segundos los productos cuyo
+`secuencia` avanzó (ver cambios.py) y reparte el resultado a todas las
+suscripciones. Un producto que cambió varias veces en el intervalo se informa
+una sola vez con su último valor, y solo si el stock o el estado de stock bajo
+cambiaron. Miles de pestañas abiertas cuestan una consulta por intervalo y
+por proceso, no una por pestaña.
+
+Cada evento es una lista JSON de {"id", "stock", "bajo"}. La página indica
+los productos que muestra (`?ids=1,2,3`) y solo recibe esos.
+
+Necesita un servidor ASGI (uvicorn, daphne) que sirva `inventario.asgi`:
+bajo WSGI la vista responde 501 y la página sigue funcionando sin
+actualizaciones en vivo. En productos con stock fragmentado el valor es el
+reflejado en `Producto.stock` (ver stock.stock_total).
+"""
+import asyncio
+import datetime
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.db.models import Max, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Producto
+
+logger = logging.getLogger(__name__)
+
+INTERVALO = getattr(settings, 'EN_VIVO_INTERVALO', 1.0)
+# Se relee lo modificado en este lapso aunque la secuencia no haya avanzado
+MARGEN = datetime.timedelta(seconds=getattr(settings, 'CAMBIOS_MARGEN_SEGUNDOS', 2))
+LATIDO = 15           # segundos entre comentarios para mantener viva la conexión
+MAX_PENDIENTES = 50   # lotes sin leer por suscripción antes de pedirle que recargue
+MAX_IDS = 500
+
+
+class Difusor:
+    def __init__(self, intervalo=INTERVALO):
+        self.intervalo = intervalo
+        self._suscripciones = set()
+        self._tarea = None
+        self._cursor = None
+        self._ultimos = {}  # pk -> (stock, bajo) informado por última vez
+
+    def suscribir(self):
+        cola = asyncio.Queue(maxsize=MAX_PENDIENTES)
+        self._suscripciones.add(cola)
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.get_running_loop().create_task(self._bucle())
+        return cola
+
+    def desuscribir(self, cola):
+        self._suscripciones.discard(cola)
+
+    async def _bucle(self):
+        try:
+            while self._suscripciones:
+                await asyncio.sleep(self.intervalo)
+                try:
+                    cambios = await sync_to_async(self._leer, thread_sensitive=False)()
+                except Exception:
+                    logger.exception("No se pudieron leer los cambios de stock")
+                    continue
+                if cambios:
+                    self._repartir(cambios)
+        finally:
+            # Sin suscripciones no se consulta; la próxima arranca de cero
+            self._tarea = None
+            self._cursor = None
+            self._ultimos = {}
+
+    def _repartir(self, cambios):
+        for cola in list(self._suscripciones):
+            try:
+                cola.put_nowait(cambios)
+            except asyncio.QueueFull:
+                # Cliente que no lee: se descarta lo pendiente y se le pide recargar
+                while not cola.empty():
+                    cola.get_nowait()
+                cola.put_nowait(None)
+
+    def _leer(self):
+        """Productos con stock distinto al último informado (se ejecuta en un hilo)."""
+        close_old_connections()
+        try:
+            if self._cursor is None:
+                self._cursor = Producto.objects.aggregate(m=Max('secuencia'))['m'] or 0
+                return []
+            # Las transacciones pueden confirmar fuera de orden: se relee lo
+            # modificado en los últimos MARGEN segundos además de lo nuevo
+            filas = list(
+                Producto.objects.filter(
+                    Q(secuencia__gt=self._cursor) | Q(fecha_actualizacion__gte=timezone.now() - MARGEN)
+                ).values_list('pk', 'stock', 'stock_minimo', 'secuencia')
+            )
+        finally:
+            close_old_connections()
+
+        cambios = []
+        for pk, stock_actual, minimo, secuencia in filas:
+            self._cursor = max(self._cursor, secuencia)
+            estado = (stock_actual, stock_actual < minimo)
+            if self._ultimos.get(pk) != estado:
+                self._ultimos[pk] = estado
+                cambios.append({'id': pk, 'stock': estado[0], 'bajo': estado[1]})
+        return cambios
+
+
+difusor = Difusor()
+
+
+def _evento(nombre, datos):
+    return f"event: {nombre}\ndata: {json.dumps(datos, separators=(',', ':'))}\n\n"
+
+
+async def _stream(ids):
+    cola = difusor.suscribir()
+    try:
+        yield f"retry: 5000\n: conectado {datetime.datetime.now().isoformat()}\n\n"
+        while True:
+            try:
+                cambios = await asyncio.wait_for(cola.get(), timeout=LATIDO)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                continue
+            if cambios is None:
+                yield _evento('recargar', {})
+                continue
+            propios = [c for c in cambios if c['id'] in ids] if ids else cambios
+            if propios:
+                yield _evento('stock', propios)
+    finally:
+        difusor.desuscribir(cola)
+
+
+async def stream_stock(request):
+    """GET /en-vivo/stock/?ids=1,2,3 — eventos de cambio de stock (text/event-stream)."""
+    usuario = await request.auser()
+    if not usuario.is_authenticated or not await usuario.ahas_perm('productos.view_producto'):
+        return JsonResponse({"error": "No autorizado"}, status=403)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Las actualizaciones en vivo requieren un servidor ASGI"}, status=501)
+
+    try:
+        ids = {int(i) for i in request.GET.get('ids', '').split(',') if i.strip()}
+    except ValueError:
+        return JsonResponse({"error": "Parámetro ids inválido"}, status=400)
+    if len(ids) > MAX_IDS:
+        return JsonResponse({"error": f"Máximo {MAX_IDS} productos por suscripción"}, status=400)
+
+    response = StreamingHttpResponse(_stream(ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx no debe acumular la respuesta
+    return response
@@ -1,23 +1,49 @@
 # Importaciones necesarias de Django y Crispy Forms
+from decimal import Decimal
+
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
 # Importamos los modelos para los formularios basados en modelos
-from .models import Producto, MovimientoStock
+from .models import Deposito, Producto, MovimientoStock
 # Importamos las herramientas de Crispy Forms
 from crispy_forms.helper import FormHelper #esto no lo marcaba en la clase
 from crispy_forms.layout import Layout, Row, Column, Submit, Reset, ButtonHolder, Field, Div, HTML
 from crispy_forms.bootstrap import AppendedText, PrependedText, FormActions
 # Importamos nuestro helper base para no repetir código
 from .crispy import BaseFormHelper
+from .stock import stock_en_deposito, stock_por_deposito, stock_total
+from . import cambios, sku_index
+from .signals import precio_modificado
+from .precios import DIRECCIONES as DIRECCIONES_REDONDEO, MODOS as MODOS_AJUSTE
 
 # -----------------------------------------------------------------------------
 # Formulario para el modelo Producto
 # -----------------------------------------------------------------------------
+class EdicionConflictiva(Exception):
+    """Otro usuario modificó el producto después de abrir el formulario."""
+
+    def __init__(self, actual):
+        super().__init__("El producto fue modificado por otro usuario")
+        self.actual = actual
+
+
 class ProductoForm(forms.ModelForm):
     """
     Formulario para la creación y edición de productos.
     Hereda de forms.ModelForm para manejar el modelo Producto.
+
+    Al editar no incluye el stock (se cambia con movimientos y ajustes) y
+    guarda con bloqueo optimista: el UPDATE solo se aplica si el producto
+    sigue en la versión con la que se abrió el formulario; si no, lanza
+    EdicionConflictiva.
     """
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+    costo_unitario = forms.DecimalField(
+        label="Costo unitario", max_digits=12, decimal_places=4, min_value=0, required=False,
+        help_text="Costo de compra del stock inicial, para la valuación del inventario",
+    )
+
     class Meta:
         # Vinculamos este formulario al modelo Producto
         model = Producto
@@ -38,6 +64,16 @@ class ProductoForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.editando = not self.instance._state.adding
+        if self.editando:
+            # El stock de un producto existente solo cambia con movimientos o ajustes
+            del self.fields["stock"]
+            del self.fields["costo_unitario"]
+            self.fields["version"].required = True
+            self.fields["version"].initial = self.instance.version
+        else:
+            del self.fields["version"]
+
         # Asignamos nuestro helper de formulario base para el diseño
         self.helper = BaseFormHelper()
 
@@ -49,7 +85,9 @@ class ProductoForm(forms.ModelForm):
             Field("descripcion"),
             # 'PrependedText' añade un prefijo (ej: el símbolo de $) al campo de precio
             PrependedText("precio", "$", placeholder="0.00"),
-            Field("stock"),
+            Field("version") if self.editando else Row(
+                Column("stock"), Column(PrependedText("costo_unitario", "$", placeholder="0.00")),
+            ),
             Field("stock_minimo"),
             Field("imagen"),
             # 'ButtonHolder' agrupa los botones en un contenedor
@@ -86,6 +124,42 @@ class ProductoForm(forms.ModelForm):
         if stock_minimo and stock_minimo < 0:
             raise ValidationError("No puede haber valor negativo de stock minimo")
         return stock_minimo
+
+    # --------------------------------------------------------------------------
+    # Guardado de la edición con bloqueo optimista
+    # --------------------------------------------------------------------------
+    def save(self, commit=True):
+        if not self.editando or not commit:
+            return super().save(commit)
+
+        producto = self.instance
+        version = self.cleaned_data["version"]
+        campos = [nombre for nombre in self._meta.fields if nombre in self.fields and nombre in self.changed_data]
+        valores = {}
+        for nombre in campos:
+            campo = Producto._meta.get_field(nombre)
+            # pre_save sube el archivo de una imagen nueva al almacenamiento
+            valores[campo.attname] = campo.pre_save(producto, False)
+
+        with transaction.atomic():
+            actualizados = Producto.objects.filter(pk=producto.pk, version=version).update(
+                version=version + 1, **valores, **cambios.marcas()
+            )
+            if not actualizados:
+                raise EdicionConflictiva(Producto.objects.get(pk=producto.pk))
+            if "precio" in campos:
+                # update() no dispara post_save: se avisa a las listas de precios
+                transaction.on_commit(
+                    lambda: precio_modificado.send(sender=Producto, producto_ids=[producto.pk])
+                )
+        producto.version = version + 1
+        producto.marcar_guardado(campos + ["version"])
+
+        sku_index.indice.actualizar(producto)
+        sku_index.marcar_cambio()
+        if "imagen" in campos:
+            producto.programar_procesamiento_imagen()
+        return producto
     
 # -----------------------------------------------------------------------------
 # Formulario para el modelo MovimientoStock
@@ -97,21 +171,29 @@ class MovimientoStockForm(forms.ModelForm):
     """
     class Meta:
         model = MovimientoStock
-        fields = ["tipo", "cantidad", "motivo"]
+        fields = ["tipo", "deposito", "cantidad", "costo_unitario", "motivo"]
         widgets = {
             "motivo": forms.Textarea(attrs={"rows": 3}),
         }
         labels = {
             "tipo": "Tipo de movimiento",
+            "deposito": "Depósito",
             "cantidad": "Cantidad",
+            "costo_unitario": "Costo unitario (entradas)",
             "motivo": "Motivo (opcional)"
         }
+        help_texts = {
+            "costo_unitario": "Si se deja vacío se usa el último costo registrado del producto",
+        }
         
     def __init__(self, *args, **kwargs):
         # Sacamos la instancia del producto de los kwargs para usarla en la validación y el layout
         self.producto = kwargs.pop("producto", None)
         super().__init__(*args, **kwargs)
         self.helper = BaseFormHelper()
+        self.fields["deposito"].queryset = Deposito.objects.filter(activo=True)
+        self.fields["deposito"].required = True
+        self.fields["deposito"].initial = Deposito.id_principal()
 
         # Creamos una cadena HTML para mostrar información del producto
         stock_info = ""
@@ -119,14 +201,16 @@ class MovimientoStockForm(forms.ModelForm):
             stock_info = f"""
             <div class="alert alert-info">
                 <strong>Producto:</strong> {self.producto.nombre}<br>
-                <strong>Stock actual:</strong> {self.producto.stock}
+                <strong>Stock actual:</strong> {stock_total(self.producto)}
             </div>
             """
 
         self.helper.layout = Layout(
             HTML(stock_info),  # Insertamos la información del stock antes de los campos
             Field("tipo"),
+            Field("deposito"),
             Field("cantidad"),
+            PrependedText("costo_unitario", "$", placeholder="0.00"),
             Field("motivo"),
             ButtonHolder(
                 Submit("submit", "Registrar movimiento", css_class="btn btn-success"),
@@ -141,14 +225,24 @@ class MovimientoStockForm(forms.ModelForm):
         cantidad = self.cleaned_data.get("cantidad")
         if cantidad <= 0:
             raise ValidationError("La cantidad debe ser mayor a cero")
-        
-        # Validación de lógica de negocio: verificar stock suficiente para una salida
-        if self.producto and self.cleaned_data.get("tipo") == "salida":
-            if cantidad > self.producto.stock:
-                raise ValidationError(
-                    f"No hay suficiente stock. Disponible: {self.producto.stock}"
-                )
         return cantidad
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Validación de lógica de negocio: verificar stock suficiente en el depósito para una salida
+        cantidad, deposito = cleaned_data.get("cantidad"), cleaned_data.get("deposito")
+        if self.producto and cleaned_data.get("tipo") == "salida" and cantidad and deposito:
+            disponible = stock_en_deposito(self.producto, deposito)
+            if cantidad > disponible:
+                self.add_error("cantidad", f"No hay suficiente stock en {deposito}. Disponible: {disponible}")
+        costo = cleaned_data.get("costo_unitario")
+        if costo is not None:
+            if costo < 0:
+                self.add_error("costo_unitario", "El costo no puede ser negativo")
+            elif cleaned_data.get("tipo") != "entrada":
+                # Las salidas se valúan con las capas FIFO, no con un costo manual
+                cleaned_data["costo_unitario"] = None
+        return cleaned_data
      
 # -----------------------------------------------------------------------------
 # Formulario para ajustar el stock a un valor específico(termina la clase)
@@ -163,6 +257,12 @@ class AjusteStockForm(forms.Form):
         label="Nuevo Stock",
         help_text="Establece el nuevo valor de stock para el producto."
     )
+    deposito = forms.ModelChoiceField(
+        queryset=Deposito.objects.filter(activo=True),
+        required=False,
+        label="Depósito",
+        help_text="Vacío: la cantidad es el stock total y la diferencia se aplica al depósito principal."
+    )
     motivo = forms.CharField(
         required=False,
         widget=forms.Textarea(attrs={'rows': 2}),
@@ -178,17 +278,19 @@ class AjusteStockForm(forms.Form):
         # Mostramos el stock actual para contexto del usuario
         stock_info = ""
         if self.producto:
+            stock_actual = stock_total(self.producto)
             stock_info = f"""
             <div class="alert alert-info">
                 <strong>Producto:</strong> {self.producto.nombre}<br>
-                <strong>Stock actual:</strong> {self.producto.stock}
+                <strong>Stock actual:</strong> {stock_actual}
             </div>
             """
             # Establecemos el valor inicial del campo 'cantidad' al stock actual
-            self.fields['cantidad'].initial = self.producto.stock
+            self.fields['cantidad'].initial = stock_actual
         
         self.helper.layout = Layout(
             HTML(stock_info),
+            Field('deposito'),
             Field('cantidad'),
             Field('motivo'),
             ButtonHolder(
@@ -197,6 +299,59 @@ class AjusteStockForm(forms.Form):
             )
         )
 
+# -----------------------------------------------------------------------------
+# Formulario para transferir stock entre depósitos
+# -----------------------------------------------------------------------------
+class TransferenciaStockForm(forms.Form):
+    """
+    Pasa unidades de un producto de un depósito a otro. El stock total del
+    producto no cambia (ver stock.transferir).
+    """
+    origen = forms.ModelChoiceField(queryset=Deposito.objects.filter(activo=True), label="Desde")
+    destino = forms.ModelChoiceField(queryset=Deposito.objects.filter(activo=True), label="Hacia")
+    cantidad = forms.IntegerField(min_value=1, label="Cantidad")
+    motivo = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 2}),
+        label="Motivo (opcional)",
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.producto = kwargs.pop('producto', None)
+        super().__init__(*args, **kwargs)
+        self.helper = BaseFormHelper()
+        self.fields['origen'].initial = Deposito.id_principal()
+
+        stock_info = ""
+        if self.producto:
+            por_deposito = "<br>".join(
+                f"<strong>{deposito}:</strong> {cantidad}" for deposito, cantidad in stock_por_deposito(self.producto)
+            )
+            stock_info = f"""
+            <div class="alert alert-info">
+                <strong>Producto:</strong> {self.producto.nombre}<br>
+                {por_deposito}
+            </div>
+            """
+
+        self.helper.layout = Layout(
+            HTML(stock_info),
+            Row(Column('origen'), Column('destino')),
+            Field('cantidad'),
+            Field('motivo'),
+            ButtonHolder(
+                Submit('submit', 'Transferir', css_class='btn btn-primary'),
+                HTML('<a href="{{ request.META.HTTP_REFERER }}" class="btn btn-secondary">Cancelar</a>')
+            )
+        )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        origen, destino = cleaned_data.get('origen'), cleaned_data.get('destino')
+        if origen and destino and origen == destino:
+            self.add_error('destino', "El depósito de destino debe ser distinto del de origen")
+        return cleaned_data
+
 # -----------------------------------------------------------------------------
 # Helpers y formularios para filtros
 # -----------------------------------------------------------------------------
@@ -253,4 +408,25 @@ class FiltroProductosForm(forms.Form):
                 # Alineamos los elementos verticalmente al centro
                 css_class='form-row align-items-center'
             )
-        )
\ No newline at end of file
+        )
+# -----------------------------------------------------------------------------
+# Formulario para el ajuste masivo de precios (acción del admin)
+# -----------------------------------------------------------------------------
+class AjustePreciosForm(forms.Form):
+    """
+    Parámetros de un ajuste de precios sobre varios productos.
+    Se usa en la página intermedia de la acción del admin.
+    """
+    modo = forms.ChoiceField(choices=MODOS_AJUSTE, label="Tipo de ajuste")
+    valor = forms.DecimalField(
+        max_digits=10, decimal_places=2,
+        label="Valor",
+        help_text="Porcentaje (10 = +10%, -5 = -5%) o monto a sumar al precio."
+    )
+    paso = forms.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0.01'), initial=Decimal('0.01'),
+        label="Redondear a múltiplos de",
+        help_text="0.01 = centavos, 1 = pesos enteros, 10 = decenas."
+    )
+    direccion = forms.ChoiceField(choices=DIRECCIONES_REDONDEO, label="Redondeo")
+    motivo = forms.CharField(required=False, max_length=200, label="Motivo")
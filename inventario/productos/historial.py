@@ -0,0 +1,120 @@
+# -----------------------------------------------------------------------------
+# productos/historial.py
+# Evolución del stock de un producto agrupada por día, semana o mes.
+# -----------------------------------------------------------------------------
+"""
+Las entradas y salidas de cada período salen de una sola consulta agrupada
+por fecha truncada; el acumulado se calcula en la misma consulta con una
+función de ventana (SUM ... OVER ORDER BY período). El nivel de stock de cada
+período se obtiene hacia atrás desde el stock actual, así no hace falta leer
+el historial completo del producto.
+
+Si el rango pedido tiene más períodos que `puntos`, se usa la granularidad
+siguiente (día -> semana -> mes) y, de ser necesario, se juntan períodos
+consecutivos hasta quedar en `puntos` valores.
+"""
+import datetime
+
+from django.db.models import Case, F, Func, IntegerField, Q, Sum, Value, When, Window
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import MovimientoStock
+from . import stock
+
+PERIODOS = {
+    'dia': ('day', 1),
+    'semana': ('week', 7),
+    'mes': ('month', 30),
+}
+PUNTOS_POR_DEFECTO = 120
+PUNTOS_MAXIMOS = 1000
+
+
+class _SumaAcumulada(Func):
+    """SUM(<agregado>) para usar dentro de Window: acumula el total de cada grupo."""
+    function = 'SUM'
+    window_compatible = True
+    output_field = IntegerField()
+
+
+def elegir_periodo(desde, hasta, puntos):
+    """Granularidad más fina que no supere `puntos` períodos en el rango."""
+    dias = (hasta - desde).days + 1
+    for periodo, (_, largo) in PERIODOS.items():
+        if dias / largo <= puntos:
+            return periodo
+    return 'mes'
+
+
+def _signo():
+    return Case(
+        When(tipo='entrada', then=F('cantidad')),
+        When(tipo='salida', then=-F('cantidad')),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _limite(fecha, fin=False):
+    hora = datetime.time.max if fin else datetime.time.min
+    return timezone.make_aware(datetime.datetime.combine(fecha, hora))
+
+
+def _agrupar(filas, puntos):
+    """Junta filas consecutivas hasta dejar como mucho `puntos`."""
+    if len(filas) <= puntos:
+        return filas
+    tamanio = -(-len(filas) // puntos)  # división redondeando hacia arriba
+    agrupadas = []
+    for inicio in range(0, len(filas), tamanio):
+        grupo = filas[inicio:inicio + tamanio]
+        agrupadas.append({
+            'fecha': grupo[0]['fecha'],
+            'entradas': sum(f['entradas'] for f in grupo),
+            'salidas': sum(f['salidas'] for f in grupo),
+            'stock': grupo[-1]['stock'],
+        })
+    return agrupadas
+
+
+def serie_stock(producto, desde, hasta, periodo=None, puntos=PUNTOS_POR_DEFECTO):
+    """
+    Devuelve (periodo, filas) con una fila por período que tuvo movimientos:
+    {'fecha', 'entradas', 'salidas', 'stock'}, donde `stock` es el nivel al
+    cierre del período.
+    """
+    periodo = periodo or elegir_periodo(desde, hasta, puntos)
+    truncar, _ = PERIODOS[periodo]
+    inicio, fin = _limite(desde), _limite(hasta, fin=True)
+
+    movimientos = MovimientoStock.objects.filter(producto=producto).order_by()
+    grupos = (
+        movimientos.filter(fecha__gte=inicio, fecha__lte=fin)
+        .annotate(periodo=Trunc('fecha', truncar))
+        .values('periodo')
+        .annotate(
+            entradas=Sum('cantidad', filter=Q(tipo='entrada'), default=0),
+            salidas=Sum('cantidad', filter=Q(tipo='salida'), default=0),
+            neto=Sum(_signo(), default=0),
+        )
+        .annotate(acumulado=Window(_SumaAcumulada(Sum(_signo())), order_by=F('periodo').asc()))
+        .order_by('periodo')
+    )
+    filas = list(grupos)
+
+    # Nivel antes del rango: stock actual menos todo lo que pasó desde `desde`
+    posterior = movimientos.filter(fecha__gt=fin).aggregate(neto=Sum(_signo(), default=0))['neto']
+    en_rango = filas[-1]['acumulado'] if filas else 0
+    base = stock.stock_total(producto) - posterior - en_rango
+
+    serie = [
+        {
+            'fecha': fila['periodo'].date() if hasattr(fila['periodo'], 'date') else fila['periodo'],
+            'entradas': fila['entradas'],
+            'salidas': fila['salidas'],
+            'stock': base + fila['acumulado'],
+        }
+        for fila in filas
+    ]
+    return periodo, _agrupar(serie, puntos)
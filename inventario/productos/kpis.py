@@ -0,0 +1,228 @@
+# -----------------------------------------------------------------------------
+# productos/kpis.py
+# Indicadores del panel de control, actualizados de forma incremental.
+# -----------------------------------------------------------------------------
+"""
+Los caminos de escritura (movimientos de stock, ventas, alta y edición de
+productos) registran sus deltas en DeltaIndicador y VentaProductoDia. El
+panel lee esos contadores y guarda el resumen en caché, así nunca recorre
+las tablas grandes.
+
+Un delta es una fila nueva (INSERT), no un UPDATE sobre un contador
+compartido: una venta con varios items no toma bloqueos de filas de
+indicadores, así que dos ventas concurrentes no se esperan ni se traban por
+el panel. La tarea productos.consolidar_kpis (cada KPI_CONSOLIDAR_SEGUNDOS)
+suma los deltas en Indicador y los borra; hasta entonces el panel los suma
+al leer.
+
+Los deltas de stock se calculan con el valor que tenía el producto en
+memoria, así que con escrituras concurrentes pueden desviarse un poco; la
+tarea productos.recalcular_kpis (cada KPI_RECALCULO_HORAS, también
+`manage.py recalcular_kpis`) recalcula todo desde cero y corrige cualquier
+diferencia.
+"""
+import datetime
+import random
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from inventario import metricas
+from .models import DeltaIndicador, Indicador, Producto, VentaProductoDia
+
+SHARDS = getattr(settings, 'KPI_SHARDS', 8)
+TAMANIO_LOTE = 5000
+CACHE_TTL = getattr(settings, 'KPI_CACHE_TTL', 30)
+CLAVE_CACHE = 'productos:panel'
+DIAS_MAS_VENDIDOS = 7
+
+VALOR_INVENTARIO = 'valor_inventario'
+STOCK_BAJO = 'stock_bajo'
+
+
+def clave_ventas_importe(fecha):
+    return f"ventas_importe:{fecha:%Y-%m-%d}"
+
+
+def clave_ventas_cantidad(fecha):
+    return f"ventas_cantidad:{fecha:%Y-%m-%d}"
+
+
+# -----------------------------------------------------------------------------
+# Escrituras incrementales
+# -----------------------------------------------------------------------------
+def sumar(clave, delta):
+    """Registra que el indicador cambia en `delta` (se consolida después)."""
+    if delta:
+        DeltaIndicador.objects.create(clave=clave, valor=delta)
+
+
+def registrar_producto(anterior, actual):
+    """
+    Registra el cambio de un producto. `anterior` y `actual` son tuplas
+    (precio, stock, stock_minimo); None si el producto no existía o se eliminó.
+    """
+    precio_a, stock_a, minimo_a = anterior or (0, 0, 0)
+    precio_n, stock_n, minimo_n = actual or (0, 0, 0)
+    sumar(VALOR_INVENTARIO, Decimal(precio_n) * stock_n - Decimal(precio_a) * stock_a)
+
+    bajo_antes = anterior is not None and stock_a < minimo_a
+    bajo_ahora = actual is not None and stock_n < minimo_n
+    if bajo_antes != bajo_ahora:
+        sumar(STOCK_BAJO, 1 if bajo_ahora else -1)
+
+
+def registrar_cambio_stock(producto, anterior):
+    """Registra que el stock del producto pasó de `anterior` a `producto.stock`."""
+    registrar_producto(
+        (producto.precio, anterior, producto.stock_minimo),
+        (producto.precio, producto.stock, producto.stock_minimo),
+    )
+
+
+def registrar_venta(venta, items):
+    """Suma la venta al total del día y las unidades de cada item al ranking."""
+    fecha = venta.fecha or timezone.localdate()
+    sumar(clave_ventas_importe(fecha), venta.total)
+    sumar(clave_ventas_cantidad(fecha), 1)
+
+    por_producto = defaultdict(lambda: [0, 0])
+    for item in items:
+        por_producto[item.producto_id][0] += item.cantidad
+        por_producto[item.producto_id][1] += item.subtotal
+    shard = random.randrange(SHARDS)
+    # En orden de producto: dos ventas con los mismos productos toman las filas en el mismo orden
+    for producto_id, (unidades, importe) in sorted(por_producto.items()):
+        filtro = dict(fecha=fecha, producto_id=producto_id, shard=shard)
+        cambios = dict(unidades=F('unidades') + unidades, importe=F('importe') + importe)
+        if not VentaProductoDia.objects.filter(**filtro).update(**cambios):
+            VentaProductoDia.objects.bulk_create([VentaProductoDia(**filtro)], ignore_conflicts=True)
+            VentaProductoDia.objects.filter(**filtro).update(**cambios)
+
+
+# -----------------------------------------------------------------------------
+# Lectura para el panel
+# -----------------------------------------------------------------------------
+def _sumas(modelo, claves):
+    return dict(
+        modelo.objects.filter(clave__in=claves).order_by()
+        .values('clave').annotate(total=Sum('valor')).values_list('clave', 'total')
+    )
+
+
+def _leer(claves):
+    consolidados = _sumas(Indicador, claves)
+    pendientes = _sumas(DeltaIndicador, claves)
+    return {clave: (consolidados.get(clave) or Decimal(0)) + (pendientes.get(clave) or 0) for clave in claves}
+
+
+def calcular_resumen():
+    hoy = timezone.localdate()
+    valores = _leer([VALOR_INVENTARIO, STOCK_BAJO, clave_ventas_importe(hoy), clave_ventas_cantidad(hoy)])
+    mas_vendidos = list(
+        VentaProductoDia.objects.filter(fecha__gt=hoy - datetime.timedelta(days=DIAS_MAS_VENDIDOS))
+        .order_by().values('producto_id', 'producto__nombre')
+        .annotate(unidades_total=Sum('unidades'), importe_total=Sum('importe'))
+        .order_by('-unidades_total')[:5]
+    )
+    return {
+        'valor_inventario': valores[VALOR_INVENTARIO],
+        'stock_bajo': int(valores[STOCK_BAJO]),
+        'ventas_hoy_importe': valores[clave_ventas_importe(hoy)],
+        'ventas_hoy_cantidad': int(valores[clave_ventas_cantidad(hoy)]),
+        'mas_vendidos': mas_vendidos,
+        'dias_mas_vendidos': DIAS_MAS_VENDIDOS,
+        'calculado': timezone.now(),
+    }
+
+
+def resumen():
+    """Indicadores del panel, servidos desde la caché."""
+    datos = cache.get(CLAVE_CACHE)
+    metricas.registrar_cache('panel', datos is not None)
+    if datos is None:
+        datos = calcular_resumen()
+        cache.set(CLAVE_CACHE, datos, CACHE_TTL)
+    return datos
+
+
+# -----------------------------------------------------------------------------
+# Consolidación y recálculo completo
+# -----------------------------------------------------------------------------
+def consolidar(tamanio_lote=TAMANIO_LOTE):
+    """
+    Suma los deltas pendientes en Indicador y los borra, un lote por
+    transacción. Devuelve la cantidad de deltas consolidados.
+    """
+    consolidados = 0
+    while True:
+        with transaction.atomic():
+            # Solo los deltas ya confirmados son visibles: los de transacciones
+            # en curso quedan para la próxima pasada
+            deltas = list(
+                DeltaIndicador.objects.select_for_update().order_by('id')
+                .values_list('id', 'clave', 'valor')[:tamanio_lote]
+            )
+            por_clave = defaultdict(Decimal)
+            for _, clave, valor in deltas:
+                por_clave[clave] += valor
+            # En orden de clave: dos consolidaciones no se traban entre sí
+            for clave, valor in sorted(por_clave.items()):
+                if not Indicador.objects.filter(clave=clave, shard=0).update(valor=F('valor') + valor):
+                    Indicador.objects.bulk_create([Indicador(clave=clave, shard=0)], ignore_conflicts=True)
+                    Indicador.objects.filter(clave=clave, shard=0).update(valor=F('valor') + valor)
+            DeltaIndicador.objects.filter(id__in=[pk for pk, _, _ in deltas]).delete()
+        consolidados += len(deltas)
+        if len(deltas) < tamanio_lote:
+            return consolidados
+
+
+def _fijar(clave, valor):
+    Indicador.objects.filter(clave=clave).delete()
+    Indicador.objects.create(clave=clave, shard=0, valor=valor)
+
+
+@transaction.atomic
+def recalcular(dias=30):
+    """Recalcula todos los indicadores desde las tablas de origen."""
+    from ventas.models import ItemVenta, Venta
+
+    # Lo que se recalcula reemplaza a los deltas que ya estaban confirmados
+    DeltaIndicador.objects.all().delete()
+    valor = ExpressionWrapper(F('precio') * F('stock'), output_field=DecimalField(max_digits=16, decimal_places=2))
+    _fijar(VALOR_INVENTARIO, Producto.objects.aggregate(total=Sum(valor))['total'] or 0)
+    _fijar(STOCK_BAJO, Producto.objects.filter(stock__lt=F('stock_minimo')).count())
+
+    desde = timezone.localdate() - datetime.timedelta(days=dias - 1)
+    Indicador.objects.filter(clave__startswith='ventas_').delete()
+    por_dia = list(
+        Venta.objects.filter(fecha__gte=desde).order_by()
+        .values('fecha').annotate(importe=Sum('total'), cantidad=Count('id'))
+    )
+    Indicador.objects.bulk_create(
+        [Indicador(clave=clave_ventas_importe(fila['fecha']), valor=fila['importe']) for fila in por_dia]
+        + [Indicador(clave=clave_ventas_cantidad(fila['fecha']), valor=fila['cantidad']) for fila in por_dia]
+    )
+
+    VentaProductoDia.objects.all().delete()
+    por_producto = (
+        ItemVenta.objects.filter(venta__fecha__gte=desde).order_by()
+        .values('venta__fecha', 'producto_id')
+        .annotate(unidades=Sum('cantidad'), importe=Sum('subtotal'))
+    )
+    VentaProductoDia.objects.bulk_create(
+        [
+            VentaProductoDia(
+                fecha=fila['venta__fecha'], producto_id=fila['producto_id'],
+                unidades=fila['unidades'], importe=fila['importe'],
+            )
+            for fila in por_producto.iterator()
+        ],
+        batch_size=1000,
+    )
+    cache.delete(CLAVE_CACHE)
@@ -0,0 +1,73 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import precios
+
+
+def _decimal(texto):
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        raise CommandError(f'Valor inválido: {texto}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Ajusta en bloque el precio de los productos (porcentaje o monto fijo) con un único UPDATE '
+        'y guarda el historial de precios.'
+    )
+
+    def add_arguments(self, parser):
+        ajuste = parser.add_mutually_exclusive_group(required=True)
+        ajuste.add_argument('--porcentaje', help='Porcentaje a aplicar (10 = +10%%, -5 = -5%%)')
+        ajuste.add_argument('--monto', help='Monto fijo a sumar (negativo para restar)')
+        parser.add_argument('--redondeo', default='0.01', help='Redondear a múltiplos de este valor (0.01, 1, 10...)')
+        parser.add_argument('--hacia-arriba', action='store_true', help='Redondear siempre hacia arriba')
+        parser.add_argument('--buscar', help='Solo productos cuyo nombre contenga el texto o cuyo SKU sea igual')
+        parser.add_argument('--skus', help='Lista de SKU separados por coma')
+        parser.add_argument('--archivo-skus', help='Archivo con un SKU por línea')
+        parser.add_argument('--motivo', default='', help='Motivo que queda en el historial')
+        parser.add_argument('--usuario', default='Sistema', help='Usuario que queda en el historial')
+        parser.add_argument('--dry-run', action='store_true', help='Muestra una vista previa sin modificar nada')
+
+    def handle(self, *args, **options):
+        modo = 'porcentaje' if options['porcentaje'] is not None else 'fijo'
+        valor = _decimal(options['porcentaje'] if modo == 'porcentaje' else options['monto'])
+        paso = _decimal(options['redondeo'])
+        if paso <= 0:
+            raise CommandError('--redondeo debe ser mayor a cero')
+        direccion = 'arriba' if options['hacia_arriba'] else 'cercano'
+
+        skus = []
+        if options['skus']:
+            skus += [sku.strip() for sku in options['skus'].split(',') if sku.strip()]
+        if options['archivo_skus']:
+            with open(options['archivo_skus'], encoding='utf-8') as archivo:
+                skus += [linea.strip() for linea in archivo if linea.strip()]
+
+        queryset = precios.filtrar(buscar=options['buscar'], skus=skus)
+        total = queryset.count()
+        expresion = precios.expresion_precio(modo, valor, paso, direccion)
+        if options['dry_run']:
+            for _, nombre, actual, nuevo in precios.previsualizar(queryset, expresion):
+                self.stdout.write(f'{nombre}: {actual} -> {Decimal(nuevo):.2f}')
+            self._informar_no_positivos(queryset, expresion)
+            self.stdout.write(self.style.WARNING(f'Dry run: se ajustarían {total} productos.'))
+            return
+
+        try:
+            cambiados = precios.aplicar(
+                queryset, modo, valor, paso, direccion, usuario=options['usuario'], motivo=options['motivo']
+            )
+        except precios.PrecioNoPositivo as error:
+            self._informar_no_positivos(queryset, expresion)
+            raise CommandError(f'{error}. No se modificó ningún precio.')
+        self.stdout.write(self.style.SUCCESS(f'Precio actualizado en {cambiados} de {total} productos.'))
+
+    def _informar_no_positivos(self, queryset, expresion):
+        cantidad, filas = precios.no_positivos(queryset, expresion)
+        for _, nombre, actual, nuevo in filas:
+            self.stdout.write(self.style.ERROR(f'{nombre}: {actual} -> {Decimal(nuevo):.2f} (precio no positivo)'))
+        if cantidad > len(filas):
+            self.stdout.write(self.style.ERROR(f'... y {cantidad - len(filas)} productos más'))
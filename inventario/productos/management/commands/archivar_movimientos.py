@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import particiones, valuacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea las particiones mensuales de movimientos de los próximos meses y archiva '
+        'los meses más viejos en archivos JSON-lines comprimidos. Pensado para correr una vez por mes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses', type=int, default=settings.MOVIMIENTOS_MESES_ACTIVOS,
+            help='Meses de movimientos que se mantienen en la base (los anteriores se archivan)',
+        )
+        parser.add_argument(
+            '--directorio', default=str(settings.MOVIMIENTOS_ARCHIVO_DIR),
+            help='Carpeta donde se guardan los archivos .jsonl.gz',
+        )
+        parser.add_argument(
+            '--crear-particiones', type=int, default=3,
+            help='Cantidad de meses futuros para los que se crean particiones (solo Postgres)',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra qué meses se archivarían')
+
+    def handle(self, *args, **options):
+        # Los movimientos que se van a borrar tienen que estar valuados antes
+        if not options['dry_run']:
+            valuacion.procesar()
+        if particiones.esta_particionada():
+            for nombre in particiones.asegurar_particiones(options['crear_particiones']):
+                self.stdout.write(f'Partición creada: {nombre}')
+
+        meses = particiones.meses_a_archivar(options['meses'])
+        if not meses:
+            self.stdout.write(self.style.SUCCESS('No hay meses para archivar.'))
+            return
+
+        for anio, mes in meses:
+            if options['dry_run']:
+                self.stdout.write(f'Se archivaría {mes:02d}/{anio}')
+                continue
+            try:
+                cantidad = particiones.archivar_mes(anio, mes, options['directorio'])
+            except particiones.ArchivoIncompleto as error:
+                raise CommandError(f'{mes:02d}/{anio} no se archivó: {error}')
+            self.stdout.write(f'{mes:02d}/{anio}: {cantidad} movimientos archivados')
+
+        self.stdout.write(self.style.SUCCESS('Archivo de movimientos terminado.'))
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import reposicion
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula el stock mínimo sugerido (punto de reposición) de todo el catálogo '
+        'a partir del historial de ventas y salidas, y lo guarda en Producto.stock_minimo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=730, help='Días de historial a considerar')
+        parser.add_argument(
+            '--lead-time', type=float, default=settings.REPOSICION_LEAD_TIME_DIAS,
+            help='Días que tarda en llegar la reposición',
+        )
+        parser.add_argument(
+            '--nivel-servicio', type=float, default=settings.REPOSICION_NIVEL_SERVICIO,
+            help='Probabilidad de no quedarse sin stock durante la reposición (entre 0 y 1)',
+        )
+        parser.add_argument('--minimo', type=int, default=0, help='Valor mínimo de stock mínimo sugerido')
+        parser.add_argument('--dry-run', action='store_true', help='Calcula pero no guarda')
+
+    def handle(self, *args, **options):
+        if not 0 < options['nivel_servicio'] < 1:
+            raise CommandError('El nivel de servicio debe estar entre 0 y 1')
+        if options['dias'] <= 0 or options['lead_time'] <= 0:
+            raise CommandError('Los días de historial y el lead time deben ser mayores a cero')
+
+        inicio = time.monotonic()
+        sugeridos = reposicion.sugerir_stock_minimo(
+            options['dias'], options['lead_time'], options['nivel_servicio'], options['minimo']
+        )
+        self.stdout.write(
+            f'{len(sugeridos)} productos con demanda calculados en {time.monotonic() - inicio:.2f}s'
+        )
+
+        if options['dry_run']:
+            return
+
+        actualizados = reposicion.guardar_stock_minimo(sugeridos)
+        self.stdout.write(self.style.SUCCESS(
+            f'Stock mínimo actualizado en {actualizados} productos ({time.monotonic() - inicio:.2f}s en total).'
+        ))
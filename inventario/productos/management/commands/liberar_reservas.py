@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from productos import reservas
+
+
+class Command(BaseCommand):
+    help = (
+        'Libera por lotes las reservas de stock vencidas de ventas que no se confirmaron. '
+        'Pensado para correr cada minuto por cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=reservas.TAMANIO_LOTE, help='Reservas por transacción')
+
+    def handle(self, *args, **options):
+        liberadas = reservas.liberar_vencidas(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{liberadas} reservas liberadas.'))
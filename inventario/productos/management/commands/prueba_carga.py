@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import carga
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula cajeros concurrentes registrando ventas y movimientos de stock sobre los mismos '
+        'productos. Informa throughput, latencias y esperas por bloqueos, y al final verifica '
+        'que no haya sobreventa ni diferencias entre stock, movimientos y ventas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cajeros', type=int, default=8, help='Hilos concurrentes')
+        parser.add_argument('--operaciones', type=int, default=50, help='Operaciones por cajero')
+        parser.add_argument('--productos', type=int, default=5, help='Productos compartidos por todos los cajeros')
+        parser.add_argument('--stock-inicial', type=int, default=100)
+        parser.add_argument(
+            '--proporcion-movimientos', type=float, default=0.3,
+            help='Fracción de operaciones que son movimientos de stock (el resto son ventas)',
+        )
+        parser.add_argument('--max-items', type=int, default=3, help='Máximo de items por venta')
+        parser.add_argument(
+            '--fragmentos', type=int, default=0,
+            help='Activa el stock fragmentado con esta cantidad de fragmentos en los productos de prueba',
+        )
+        parser.add_argument(
+            '--url',
+            help='URL base de un servidor que use esta misma base (p. ej. http://localhost:8000). '
+                 'Sin URL las peticiones se atienden en este proceso.',
+        )
+        parser.add_argument('--limpiar', action='store_true', help='Borra los datos de prueba al terminar')
+
+    def handle(self, *args, **options):
+        if options['cajeros'] < 1 or options['operaciones'] < 1 or options['productos'] < 1:
+            raise CommandError('--cajeros, --operaciones y --productos deben ser al menos 1')
+        if not 0 <= options['proporcion_movimientos'] <= 1:
+            raise CommandError('--proporcion-movimientos debe estar entre 0 y 1')
+
+        escenario = carga.preparar(options['productos'], options['stock_inicial'], options['fragmentos'])
+        self.stdout.write(
+            f"Escenario {escenario.prefijo}: {options['productos']} productos, "
+            f"{options['cajeros']} cajeros x {options['operaciones']} operaciones"
+        )
+
+        resultados, segundos, bloqueos = carga.ejecutar(
+            escenario, options['cajeros'], options['operaciones'],
+            options['proporcion_movimientos'], options['max_items'], options['url'],
+        )
+
+        self.stdout.write(f"\nDuración: {segundos:.2f} s, {len(resultados) / segundos:.1f} operaciones/s")
+        for operacion, datos in carga.estadisticas(resultados, segundos).items():
+            self.stdout.write(
+                f"{operacion:<11} total {datos['total']:>6}  ok {datos['ok']:>6}  "
+                f"rechazadas {datos['rechazadas']:>6}  errores {datos['errores']:>5}  "
+                f"{datos['por_segundo']:>8.1f}/s  "
+                f"p50 {datos['p50']:>7.1f} ms  p95 {datos['p95']:>7.1f} ms  p99 {datos['p99']:>7.1f} ms"
+            )
+            for detalle, cantidad in datos['detalle_errores'].most_common():
+                self.stdout.write(f"{'':<11} {cantidad} x {detalle}")
+
+        if bloqueos is None:
+            self.stdout.write("Esperas por bloqueos: solo se miden en Postgres")
+        else:
+            self.stdout.write(
+                f"Esperas por bloqueos: {bloqueos['muestras_con_espera']}/{bloqueos['muestras']} muestras, "
+                f"máximo {bloqueos['maximo_esperando']} sesiones esperando, "
+                f"~{bloqueos['segundos_espera']:.2f} s acumulados"
+            )
+
+        problemas = carga.verificar(escenario, resultados)
+        if options['limpiar']:
+            carga.limpiar(escenario)
+
+        if problemas:
+            for problema in problemas:
+                self.stdout.write(self.style.ERROR(problema))
+            raise CommandError(f'{len(problemas)} invariantes violados')
+        self.stdout.write(self.style.SUCCESS(
+            '\nInvariantes correctos: sin stock negativo, stock igual al historial y a la suma por depósito, '
+            'totales de venta correctos.'
+        ))
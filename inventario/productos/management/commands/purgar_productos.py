@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from productos import bajas, valuacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Purga por lotes los productos archivados hace más de N días: borra sus movimientos '
+        '(resumidos por mes si el producto tiene ventas) y, si no tiene ventas, el producto.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Antigüedad mínima del archivado')
+        parser.add_argument('--lote', type=int, default=bajas.TAMANIO_LOTE, help='Filas borradas por transacción')
+        parser.add_argument(
+            '--pausa', type=float, default=0.05,
+            help='Segundos de espera entre lotes, para no cargar la base',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra qué productos se purgarían')
+
+    def handle(self, *args, **options):
+        # Los movimientos que se van a borrar tienen que estar valuados antes
+        if not options['dry_run']:
+            valuacion.procesar()
+        productos = bajas.archivados_para_purgar(options['dias'])
+        if not productos.exists():
+            self.stdout.write(self.style.SUCCESS('No hay productos para purgar.'))
+            return
+
+        for producto in productos.iterator():
+            if options['dry_run']:
+                self.stdout.write(f'Se purgaría {producto.nombre} ({producto.sku})')
+                continue
+            if bajas.purgar_producto(producto, options['lote'], options['pausa']):
+                self.stdout.write(f'{producto.nombre}: borrado')
+            else:
+                self.stdout.write(f'{producto.nombre}: movimientos resumidos, queda archivado por tener ventas')
+
+        self.stdout.write(self.style.SUCCESS('Purga terminada.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from productos import kpis
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde cero los indicadores del panel de control. '
+        'Corrige cualquier desvío de las actualizaciones incrementales; run_workers lo hace periódicamente.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Días de ventas que se recalculan')
+
+    def handle(self, *args, **options):
+        kpis.recalcular(options['dias'])
+        self.stdout.write(self.style.SUCCESS('Indicadores recalculados.'))
@@ -0,0 +1,100 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from productos import conciliacion
+from productos.models import Producto
+from ventas.models import Venta
+
+
+def _conciliar_productos(desde_id, hasta_id, reparar, fuente):
+    diferencias = conciliacion.diferencias_stock(desde_id, hasta_id)
+    omitidos = []
+    if reparar and diferencias:
+        ids = [producto_id for producto_id, _, _ in diferencias]
+        for inicio in range(0, len(ids), conciliacion.TAMANIO_LOTE):
+            _, parte = conciliacion.reparar_stock(ids[inicio:inicio + conciliacion.TAMANIO_LOTE], fuente)
+            omitidos.extend(parte)
+    return diferencias, omitidos
+
+
+def _conciliar_ventas(desde_id, hasta_id, reparar):
+    diferencias = conciliacion.diferencias_ventas(desde_id, hasta_id)
+    items = conciliacion.subtotales_incorrectos(desde_id, hasta_id).count()
+    if reparar and (diferencias or items):
+        conciliacion.reparar_ventas(desde_id, hasta_id)
+    return diferencias, items
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara Producto.stock con el historial de movimientos y Venta.total con sus items. '
+        'Informa las diferencias y opcionalmente las corrige.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Corrige las diferencias encontradas')
+        parser.add_argument(
+            '--fuente', choices=['stock', 'movimientos'], default='stock',
+            help=(
+                "Qué dato se toma como correcto al reparar stock: 'stock' registra movimientos "
+                "compensatorios, 'movimientos' reescribe Producto.stock"
+            ),
+        )
+        parser.add_argument('--desde-id', type=int, help='Primer id (producto y venta) a revisar')
+        parser.add_argument('--hasta-id', type=int, help='Último id (producto y venta) a revisar')
+        parser.add_argument('--workers', type=int, default=1, help='Procesos en paralelo, uno por rango de ids')
+        parser.add_argument('--limite', type=int, default=50, help='Cantidad máxima de diferencias a listar')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers debe ser al menos 1')
+
+        desde_id, hasta_id = options['desde_id'], options['hasta_id']
+        rangos_productos = conciliacion.partir_rango(Producto, options['workers'], desde_id, hasta_id)
+        rangos_ventas = conciliacion.partir_rango(Venta, options['workers'], desde_id, hasta_id)
+        reparar, fuente = options['reparar'], options['fuente']
+
+        if options['workers'] == 1:
+            stock = [_conciliar_productos(d, h, reparar, fuente) for d, h in rangos_productos]
+            ventas = [_conciliar_ventas(d, h, reparar) for d, h in rangos_ventas]
+        else:
+            # Cada proceso abre su propia conexión; no se comparte la del padre
+            connections.close_all()
+            contexto = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=options['workers'], mp_context=contexto) as pool:
+                futuros_stock = [pool.submit(_conciliar_productos, d, h, reparar, fuente) for d, h in rangos_productos]
+                futuros_ventas = [pool.submit(_conciliar_ventas, d, h, reparar) for d, h in rangos_ventas]
+                stock = [f.result() for f in futuros_stock]
+                ventas = [f.result() for f in futuros_ventas]
+
+        diferencias_stock = [fila for parte, _ in stock for fila in parte]
+        omitidos = [fila for _, parte in stock for fila in parte]
+        diferencias_ventas = [fila for parte, _ in ventas for fila in parte]
+        items_incorrectos = sum(items for _, items in ventas)
+
+        limite = options['limite']
+        for producto_id, actual, esperado in diferencias_stock[:limite]:
+            self.stdout.write(f'Producto {producto_id}: stock {actual}, según movimientos {esperado}')
+        for venta_id, total, suma in diferencias_ventas[:limite]:
+            self.stdout.write(f'Venta {venta_id}: total {total}, suma de items {suma}')
+
+        resumen = (
+            f'{len(diferencias_stock)} productos con stock distinto al historial, '
+            f'{len(diferencias_ventas)} ventas con total distinto a sus items, '
+            f'{items_incorrectos} items con subtotal incorrecto.'
+        )
+        if reparar:
+            for producto_id, actual, esperado, motivo in omitidos[:limite]:
+                self.stdout.write(self.style.WARNING(
+                    f'Producto {producto_id} sin reparar: stock {actual}, según movimientos {esperado} ({motivo})'
+                ))
+            if omitidos:
+                resumen += f' {len(omitidos)} productos quedaron sin reparar.'
+            self.stdout.write(self.style.SUCCESS(f'Reparado: {resumen}'))
+        elif diferencias_stock or diferencias_ventas or items_incorrectos:
+            self.stdout.write(self.style.WARNING(resumen))
+        else:
+            self.stdout.write(self.style.SUCCESS('Sin diferencias.'))
@@ -0,0 +1,81 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import valuacion
+from productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = (
+        'Abre la valuación FIFO con el stock actual de cada producto como saldo inicial. '
+        'Reemplaza las capas y valuaciones existentes; después se sigue con valuar_inventario.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--costos', metavar='ARCHIVO',
+            help="CSV con columnas 'costo' y 'sku' o 'id': costo unitario inicial de cada producto",
+        )
+        parser.add_argument('--costo', help='Costo unitario de los productos que no están en el archivo')
+        parser.add_argument('--limite', type=int, default=20, help='Cantidad máxima de productos sin costo a listar')
+
+    def handle(self, *args, **options):
+        costos = self._leer_costos(options['costos']) if options['costos'] else {}
+        costo_por_defecto = self._decimal(options['costo'], '--costo') if options['costo'] else None
+        if not costos and costo_por_defecto is None:
+            raise CommandError('Indicar --costos, --costo o ambos')
+
+        try:
+            cantidad = valuacion.saldo_inicial(costos, costo_por_defecto)
+        except valuacion.CostoFaltante as error:
+            faltantes = error.producto_ids[:options['limite']]
+            for producto_id, sku, nombre in Producto.todos.filter(pk__in=faltantes).values_list('pk', 'sku', 'nombre'):
+                self.stdout.write(f'Producto {producto_id} ({sku or "-"}) {nombre}: sin costo')
+            raise CommandError(f'{error}. No se modificó la valuación.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Saldo inicial de {cantidad} productos. Inventario valuado: {valuacion.valor_inventario():.2f}'
+        ))
+
+    def _decimal(self, valor, origen):
+        try:
+            costo = Decimal(str(valor).strip())
+        except InvalidOperation:
+            raise CommandError(f'Costo inválido en {origen}: {valor!r}')
+        if not costo.is_finite() or costo < 0:
+            raise CommandError(f'Costo inválido en {origen}: {valor!r}')
+        return costo
+
+    def _leer_costos(self, ruta):
+        """{producto_id: costo} a partir del CSV."""
+        try:
+            with open(ruta, newline='', encoding='utf-8') as archivo:
+                filas = list(csv.DictReader(archivo))
+        except OSError as error:
+            raise CommandError(f'No se pudo leer {ruta}: {error}')
+        if not filas:
+            return {}
+        if 'costo' not in filas[0] or not ({'sku', 'id'} & set(filas[0])):
+            raise CommandError("El archivo debe tener la columna 'costo' y 'sku' o 'id'")
+
+        por_sku = {}
+        if 'sku' in filas[0]:
+            skus = {fila['sku'].strip() for fila in filas if fila.get('sku')}
+            por_sku = dict(Producto.objects.filter(sku__in=skus).values_list('sku', 'pk'))
+
+        costos = {}
+        for numero, fila in enumerate(filas, start=2):
+            origen = f'{ruta}, línea {numero}'
+            if fila.get('sku'):
+                producto_id = por_sku.get(fila['sku'].strip())
+                if producto_id is None:
+                    raise CommandError(f"SKU desconocido en {origen}: {fila['sku']!r}")
+            else:
+                try:
+                    producto_id = int(fila.get('id') or '')
+                except ValueError:
+                    raise CommandError(f'Fila sin sku ni id válido en {origen}')
+            costos[producto_id] = self._decimal(fila['costo'], origen)
+        return costos
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import valuacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Valúa a costo FIFO los movimientos de stock registrados desde la última corrida. '
+        'Pensado para correr por cron; con --cierre muestra la valuación de un mes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=valuacion.TAMANIO_LOTE, help='Movimientos por transacción')
+        parser.add_argument('--cierre', metavar='AAAA-MM', help='Muestra la valuación al cierre de ese mes')
+
+    def handle(self, *args, **options):
+        procesados = valuacion.procesar(options['lote'])
+        self.stdout.write(f'{procesados} movimientos valuados')
+
+        if options['cierre']:
+            try:
+                anio, mes = (int(parte) for parte in options['cierre'].split('-'))
+                resultado = valuacion.cierre(anio, mes)
+            except ValueError:
+                raise CommandError('El mes debe tener el formato AAAA-MM')
+            self.stdout.write(f"Costo de lo vendido: {resultado['costo_vendido']:.2f} ({resultado['unidades_vendidas']} unidades)")
+            self.stdout.write(f"Inventario al cierre: {resultado['valor']:.2f}")
+
+        self.stdout.write(self.style.SUCCESS(f'Inventario valuado: {valuacion.valor_inventario():.2f}'))
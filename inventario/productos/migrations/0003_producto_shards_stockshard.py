@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_producto_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='shards',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Cantidad de sub-contadores de stock. 0 = stock en una sola fila', verbose_name='Fragmentos de stock'),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indice', models.PositiveSmallIntegerField(verbose_name='Indice')),
+                ('stock', models.IntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_shards', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Fragmento de Stock',
+                'verbose_name_plural': 'Fragmentos de Stock',
+                'constraints': [models.UniqueConstraint(fields=('producto', 'indice'), name='stockshard_producto_indice_unico'), models.CheckConstraint(condition=models.Q(('stock__gte', 0)), name='stockshard_stock_no_negativo')],
+            },
+        ),
+    ]
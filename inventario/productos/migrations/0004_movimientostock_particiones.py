@@ -0,0 +1,103 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:15
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLA = 'productos_movimientostock'
+
+
+def particionar_movimientos(apps, schema_editor):
+    """
+    Convierte la tabla de movimientos en una tabla particionada por mes.
+    Solo en Postgres; en otros motores la tabla queda como está.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(fecha) FROM {TABLA}")
+        primera = cursor.fetchone()[0]
+        hoy = datetime.date.today()
+        anio, mes = (primera.year, primera.month) if primera else (hoy.year, hoy.month)
+        # Particiones hasta 3 meses adelante; después las crea `archivar_movimientos`
+        ultimo = hoy.year * 12 + hoy.month - 1 + 3
+
+        cursor.execute(f"ALTER TABLE {TABLA} RENAME TO {TABLA}_plano")
+        cursor.execute("DROP INDEX movimiento_producto_fecha_idx")
+        # La clave primaria de una tabla particionada debe incluir la columna de partición.
+        # Postgres 15 no admite columnas IDENTITY en tablas particionadas, se usa una secuencia.
+        cursor.execute(
+            f"CREATE TABLE {TABLA} (LIKE {TABLA}_plano INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (fecha)"
+        )
+        cursor.execute(f"CREATE SEQUENCE {TABLA}_particionada_id_seq OWNED BY {TABLA}.id")
+        cursor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN id SET DEFAULT nextval('{TABLA}_particionada_id_seq')")
+        cursor.execute(f"ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_particionada_pkey PRIMARY KEY (id, fecha)")
+        cursor.execute(
+            f"ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_producto_id_fk FOREIGN KEY (producto_id) "
+            f"REFERENCES productos_producto (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(f"CREATE TABLE {TABLA}_default PARTITION OF {TABLA} DEFAULT")
+
+        actual = anio * 12 + mes - 1
+        while actual <= ultimo:
+            desde = datetime.datetime(actual // 12, actual % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+            hasta = datetime.datetime((actual + 1) // 12, (actual + 1) % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+            cursor.execute(
+                f"CREATE TABLE {TABLA}_{desde.year:04d}_{desde.month:02d} PARTITION OF {TABLA} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [desde, hasta],
+            )
+            actual += 1
+
+        # Índice en la tabla padre: Postgres lo crea en cada partición
+        cursor.execute(f"CREATE INDEX movimiento_producto_fecha_idx ON {TABLA} (producto_id, fecha DESC)")
+
+        cursor.execute(f"INSERT INTO {TABLA} SELECT * FROM {TABLA}_plano")
+        cursor.execute(
+            f"SELECT setval('{TABLA}_particionada_id_seq', COALESCE((SELECT MAX(id) FROM {TABLA}), 0) + 1, false)"
+        )
+        cursor.execute(f"DROP TABLE {TABLA}_plano")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_producto_shards_stockshard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenMovimientoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mes')),
+                ('entradas', models.IntegerField(default=0, verbose_name='Entradas')),
+                ('salidas', models.IntegerField(default=0, verbose_name='Salidas')),
+                ('ajustes', models.IntegerField(default=0, verbose_name='Ajustes')),
+                ('cantidad_movimientos', models.IntegerField(default=0, verbose_name='Cantidad de movimientos')),
+                ('archivo', models.CharField(max_length=255, verbose_name='Archivo')),
+            ],
+            options={
+                'verbose_name': 'Resumen Mensual de Movimientos',
+                'verbose_name_plural': 'Resumenes Mensuales de Movimientos',
+                'ordering': ['-mes'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', '-fecha'], name='movimiento_producto_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='resumenmovimientomensual',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_mensuales', to='productos.producto'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumenmovimientomensual',
+            constraint=models.UniqueConstraint(fields=('producto', 'mes'), name='resumen_producto_mes_unico'),
+        ),
+        migrations.RunPython(particionar_movimientos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_movimientostock_particiones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientostock',
+            name='origen',
+            field=models.CharField(choices=[('manual', 'Manual'), ('venta', 'Venta'), ('conciliacion', 'Conciliación')], default='manual', max_length=20, verbose_name='Origen'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_movimientostock_origen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Indicador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=60, verbose_name='Clave')),
+                ('shard', models.PositiveSmallIntegerField(default=0, verbose_name='Fragmento')),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Valor')),
+            ],
+            options={
+                'verbose_name': 'Indicador',
+                'verbose_name_plural': 'Indicadores',
+                'constraints': [models.UniqueConstraint(fields=('clave', 'shard'), name='indicador_clave_shard_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaProductoDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('shard', models.PositiveSmallIntegerField(default=0, verbose_name='Fragmento')),
+                ('unidades', models.IntegerField(default=0, verbose_name='Unidades')),
+                ('importe', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Importe')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_por_dia', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Venta por Producto y Día',
+                'verbose_name_plural': 'Ventas por Producto y Día',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto', 'shard'), name='ventaproductodia_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0006_indicadores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorialPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precio_anterior', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Precio anterior')),
+                ('precio_nuevo', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Precio nuevo')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('usuario', models.CharField(max_length=50, verbose_name='Usuario')),
+                ('motivo', models.CharField(blank=True, max_length=200, verbose_name='Motivo')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial_precios', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Historial de Precio',
+                'verbose_name_plural': 'Historial de Precios',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['producto', '-fecha'], name='historialprecio_prod_fecha_idx')],
+            },
+        ),
+    ]
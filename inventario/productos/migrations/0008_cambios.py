@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+SECUENCIA = 'productos_cambio_seq'
+
+
+def inicializar_secuencia(apps, schema_editor):
+    """Numera los productos existentes en orden de última modificación."""
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == 'postgresql':
+            cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SECUENCIA}")
+            cursor.execute(
+                f"UPDATE productos_producto p SET secuencia = n.valor FROM ("
+                f"  SELECT id, nextval('{SECUENCIA}') AS valor FROM ("
+                f"    SELECT id FROM productos_producto ORDER BY fecha_actualizacion, id"
+                f"  ) ordenados"
+                f") n WHERE n.id = p.id"
+            )
+        else:
+            cursor.execute("UPDATE productos_producto SET secuencia = id")
+
+
+def eliminar_secuencia(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"DROP SEQUENCE IF EXISTS {SECUENCIA}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0007_historialprecio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField(verbose_name='Producto')),
+                ('sku', models.CharField(blank=True, max_length=50, null=True, verbose_name='SKU')),
+                ('secuencia', models.BigIntegerField(db_index=True, verbose_name='Secuencia de cambio')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Producto Eliminado',
+                'verbose_name_plural': 'Productos Eliminados',
+            },
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='secuencia',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Secuencia de cambio'),
+        ),
+        migrations.RunPython(inicializar_secuencia, eliminar_secuencia),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='archivado',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Archivado'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='fecha_archivado',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Fecha de archivado'),
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='sku',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='SKU'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('archivado', False)), fields=['nombre'], name='producto_nombre_activo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('archivado', True)), fields=['fecha_archivado'], name='producto_archivado_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.UniqueConstraint(condition=models.Q(('archivado', False)), fields=('sku',), name='producto_sku_activo_unico', violation_error_message='Ya existe un producto con este SKU.'),
+        ),
+    ]
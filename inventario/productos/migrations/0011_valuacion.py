@@ -0,0 +1,81 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0010_archivado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoValuacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_movimiento', models.BigIntegerField(default=0, verbose_name='Último movimiento procesado')),
+                ('fecha', models.DateTimeField(blank=True, null=True, verbose_name='Última corrida')),
+            ],
+            options={
+                'verbose_name': 'Estado de la Valuación',
+                'verbose_name_plural': 'Estado de la Valuación',
+            },
+        ),
+        migrations.CreateModel(
+            name='ValuacionProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valuacion', serialize=False, to='productos.producto')),
+                ('cantidad', models.IntegerField(default=0, verbose_name='Cantidad')),
+                ('valor', models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Valor')),
+                ('ultimo_costo', models.DecimalField(decimal_places=4, default=0, max_digits=12, verbose_name='Último costo')),
+                ('sin_capa', models.IntegerField(default=0, verbose_name='Unidades sin capa')),
+            ],
+            options={
+                'verbose_name': 'Valuación de Producto',
+                'verbose_name_plural': 'Valuaciones de Productos',
+            },
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True, verbose_name='Costo unitario'),
+        ),
+        migrations.CreateModel(
+            name='CapaCosto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movimiento_id', models.BigIntegerField(verbose_name='Movimiento')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha')),
+                ('costo_unitario', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Costo unitario')),
+                ('cantidad', models.IntegerField(verbose_name='Cantidad restante')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capas_costo', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Capa de Costo',
+                'verbose_name_plural': 'Capas de Costo',
+                'ordering': ['producto', 'movimiento_id'],
+                'indexes': [models.Index(fields=['producto', 'movimiento_id'], name='capacosto_producto_mov_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ValuacionMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mes')),
+                ('unidades_vendidas', models.IntegerField(default=0, verbose_name='Unidades vendidas')),
+                ('costo_vendido', models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Costo de lo vendido')),
+                ('costo_otras_salidas', models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Costo de otras salidas')),
+                ('cantidad_cierre', models.IntegerField(default=0, verbose_name='Cantidad al cierre')),
+                ('valor_cierre', models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Valor al cierre')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valuaciones_mensuales', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Valuación Mensual',
+                'verbose_name_plural': 'Valuaciones Mensuales',
+                'ordering': ['-mes'],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'mes'), name='valuacionmensual_producto_mes_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0011_valuacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('carrito', models.CharField(max_length=32, verbose_name='Carrito')),
+                ('cantidad', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('vence', models.DateTimeField(verbose_name='Vence')),
+                ('usuario', models.CharField(blank=True, max_length=50, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Reserva de Stock',
+                'verbose_name_plural': 'Reservas de Stock',
+            },
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='reservado',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Reservado'),
+        ),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.CheckConstraint(condition=models.Q(('reservado__gte', 0)), name='producto_reservado_no_negativo'),
+        ),
+        migrations.AddField(
+            model_name='reservastock',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='productos.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='reservastock',
+            index=models.Index(fields=['vence'], name='reserva_vence_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservastock',
+            constraint=models.UniqueConstraint(fields=('carrito', 'producto'), name='reserva_carrito_producto_unica'),
+        ),
+    ]
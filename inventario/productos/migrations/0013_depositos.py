@@ -0,0 +1,71 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_principal(apps, schema_editor):
+    """Crea el depósito principal y le asigna todo el stock actual de cada producto."""
+    Deposito = apps.get_model('productos', 'Deposito')
+    principal = Deposito.objects.create(nombre="Principal", codigo="PRINCIPAL", principal=True)
+    with schema_editor.connection.cursor() as cursor:
+        # Un solo INSERT ... SELECT; en los fragmentados el total es la suma de fragmentos
+        cursor.execute(
+            "INSERT INTO productos_stockdeposito (deposito_id, producto_id, stock) "
+            "SELECT %s, p.id, CASE "
+            "  WHEN p.shards > 0 THEN COALESCE((SELECT SUM(s.stock) FROM productos_stockshard s WHERE s.producto_id = p.id), 0) "
+            "  WHEN p.stock < 0 THEN 0 ELSE p.stock END "
+            "FROM productos_producto p",
+            [principal.pk],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_reservas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientostock',
+            name='origen',
+            field=models.CharField(choices=[('manual', 'Manual'), ('venta', 'Venta'), ('conciliacion', 'Conciliación'), ('transferencia', 'Transferencia')], default='manual', max_length=20, verbose_name='Origen'),
+        ),
+        migrations.CreateModel(
+            name='Deposito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('codigo', models.CharField(max_length=20, unique=True, verbose_name='Código')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('principal', models.BooleanField(default=False, verbose_name='Principal')),
+            ],
+            options={
+                'verbose_name': 'Depósito',
+                'verbose_name_plural': 'Depósitos',
+                'ordering': ['-principal', 'nombre'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('principal', True)), fields=('principal',), name='deposito_un_solo_principal', violation_error_message='Ya hay un depósito principal.')],
+            },
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='deposito',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='productos.deposito', verbose_name='Depósito'),
+        ),
+        migrations.CreateModel(
+            name='StockDeposito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField(default=0)),
+                ('deposito', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='stock_productos', to='productos.deposito')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_depositos', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Stock por Depósito',
+                'verbose_name_plural': 'Stock por Depósito',
+                'constraints': [models.UniqueConstraint(fields=('deposito', 'producto'), name='stockdeposito_deposito_producto_unico'), models.CheckConstraint(condition=models.Q(('stock__gte', 0)), name='stockdeposito_stock_no_negativo')],
+            },
+        ),
+        migrations.RunPython(crear_principal, migrations.RunPython.noop),
+    ]
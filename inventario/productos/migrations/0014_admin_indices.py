@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:11
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+INDICE_NOMBRE = models.Index(django.db.models.functions.text.Upper('nombre'), name='producto_nombre_upper_idx')
+
+
+def _indice_nombre(schema_editor):
+    # En Postgres, LIKE 'abc%' solo usa el índice con text_pattern_ops si la
+    # base no tiene intercalación C
+    if schema_editor.connection.vendor == 'postgresql':
+        from django.contrib.postgres.indexes import OpClass
+        return models.Index(
+            OpClass(django.db.models.functions.text.Upper('nombre'), name='text_pattern_ops'), name=INDICE_NOMBRE.name,
+        )
+    return INDICE_NOMBRE
+
+
+def crear_indice_nombre(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('productos', 'Producto'), _indice_nombre(schema_editor))
+
+
+def borrar_indice_nombre(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('productos', 'Producto'), _indice_nombre(schema_editor))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_depositos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['-fecha', '-id'], name='movimiento_fecha_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='producto',
+                    index=INDICE_NOMBRE,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(crear_indice_nombre, borrar_indice_nombre),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['sku'], name='producto_sku_idx'),
+        ),
+    ]
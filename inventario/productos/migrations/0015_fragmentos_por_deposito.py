@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _repartir(total, partes):
+    base, resto = divmod(total, partes)
+    return [base + (1 if i < resto else 0) for i in range(partes)]
+
+
+def repartir_por_deposito(apps, schema_editor):
+    """
+    Rehace los fragmentos de cada producto fragmentado a partir de su stock
+    por depósito. Si las filas de depósito no suman lo mismo que los
+    fragmentos, la diferencia se ajusta en el principal.
+    """
+    Deposito = apps.get_model('productos', 'Deposito')
+    Producto = apps.get_model('productos', 'Producto')
+    StockDeposito = apps.get_model('productos', 'StockDeposito')
+    StockShard = apps.get_model('productos', 'StockShard')
+    principal = Deposito.objects.filter(principal=True).values_list('pk', flat=True).first()
+    for producto in Producto.objects.filter(shards__gt=0).only('pk', 'shards').iterator():
+        total = sum(StockShard.objects.filter(producto_id=producto.pk).values_list('stock', flat=True))
+        por_deposito = dict(
+            StockDeposito.objects.filter(producto_id=producto.pk).values_list('deposito_id', 'stock')
+        )
+        por_deposito[principal] = max(por_deposito.get(principal, 0) + total - sum(por_deposito.values()), 0)
+        StockShard.objects.filter(producto_id=producto.pk).delete()
+        StockShard.objects.bulk_create([
+            StockShard(producto_id=producto.pk, deposito_id=deposito_id, indice=i, stock=parte)
+            for deposito_id, valor in por_deposito.items() if valor
+            for i, parte in enumerate(_repartir(valor, producto.shards))
+        ])
+        for deposito_id, valor in por_deposito.items():
+            StockDeposito.objects.update_or_create(
+                producto_id=producto.pk, deposito_id=deposito_id, defaults={'stock': valor}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0014_admin_indices'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='stockshard',
+            name='stockshard_producto_indice_unico',
+        ),
+        migrations.AddField(
+            model_name='stockshard',
+            name='deposito',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='productos.deposito', verbose_name='Depósito'),
+        ),
+        migrations.RunPython(repartir_por_deposito, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stockshard',
+            name='deposito',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='productos.deposito', verbose_name='Depósito'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockshard',
+            constraint=models.UniqueConstraint(fields=('producto', 'deposito', 'indice'), name='stockshard_producto_deposito_indice_unico'),
+        ),
+    ]
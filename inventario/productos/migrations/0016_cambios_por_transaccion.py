@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0015_fragmentos_por_deposito'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='transaccion',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Transacción del cambio'),
+        ),
+        migrations.AddField(
+            model_name='productoeliminado',
+            name='transaccion',
+            field=models.BigIntegerField(default=0, verbose_name='Transacción del cambio'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['transaccion', 'secuencia'], name='producto_cambio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoeliminado',
+            index=models.Index(fields=['transaccion', 'secuencia'], name='productoeliminado_cambio_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:31
+
+from django.db import migrations, models
+
+TABLA = 'productos_movimientostock'
+
+
+def default_transaccion(apps, schema_editor):
+    # Los movimientos existentes quedan en 0; los nuevos toman el id de la
+    # transacción que los inserta (solo Postgres)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f"ALTER TABLE {TABLA} ALTER COLUMN transaccion SET DEFAULT pg_current_xact_id()::text::bigint"
+        )
+
+
+def default_cero(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN transaccion SET DEFAULT 0")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0016_cambios_por_transaccion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadovaluacion',
+            name='ultima_transaccion',
+            field=models.BigIntegerField(default=0, verbose_name='Última transacción procesada'),
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='transaccion',
+            field=models.BigIntegerField(db_default=0, editable=False, verbose_name='Transacción'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['transaccion', 'id'], name='movimiento_transaccion_idx'),
+        ),
+        migrations.RunPython(default_transaccion, default_cero),
+    ]
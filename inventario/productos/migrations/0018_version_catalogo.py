@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:35
+
+from django.db import migrations, models
+
+
+def crear_fila(apps, schema_editor):
+    apps.get_model('productos', 'VersionCatalogo').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0017_valuacion_por_transaccion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Versión')),
+                ('generacion', models.BigIntegerField(default=0, verbose_name='Generación')),
+            ],
+            options={
+                'verbose_name': 'Versión del Catálogo',
+                'verbose_name_plural': 'Versión del Catálogo',
+            },
+        ),
+        migrations.RunPython(crear_fila, migrations.RunPython.noop),
+    ]
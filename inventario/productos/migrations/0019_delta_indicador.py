@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0018_version_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeltaIndicador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=60, verbose_name='Clave')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=16, verbose_name='Valor')),
+            ],
+            options={
+                'verbose_name': 'Delta de Indicador',
+                'verbose_name_plural': 'Deltas de Indicador',
+                'indexes': [models.Index(fields=['clave'], name='deltaindicador_clave_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:03
+
+import productos.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0019_delta_indicador'),
+    ]
+
+    # El default en Postgres ya lo había puesto a mano la migración 0017;
+    # esto lo declara en el estado para que coincida con la base
+    operations = [
+        migrations.AlterField(
+            model_name='movimientostock',
+            name='transaccion',
+            field=models.BigIntegerField(db_default=productos.models.TransaccionActual(), editable=False, verbose_name='Transacción'),
+        ),
+    ]
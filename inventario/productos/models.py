@@ -1,9 +1,14 @@
 from django.db import models
+from django.db.models.functions import Upper
 import os
 import uuid
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from PIL import Image
 from django.utils import timezone
+from inventario import metricas
+from inventario.seguimiento import SeguimientoCambiosMixin
+from tareas import cola
 
 def validate_image_size(image):
     filesize = image.file.size
@@ -16,15 +21,41 @@ def get_image_path(instance, filename):
     filename = f"{uuid.uuid4()}.{ext}"
     return os.path.join("productos", filename)
 
-class Producto(models.Model):
+class TransaccionActual(models.Expression):
+    """Id de la transacción en curso (0 fuera de Postgres), para usar dentro de un UPDATE o como db_default."""
+    output_field = models.BigIntegerField()
+    allowed_default = True
+    SQL_POSTGRES = "pg_current_xact_id()::text::bigint"
+
+    def as_sql(self, compiler, connection):
+        return "0", []
+
+    def as_postgresql(self, compiler, connection):
+        return self.SQL_POSTGRES, []
+
+
+class ProductoActivoManager(models.Manager):
+    """Oculta los productos archivados (dados de baja, ver productos/bajas.py)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(archivado=False)
+
+
+class Producto(SeguimientoCambiosMixin, models.Model):
     """Model definition for Producto."""
 
+    # save() escribe solo los campos modificados (ver inventario/seguimiento.py).
+    # El stock y los fragmentos los escribe productos/stock.py con update()
+    CAMPOS_SIEMPRE = ('fecha_actualizacion', 'secuencia', 'transaccion', 'version')
+    CAMPOS_EXCLUIDOS = ('stock', 'shards', 'reservado')
+
     nombre = models.CharField("Nombre", max_length=50)
     descripcion = models.CharField("Descripcion", max_length=200)
     precio = models.DecimalField("Precio", max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
     stock_minimo = models.IntegerField(default=5, verbose_name="Stock Minimo")
-    sku = models.CharField("SKU", max_length=50, unique=True, blank=True, null=True)
+    # Único entre los productos activos (ver Meta.constraints)
+    sku = models.CharField("SKU", max_length=50, blank=True, null=True)
     imagen = models.ImageField(
         "Imagen", 
         upload_to=get_image_path, 
@@ -35,29 +66,89 @@ class Producto(models.Model):
     )
     fecha_creacion = models.DateTimeField("Fecha de creacion", auto_now_add=True)
     fecha_actualizacion = models.DateTimeField("Fecha de creacion", auto_now=True)
+    shards = models.PositiveSmallIntegerField(
+        "Fragmentos de stock",
+        default=0,
+        help_text="Cantidad de sub-contadores de stock. 0 = stock en una sola fila"
+    )
+    # Número de cambio para el feed de sincronización (ver productos/cambios.py)
+    secuencia = models.BigIntegerField("Secuencia de cambio", default=0, db_index=True, editable=False)
+    # Transacción que hizo el cambio (en Postgres; 0 en SQLite y en las filas
+    # anteriores al campo): ordena el feed por confirmación
+    transaccion = models.BigIntegerField("Transacción del cambio", default=0, editable=False)
+    # Versión para el bloqueo optimista de la edición (ver ProductoForm.save).
+    # Cambia con las ediciones de datos del producto, no con los movimientos de stock
+    version = models.PositiveIntegerField("Versión", default=1, editable=False)
+    # Unidades retenidas por ventas en curso (suma de ReservaStock, ver reservas.py)
+    reservado = models.IntegerField("Reservado", default=0, editable=False)
+    # Baja lógica: el producto deja de verse pero sus ventas se conservan
+    archivado = models.BooleanField("Archivado", default=False, editable=False)
+    fecha_archivado = models.DateTimeField("Fecha de archivado", blank=True, null=True, editable=False)
+
+    # El primero es el manager por defecto; `todos` incluye los archivados
+    objects = ProductoActivoManager()
+    todos = models.Manager()
 
-    
     class Meta:
         """Meta definition for Producto."""
 
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
         ordering = ['nombre']
+        # Índices parciales: solo los productos activos
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sku'], condition=models.Q(archivado=False), name='producto_sku_activo_unico',
+                violation_error_message="Ya existe un producto con este SKU.",
+            ),
+            models.CheckConstraint(condition=models.Q(reservado__gte=0), name='producto_reservado_no_negativo'),
+        ]
+        indexes = [
+            models.Index(fields=['nombre'], condition=models.Q(archivado=False), name='producto_nombre_activo_idx'),
+            models.Index(
+                fields=['fecha_archivado'], condition=models.Q(archivado=True), name='producto_archivado_fecha_idx',
+            ),
+            # Búsqueda del admin entre todos los productos: por prefijo del
+            # nombre (en Postgres con text_pattern_ops, ver la migración 0014)
+            # y por SKU exacto
+            models.Index(Upper('nombre'), name='producto_nombre_upper_idx'),
+            models.Index(fields=['sku'], name='producto_sku_idx'),
+            # Recorrido del feed de cambios (cambios.leer)
+            models.Index(fields=['transaccion', 'secuencia'], name='producto_cambio_idx'),
+        ]
 
     def __str__(self):
         """Unicode representation of Producto."""
         return self.nombre
     
     def save(self, *args, **kwargs):
+        # None: guardado completo (producto nuevo o instancia no leída de la base)
+        campos = kwargs.get('update_fields')
+        if campos is None:
+            campos = self.campos_modificados()
+        if campos is not None and not campos:
+            return  # no cambió nada: no se escribe
+        if not self._state.adding:
+            self.version += 1
         super().save(*args, **kwargs)
+        if campos is None or 'imagen' in campos:
+            self.programar_procesamiento_imagen()
+
+    def programar_procesamiento_imagen(self):
+        """Encola el redimensionado de la imagen para no hacerlo durante la petición."""
+        if self.imagen:
+            cola.encolar('productos.procesar_imagen', producto_id=self.pk)
 
+    def procesar_imagen(self):
+        """Reduce la imagen a 300x300 como máximo."""
         if self.imagen:
             try:
-                img = Image.open(self.image.path)
-                if img.height > 300 or img.width > 300:
-                    output_size = (300, 300)
-                    img.thumbnail(output_size)
-                    img.save(self.imagen.path)
+                with metricas.PROCESAMIENTO_IMAGEN.time():
+                    img = Image.open(self.imagen.path)
+                    if img.height > 300 or img.width > 300:
+                        output_size = (300, 300)
+                        img.thumbnail(output_size)
+                        img.save(self.imagen.path)
             except Exception as e:
                 print(f"Error al procesar la imagen {e}")
 
@@ -65,6 +156,57 @@ class Producto(models.Model):
     def necesita_reposicion(self):
         return self.stock < self.stock_minimo
 
+    @property
+    def disponible(self):
+        """Stock que no está reservado por una venta en curso."""
+        return self.stock - self.reservado
+
+class Deposito(models.Model):
+    """Depósito o sucursal con stock propio (ver StockDeposito)."""
+
+    CLAVE_PRINCIPAL = 'productos:deposito_principal'
+
+    nombre = models.CharField("Nombre", max_length=100)
+    codigo = models.CharField("Código", max_length=20, unique=True)
+    activo = models.BooleanField("Activo", default=True)
+    # Recibe el stock que no indica depósito (altas, ajustes del total, ventas sin depósito)
+    principal = models.BooleanField("Principal", default=False)
+
+    class Meta:
+        """Meta definition for Deposito."""
+
+        verbose_name = 'Depósito'
+        verbose_name_plural = 'Depósitos'
+        ordering = ['-principal', 'nombre']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['principal'], condition=models.Q(principal=True), name='deposito_un_solo_principal',
+                violation_error_message="Ya hay un depósito principal.",
+            ),
+        ]
+
+    def __str__(self):
+        """Unicode representation of Deposito."""
+        return self.nombre
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(self.CLAVE_PRINCIPAL)
+
+    @classmethod
+    def id_principal(cls):
+        """Id del depósito principal, guardado en caché."""
+        pk = cache.get(cls.CLAVE_PRINCIPAL)
+        if pk is None:
+            pk = cls.objects.filter(principal=True).values_list('pk', flat=True).first()
+            if pk is None:
+                pk = cls.objects.get_or_create(
+                    codigo='PRINCIPAL', defaults={'nombre': "Principal", 'principal': True}
+                )[0].pk
+            cache.set(cls.CLAVE_PRINCIPAL, pk, 300)
+        return pk
+
+
 class MovimientoStock(models.Model):
     """Model definition for MovimientoStock."""
 
@@ -74,12 +216,32 @@ class MovimientoStock(models.Model):
         ("ajuste", "Ajuste"),
     ]
 
+    ORIGEN_CHOICES = [
+        ("manual", "Manual"),
+        ("venta", "Venta"),
+        ("conciliacion", "Conciliación"),
+        ("transferencia", "Transferencia"),
+    ]
+
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
     tipo = models.CharField("Tipo", max_length=50, choices=TIPO_CHOICES)
     cantidad = models.IntegerField()
     motivo = models.CharField("Motivo", max_length=200, blank=True, null=True)
     fecha = models.DateTimeField("Fecha", default=timezone.now)
     usuario = models.CharField("Usuario", max_length=50)
+    origen = models.CharField("Origen", max_length=20, choices=ORIGEN_CHOICES, default="manual")
+    # Costo de las unidades que ingresan; sin costo se toma el último conocido (ver valuacion.py)
+    costo_unitario = models.DecimalField("Costo unitario", max_digits=12, decimal_places=4, blank=True, null=True)
+    # Vacío en los movimientos anteriores a los depósitos: corresponden al principal
+    deposito = models.ForeignKey(
+        Deposito, on_delete=models.PROTECT, related_name='movimientos', blank=True, null=True,
+        verbose_name="Depósito",
+    )
+    # Transacción que registró el movimiento, para que la valuación no saltee
+    # los que confirman tarde. Lo completa la base: en Postgres el valor por
+    # defecto de la columna es el id de la transacción (migración 0020); en
+    # SQLite y en los movimientos anteriores a la migración 0017, 0
+    transaccion = models.BigIntegerField("Transacción", db_default=TransaccionActual(), editable=False)
 
     class Meta:
         """Meta definition for MovimientoStock."""
@@ -87,7 +249,356 @@ class MovimientoStock(models.Model):
         verbose_name = 'Movimiento de Stock'
         verbose_name_plural = 'Movimientos de Stock'
         ordering = ["-fecha"]
+        # En Postgres la tabla está particionada por mes (ver productos/particiones.py)
+        # y este índice se crea en cada partición.
+        indexes = [
+            models.Index(fields=['producto', '-fecha'], name='movimiento_producto_fecha_idx'),
+            # Listado y jerarquía de fechas del admin
+            models.Index(fields=['-fecha', '-id'], name='movimiento_fecha_idx'),
+            # Recorrido de la valuación (valuacion.procesar)
+            models.Index(fields=['transaccion', 'id'], name='movimiento_transaccion_idx'),
+        ]
 
     def __str__(self):
         """Unicode representation of MovimientoStock."""
-        return f"{self.producto.nombre} - {self.tipo}  - {self.cantidad}" 
+        return f"{self.producto.nombre} - {self.tipo}  - {self.cantidad}"
+
+class StockShard(models.Model):
+    """Sub-contador del stock de un producto fragmentado en un depósito."""
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='stock_shards')
+    # Sin índice propio: las consultas van siempre por producto (índice único)
+    deposito = models.ForeignKey(
+        Deposito, on_delete=models.PROTECT, related_name='+', db_index=False, verbose_name="Depósito",
+    )
+    indice = models.PositiveSmallIntegerField("Indice")
+    stock = models.IntegerField(default=0)
+
+    class Meta:
+        """Meta definition for StockShard."""
+
+        verbose_name = 'Fragmento de Stock'
+        verbose_name_plural = 'Fragmentos de Stock'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'deposito', 'indice'], name='stockshard_producto_deposito_indice_unico',
+            ),
+            models.CheckConstraint(condition=models.Q(stock__gte=0), name='stockshard_stock_no_negativo'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of StockShard."""
+        return f"{self.producto_id} @{self.deposito_id} #{self.indice} - {self.stock}"
+
+
+class StockDeposito(models.Model):
+    """
+    Stock de un producto en un depósito. Producto.stock es la suma de estas
+    filas y se mantiene en cada escritura (ver productos/stock.py).
+    """
+
+    # Sin índice propio: lo cubre el índice único (deposito, producto)
+    deposito = models.ForeignKey(Deposito, on_delete=models.PROTECT, related_name='stock_productos', db_index=False)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='stock_depositos')
+    stock = models.IntegerField(default=0)
+
+    class Meta:
+        """Meta definition for StockDeposito."""
+
+        verbose_name = 'Stock por Depósito'
+        verbose_name_plural = 'Stock por Depósito'
+        constraints = [
+            models.UniqueConstraint(fields=['deposito', 'producto'], name='stockdeposito_deposito_producto_unico'),
+            models.CheckConstraint(condition=models.Q(stock__gte=0), name='stockdeposito_stock_no_negativo'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of StockDeposito."""
+        return f"{self.deposito_id} - {self.producto_id}: {self.stock}"
+
+
+class ResumenMovimientoMensual(models.Model):
+    """Totales mensuales por producto de los movimientos que ya se archivaron."""
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='resumenes_mensuales')
+    mes = models.DateField("Mes")
+    entradas = models.IntegerField("Entradas", default=0)
+    salidas = models.IntegerField("Salidas", default=0)
+    ajustes = models.IntegerField("Ajustes", default=0)
+    cantidad_movimientos = models.IntegerField("Cantidad de movimientos", default=0)
+    archivo = models.CharField("Archivo", max_length=255)
+
+    class Meta:
+        """Meta definition for ResumenMovimientoMensual."""
+
+        verbose_name = 'Resumen Mensual de Movimientos'
+        verbose_name_plural = 'Resumenes Mensuales de Movimientos'
+        ordering = ['-mes']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'mes'], name='resumen_producto_mes_unico'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of ResumenMovimientoMensual."""
+        return f"{self.producto_id} - {self.mes:%m/%Y}"
+
+
+class Indicador(models.Model):
+    """
+    Contador del panel de control (valor del inventario, ventas del día...).
+    Las escrituras no lo tocan: agregan un DeltaIndicador que se consolida
+    después. El valor es la suma de las filas de la clave más sus deltas
+    pendientes.
+    """
+
+    clave = models.CharField("Clave", max_length=60)
+    shard = models.PositiveSmallIntegerField("Fragmento", default=0)
+    valor = models.DecimalField("Valor", max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        """Meta definition for Indicador."""
+
+        verbose_name = 'Indicador'
+        verbose_name_plural = 'Indicadores'
+        constraints = [
+            models.UniqueConstraint(fields=['clave', 'shard'], name='indicador_clave_shard_unico'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of Indicador."""
+        return f"{self.clave} #{self.shard} - {self.valor}"
+
+
+class DeltaIndicador(models.Model):
+    """
+    Cambio de un Indicador todavía no consolidado. Solo se insertan filas:
+    registrar un cambio no bloquea ninguna fila compartida (ver productos/kpis.py).
+    """
+
+    clave = models.CharField("Clave", max_length=60)
+    valor = models.DecimalField("Valor", max_digits=16, decimal_places=2)
+
+    class Meta:
+        """Meta definition for DeltaIndicador."""
+
+        verbose_name = 'Delta de Indicador'
+        verbose_name_plural = 'Deltas de Indicador'
+        indexes = [models.Index(fields=['clave'], name='deltaindicador_clave_idx')]
+
+    def __str__(self):
+        """Unicode representation of DeltaIndicador."""
+        return f"{self.clave} {self.valor:+}"
+
+
+class VentaProductoDia(models.Model):
+    """Unidades e importe vendidos por producto y por día, para el ranking de más vendidos."""
+
+    fecha = models.DateField("Fecha")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='ventas_por_dia')
+    shard = models.PositiveSmallIntegerField("Fragmento", default=0)
+    unidades = models.IntegerField("Unidades", default=0)
+    importe = models.DecimalField("Importe", max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        """Meta definition for VentaProductoDia."""
+
+        verbose_name = 'Venta por Producto y Día'
+        verbose_name_plural = 'Ventas por Producto y Día'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto', 'shard'], name='ventaproductodia_unico'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of VentaProductoDia."""
+        return f"{self.fecha} - {self.producto_id} - {self.unidades}"
+
+
+class HistorialPrecio(models.Model):
+    """Precio anterior y nuevo de cada cambio de precio de un producto."""
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='historial_precios')
+    precio_anterior = models.DecimalField("Precio anterior", max_digits=10, decimal_places=2)
+    precio_nuevo = models.DecimalField("Precio nuevo", max_digits=10, decimal_places=2)
+    fecha = models.DateTimeField("Fecha", default=timezone.now)
+    usuario = models.CharField("Usuario", max_length=50)
+    motivo = models.CharField("Motivo", max_length=200, blank=True)
+
+    class Meta:
+        """Meta definition for HistorialPrecio."""
+
+        verbose_name = 'Historial de Precio'
+        verbose_name_plural = 'Historial de Precios'
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['producto', '-fecha'], name='historialprecio_prod_fecha_idx'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of HistorialPrecio."""
+        return f"{self.producto_id}: {self.precio_anterior} -> {self.precio_nuevo}"
+
+
+class ProductoEliminado(models.Model):
+    """
+    Registro de un producto borrado, para que los clientes del feed de cambios
+    se enteren de la baja. Comparte la secuencia con Producto.secuencia.
+    """
+
+    producto_id = models.BigIntegerField("Producto")
+    sku = models.CharField("SKU", max_length=50, blank=True, null=True)
+    secuencia = models.BigIntegerField("Secuencia de cambio", db_index=True)
+    transaccion = models.BigIntegerField("Transacción del cambio", default=0)
+    fecha = models.DateTimeField("Fecha", default=timezone.now)
+
+    class Meta:
+        """Meta definition for ProductoEliminado."""
+
+        verbose_name = 'Producto Eliminado'
+        verbose_name_plural = 'Productos Eliminados'
+        indexes = [models.Index(fields=['transaccion', 'secuencia'], name='productoeliminado_cambio_idx')]
+
+    def __str__(self):
+        """Unicode representation of ProductoEliminado."""
+        return f"{self.producto_id} ({self.sku or '-'})"
+
+
+class VersionCatalogo(models.Model):
+    """
+    Fila única con la versión de los datos del catálogo (SKU, nombre, precio)
+    que copia en memoria cada proceso (ver sku_index.py). Los cambios de stock
+    no la modifican.
+    """
+
+    version = models.BigIntegerField("Versión", default=0)
+    # Aumenta con las bajas: obliga a recargar el índice completo
+    generacion = models.BigIntegerField("Generación", default=0)
+
+    class Meta:
+        """Meta definition for VersionCatalogo."""
+
+        verbose_name = 'Versión del Catálogo'
+        verbose_name_plural = 'Versión del Catálogo'
+
+    def __str__(self):
+        """Unicode representation of VersionCatalogo."""
+        return f"{self.version} ({self.generacion})"
+
+
+class ReservaStock(models.Model):
+    """Unidades de un producto retenidas por una venta en curso hasta `vence` (ver reservas.py)."""
+
+    # Identifica la venta que se está armando en el formulario
+    carrito = models.CharField("Carrito", max_length=32)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField("Cantidad")
+    vence = models.DateTimeField("Vence")
+    usuario = models.CharField("Usuario", max_length=50, blank=True)
+
+    class Meta:
+        """Meta definition for ReservaStock."""
+
+        verbose_name = 'Reserva de Stock'
+        verbose_name_plural = 'Reservas de Stock'
+        constraints = [
+            models.UniqueConstraint(fields=['carrito', 'producto'], name='reserva_carrito_producto_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['vence'], name='reserva_vence_idx'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of ReservaStock."""
+        return f"{self.carrito}: {self.producto_id} x {self.cantidad}"
+
+
+class CapaCosto(models.Model):
+    """Capa FIFO abierta: unidades de una entrada que todavía no se consumieron (ver valuacion.py)."""
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='capas_costo')
+    # Sin FK: la tabla de movimientos está particionada y sus meses viejos se archivan
+    movimiento_id = models.BigIntegerField("Movimiento")
+    fecha = models.DateTimeField("Fecha")
+    costo_unitario = models.DecimalField("Costo unitario", max_digits=12, decimal_places=4)
+    cantidad = models.IntegerField("Cantidad restante")
+
+    class Meta:
+        """Meta definition for CapaCosto."""
+
+        verbose_name = 'Capa de Costo'
+        verbose_name_plural = 'Capas de Costo'
+        ordering = ['producto', 'movimiento_id']
+        indexes = [
+            models.Index(fields=['producto', 'movimiento_id'], name='capacosto_producto_mov_idx'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of CapaCosto."""
+        return f"{self.producto_id} #{self.movimiento_id} - {self.cantidad} x {self.costo_unitario}"
+
+
+class ValuacionProducto(models.Model):
+    """Existencias valuadas a costo FIFO de un producto, al último movimiento procesado."""
+
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='valuacion')
+    cantidad = models.IntegerField("Cantidad", default=0)
+    valor = models.DecimalField("Valor", max_digits=16, decimal_places=4, default=0)
+    ultimo_costo = models.DecimalField("Último costo", max_digits=12, decimal_places=4, default=0)
+    # Unidades que salieron sin capa que las cubra (stock negativo); las
+    # próximas entradas las cubren antes de abrir una capa nueva
+    sin_capa = models.IntegerField("Unidades sin capa", default=0)
+
+    class Meta:
+        """Meta definition for ValuacionProducto."""
+
+        verbose_name = 'Valuación de Producto'
+        verbose_name_plural = 'Valuaciones de Productos'
+
+    def __str__(self):
+        """Unicode representation of ValuacionProducto."""
+        return f"{self.producto_id}: {self.cantidad} - {self.valor}"
+
+
+class ValuacionMensual(models.Model):
+    """Costo de lo vendido en el mes y existencias valuadas al cierre, por producto."""
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='valuaciones_mensuales')
+    mes = models.DateField("Mes")
+    unidades_vendidas = models.IntegerField("Unidades vendidas", default=0)
+    costo_vendido = models.DecimalField("Costo de lo vendido", max_digits=16, decimal_places=4, default=0)
+    # Salidas que no son ventas (roturas, ajustes, conciliación)
+    costo_otras_salidas = models.DecimalField("Costo de otras salidas", max_digits=16, decimal_places=4, default=0)
+    cantidad_cierre = models.IntegerField("Cantidad al cierre", default=0)
+    valor_cierre = models.DecimalField("Valor al cierre", max_digits=16, decimal_places=4, default=0)
+
+    class Meta:
+        """Meta definition for ValuacionMensual."""
+
+        verbose_name = 'Valuación Mensual'
+        verbose_name_plural = 'Valuaciones Mensuales'
+        ordering = ['-mes']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'mes'], name='valuacionmensual_producto_mes_unico'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of ValuacionMensual."""
+        return f"{self.producto_id} {self.mes:%m/%Y} - {self.valor_cierre}"
+
+
+class EstadoValuacion(models.Model):
+    """Fila única con el último movimiento procesado por la valuación."""
+
+    # Los movimientos se procesan en orden de (transaccion, id)
+    ultima_transaccion = models.BigIntegerField("Última transacción procesada", default=0)
+    ultimo_movimiento = models.BigIntegerField("Último movimiento procesado", default=0)
+    fecha = models.DateTimeField("Última corrida", blank=True, null=True)
+
+    class Meta:
+        """Meta definition for EstadoValuacion."""
+
+        verbose_name = 'Estado de la Valuación'
+        verbose_name_plural = 'Estado de la Valuación'
+
+    def __str__(self):
+        """Unicode representation of EstadoValuacion."""
+        return f"Hasta el movimiento {self.ultimo_movimiento}"
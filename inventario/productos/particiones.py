@@ -0,0 +1,270 @@
+# -----------------------------------------------------------------------------
+# productos/particiones.py
+# Particionado mensual de MovimientoStock y archivo de meses viejos.
+# -----------------------------------------------------------------------------
+"""
+En Postgres la tabla de movimientos está particionada por rango de `fecha`,
+una partición por mes (`productos_movimientostock_AAAA_MM`) más una partición
+DEFAULT para lo que caiga fuera. Archivar un mes es exportar su partición a
+un archivo JSON-lines comprimido, guardar los totales en
+ResumenMovimientoMensual y descartar la partición completa. La partición se
+bloquea antes de exportar y solo se descarta si el archivo tiene tantas
+filas como ella; si no, no se toca nada.
+
+En otros motores (SQLite en desarrollo) no hay particiones: el archivo se
+hace igual, borrando las filas del mes por lotes y comparando lo borrado con
+lo exportado.
+
+Un movimiento con fecha de un mes ya archivado se archiva en otro archivo
+(`movimientos_AAAA_MM_2.jsonl.gz`, ...) y se suma al resumen existente.
+"""
+import datetime
+import gzip
+import json
+import os
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+
+from .models import MovimientoStock, ResumenMovimientoMensual
+
+TABLA = MovimientoStock._meta.db_table
+PARTICION_DEFAULT = f"{TABLA}_default"
+TAMANIO_LOTE = 5000
+
+
+def nombre_particion(anio, mes):
+    return f"{TABLA}_{anio:04d}_{mes:02d}"
+
+
+def sumar_meses(anio, mes, cantidad):
+    total = anio * 12 + (mes - 1) + cantidad
+    return total // 12, total % 12 + 1
+
+
+def rango_mes(anio, mes):
+    """Límites [desde, hasta) del mes en UTC."""
+    siguiente = sumar_meses(anio, mes, 1)
+    desde = datetime.datetime(anio, mes, 1, tzinfo=datetime.timezone.utc)
+    hasta = datetime.datetime(*siguiente, 1, tzinfo=datetime.timezone.utc)
+    return desde, hasta
+
+
+def soporta_particiones():
+    return connection.vendor == 'postgresql'
+
+
+def esta_particionada():
+    if not soporta_particiones():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+            [TABLA],
+        )
+        return cursor.fetchone() is not None
+
+
+def listar_particiones():
+    """Devuelve [(anio, mes), ...] de las particiones mensuales existentes."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT hija.relname FROM pg_inherits i
+            JOIN pg_class padre ON padre.oid = i.inhparent
+            JOIN pg_class hija ON hija.oid = i.inhrelid
+            WHERE padre.relname = %s
+            """,
+            [TABLA],
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+
+    meses = []
+    for nombre in nombres:
+        sufijo = nombre[len(TABLA) + 1:]
+        partes = sufijo.split('_')
+        if len(partes) == 2 and all(p.isdigit() for p in partes):
+            meses.append((int(partes[0]), int(partes[1])))
+    return sorted(meses)
+
+
+def crear_particion(cursor, anio, mes):
+    """
+    Crea la partición del mes si no existe. Si la partición DEFAULT ya tiene
+    filas de ese mes, se mueven a la nueva partición.
+    """
+    nombre = nombre_particion(anio, mes)
+    desde, hasta = rango_mes(anio, mes)
+    cursor.execute("SELECT to_regclass(%s)", [nombre])
+    if cursor.fetchone()[0]:
+        return False
+
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {PARTICION_DEFAULT} WHERE fecha >= %s AND fecha < %s)",
+        [desde, hasta],
+    )
+    hay_filas_en_default = cursor.fetchone()[0]
+    if hay_filas_en_default:
+        cursor.execute(f"ALTER TABLE {TABLA} DETACH PARTITION {PARTICION_DEFAULT}")
+
+    cursor.execute(
+        f"CREATE TABLE {nombre} PARTITION OF {TABLA} FOR VALUES FROM (%s) TO (%s)",
+        [desde, hasta],
+    )
+
+    if hay_filas_en_default:
+        cursor.execute(
+            f"INSERT INTO {TABLA} SELECT * FROM {PARTICION_DEFAULT} WHERE fecha >= %s AND fecha < %s",
+            [desde, hasta],
+        )
+        cursor.execute(
+            f"DELETE FROM {PARTICION_DEFAULT} WHERE fecha >= %s AND fecha < %s",
+            [desde, hasta],
+        )
+        cursor.execute(f"ALTER TABLE {TABLA} ATTACH PARTITION {PARTICION_DEFAULT} DEFAULT")
+    return True
+
+
+def asegurar_particiones(meses_adelante=3, desde=None):
+    """Crea las particiones desde `desde` (o el mes actual) hasta `meses_adelante` meses después."""
+    hoy = datetime.date.today()
+    anio, mes = desde or (hoy.year, hoy.month)
+    ultimo = sumar_meses(hoy.year, hoy.month, meses_adelante)
+    creadas = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        while (anio, mes) <= ultimo:
+            if crear_particion(cursor, anio, mes):
+                creadas.append(nombre_particion(anio, mes))
+            anio, mes = sumar_meses(anio, mes, 1)
+    return creadas
+
+
+def meses_a_archivar(meses_antiguedad):
+    """Meses con movimientos anteriores al corte de antigüedad, del más viejo al más nuevo."""
+    hoy = datetime.date.today()
+    corte = sumar_meses(hoy.year, hoy.month, -meses_antiguedad)
+
+    if esta_particionada():
+        meses = listar_particiones()
+    else:
+        primero = MovimientoStock.objects.order_by('fecha').values_list('fecha', flat=True).first()
+        if primero is None:
+            return []
+        meses = []
+        actual = (primero.year, primero.month)
+        while actual < corte:
+            meses.append(actual)
+            actual = sumar_meses(*actual, 1)
+    return [m for m in meses if m < corte]
+
+
+class ArchivoIncompleto(Exception):
+    """Los movimientos exportados no son los mismos que se iban a quitar de la tabla."""
+
+
+def _exportar(movimientos, ruta):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    cantidad = 0
+    with gzip.open(temporal, 'wt', encoding='utf-8') as archivo:
+        for fila in movimientos.values().order_by('fecha', 'id').iterator(chunk_size=TAMANIO_LOTE):
+            archivo.write(json.dumps(fila, default=str) + "\n")
+            cantidad += 1
+    os.replace(temporal, ruta)
+    return cantidad
+
+
+def _ruta_libre(directorio, anio, mes):
+    """
+    Archivo para el mes. Si ya hay uno (movimientos con fecha de ese mes
+    registrados después de archivarlo), uno nuevo con número.
+    """
+    base = os.path.join(directorio, f"movimientos_{anio:04d}_{mes:02d}")
+    ruta, numero = f"{base}.jsonl.gz", 1
+    while os.path.exists(ruta):
+        numero += 1
+        ruta = f"{base}_{numero}.jsonl.gz"
+    return ruta
+
+
+def _resumir(movimientos, mes, ruta):
+    """Suma los movimientos al resumen mensual de cada producto (un solo GROUP BY)."""
+    totales = {
+        fila.pop('producto_id'): fila
+        for fila in movimientos.order_by().values('producto_id').annotate(
+            entradas=Sum('cantidad', filter=Q(tipo='entrada'), default=0),
+            salidas=Sum('cantidad', filter=Q(tipo='salida'), default=0),
+            ajustes=Sum('cantidad', filter=Q(tipo='ajuste'), default=0),
+            cantidad_movimientos=Count('id'),
+        )
+    }
+    # Un resumen que ya existe es de movimientos que ya no están en la tabla
+    existentes = ResumenMovimientoMensual.objects.select_for_update().filter(mes=mes, producto_id__in=list(totales))
+    actualizados = []
+    for resumen in existentes:
+        for campo, valor in totales.pop(resumen.producto_id).items():
+            setattr(resumen, campo, getattr(resumen, campo) + valor)
+        actualizados.append(resumen)
+    ResumenMovimientoMensual.objects.bulk_create(
+        [ResumenMovimientoMensual(producto_id=pk, mes=mes, archivo=ruta, **valores) for pk, valores in totales.items()],
+        batch_size=TAMANIO_LOTE,
+    )
+    ResumenMovimientoMensual.objects.bulk_update(
+        actualizados, ['entradas', 'salidas', 'ajustes', 'cantidad_movimientos'], batch_size=TAMANIO_LOTE,
+    )
+
+
+def archivar_mes(anio, mes, directorio):
+    """
+    Exporta los movimientos del mes a `directorio`, guarda el resumen mensual
+    por producto y los quita de la tabla, todo en una transacción. Si la
+    cantidad exportada no coincide con la que se quita, lanza
+    ArchivoIncompleto y no cambia nada. Devuelve la cantidad de movimientos.
+    """
+    desde, hasta = rango_mes(anio, mes)
+    movimientos = MovimientoStock.objects.filter(fecha__gte=desde, fecha__lt=hasta)
+    ruta = _ruta_libre(directorio, anio, mes)
+    particion = nombre_particion(anio, mes) if esta_particionada() else None
+
+    try:
+        with transaction.atomic():
+            if particion:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT to_regclass(%s)", [particion])
+                    if not cursor.fetchone()[0]:
+                        particion = None
+                    else:
+                        # Nadie escribe en el mes mientras se exporta: un movimiento
+                        # con fecha de ese mes espera a que termine el archivo
+                        cursor.execute(f"LOCK TABLE {particion} IN EXCLUSIVE MODE")
+                        cursor.execute(f"SELECT COUNT(*) FROM {particion}")
+                        esperados = cursor.fetchone()[0]
+
+            cantidad = _exportar(movimientos, ruta) if movimientos.exists() else 0
+            if particion and cantidad != esperados:
+                raise ArchivoIncompleto(f"{particion}: {esperados} movimientos, {cantidad} exportados")
+            _resumir(movimientos, desde.date(), ruta)
+
+            if particion:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ALTER TABLE {TABLA} DETACH PARTITION {particion}")
+                    cursor.execute(f"DROP TABLE {particion}")
+            else:
+                # Sin partición no hay bloqueo: lo que se haya registrado en el
+                # mes después de exportar también se borraría, así que se compara
+                borrados = 0
+                while True:
+                    ids = list(movimientos.order_by().values_list('id', flat=True)[:TAMANIO_LOTE])
+                    if not ids:
+                        break
+                    borrados += MovimientoStock.objects.filter(id__in=ids).delete()[0]
+                if borrados != cantidad:
+                    raise ArchivoIncompleto(
+                        f"{anio:04d}-{mes:02d}: {cantidad} movimientos exportados, {borrados} borrados"
+                    )
+    except Exception:
+        # Sin la transacción el archivo no corresponde a nada
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        raise
+    return cantidad
@@ -0,0 +1,134 @@
+# -----------------------------------------------------------------------------
+# productos/precios.py
+# Actualización masiva de precios.
+# -----------------------------------------------------------------------------
+"""
+Un ajuste de precios es porcentual (`precio * (1 + valor / 100)`) o de
+monto fijo (`precio + valor`), redondeado a múltiplos de `paso` (0.01, 0.05,
+1, 10...) hacia el más cercano o hacia arriba. El nuevo precio se calcula en
+la base con expresiones F() y se escribe con un único UPDATE para todos los
+productos seleccionados; antes se guarda el historial de precios en bloque.
+Al terminar se envía la señal precio_modificado (listas de precios de ventas).
+
+Un ajuste que dejaría algún producto con precio cero o negativo no se
+aplica: `aplicar` lanza PrecioNoPositivo y la vista previa lista esos
+productos (`no_positivos`).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Ceil, Round
+from django.utils import timezone
+
+from .models import HistorialPrecio, Producto
+from .signals import precio_modificado
+from . import cambios, kpis, sku_index
+
+MODOS = [
+    ('porcentaje', 'Porcentaje'),
+    ('fijo', 'Monto fijo'),
+]
+DIRECCIONES = [
+    ('cercano', 'Al más cercano'),
+    ('arriba', 'Hacia arriba'),
+]
+TAMANIO_LOTE = 1000
+
+
+class PrecioNoPositivo(Exception):
+    """El ajuste dejaría `cantidad` productos con precio cero o negativo."""
+
+    def __init__(self, cantidad):
+        self.cantidad = cantidad
+        super().__init__(f"El ajuste deja {cantidad} productos con precio cero o negativo")
+
+
+def expresion_precio(modo, valor, paso=Decimal('0.01'), direccion='cercano'):
+    """Expresión SQL del nuevo precio a partir de F('precio')."""
+    campo = Producto._meta.get_field('precio')
+    decimal = DecimalField(max_digits=campo.max_digits + 6, decimal_places=6)
+    valor, paso = Decimal(valor), Decimal(paso)
+
+    if modo == 'porcentaje':
+        nuevo = ExpressionWrapper(F('precio') * Value(1 + valor / 100, output_field=decimal), output_field=decimal)
+    elif modo == 'fijo':
+        nuevo = ExpressionWrapper(F('precio') + Value(valor, output_field=decimal), output_field=decimal)
+    else:
+        raise ValueError(f"Modo de ajuste desconocido: {modo}")
+
+    redondear = Ceil if direccion == 'arriba' else Round
+    escalado = ExpressionWrapper(nuevo / Value(paso, output_field=decimal), output_field=decimal)
+    return ExpressionWrapper(
+        redondear(escalado, output_field=decimal) * Value(paso, output_field=decimal), output_field=campo
+    )
+
+
+def filtrar(queryset=None, buscar=None, skus=None):
+    """Productos a ajustar: por texto (nombre o SKU) y/o por lista de SKU."""
+    queryset = Producto.objects.all() if queryset is None else queryset
+    if buscar:
+        queryset = queryset.filter(Q(nombre__icontains=buscar) | Q(sku=buscar))
+    if skus:
+        queryset = queryset.filter(sku__in=skus)
+    return queryset
+
+
+def previsualizar(queryset, expresion, limite=20):
+    """Primeras filas (id, nombre, precio actual, precio nuevo) del ajuste."""
+    return list(
+        queryset.order_by('nombre').annotate(precio_nuevo=expresion)
+        .values_list('pk', 'nombre', 'precio', 'precio_nuevo')[:limite]
+    )
+
+
+def no_positivos(queryset, expresion, limite=20):
+    """(cantidad, primeras filas como en previsualizar) de los productos que quedarían sin precio."""
+    rechazados = queryset.order_by('nombre').annotate(precio_nuevo=expresion).filter(precio_nuevo__lte=0)
+    return rechazados.count(), list(rechazados.values_list('pk', 'nombre', 'precio', 'precio_nuevo')[:limite])
+
+
+@transaction.atomic
+def aplicar(queryset, modo, valor, paso=Decimal('0.01'), direccion='cercano', usuario='Sistema', motivo=''):
+    """
+    Aplica el ajuste a los productos del queryset. Devuelve la cantidad de
+    productos cuyo precio cambió. Lanza PrecioNoPositivo, sin modificar nada,
+    si algún precio quedaría en cero o negativo.
+    """
+    expresion = expresion_precio(modo, valor, paso, direccion)
+    queryset = queryset.order_by()
+
+    # Se bloquean las filas para que el historial coincida con lo que escribe el UPDATE
+    filas = list(
+        queryset.select_for_update().annotate(precio_nuevo=expresion)
+        .values_list('pk', 'precio', 'precio_nuevo', 'stock')
+    )
+    rechazados = sum(1 for _, _, nuevo, _ in filas if Decimal(nuevo) <= 0)
+    if rechazados:
+        raise PrecioNoPositivo(rechazados)
+    cuantizar = Decimal('0.01')
+    modificados = [
+        (pk, anterior, Decimal(nuevo).quantize(cuantizar), stock)
+        for pk, anterior, nuevo, stock in filas
+        if Decimal(nuevo).quantize(cuantizar) != anterior
+    ]
+    if not modificados:
+        return 0
+
+    ahora = timezone.now()
+    HistorialPrecio.objects.bulk_create(
+        [
+            HistorialPrecio(
+                producto_id=pk, precio_anterior=anterior, precio_nuevo=nuevo,
+                fecha=ahora, usuario=usuario, motivo=motivo,
+            )
+            for pk, anterior, nuevo, _ in modificados
+        ],
+        batch_size=TAMANIO_LOTE,
+    )
+    queryset.update(precio=expresion, version=F('version') + 1, **cambios.marcas())
+
+    kpis.sumar(kpis.VALOR_INVENTARIO, sum((nuevo - anterior) * stock for _, anterior, nuevo, stock in modificados))
+    sku_index.marcar_cambio()
+    precio_modificado.send(sender=Producto, producto_ids=[pk for pk, _, _, _ in modificados])
+    return len(modificados)
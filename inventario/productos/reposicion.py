@@ -0,0 +1,151 @@
+# -----------------------------------------------------------------------------
+# productos/reposicion.py
+# Cálculo vectorizado de puntos de reposición (stock mínimo sugerido).
+# -----------------------------------------------------------------------------
+"""
+La demanda diaria de cada producto sale de las ventas (ItemVenta) y de las
+salidas de stock que no vienen de una venta (MovimientoStock). La base
+agrupa el historial por producto y día y calcula el número de día; el
+resultado (UNION ALL de las dos fuentes) se lee por lotes directo a un
+arreglo de NumPy. Las estadísticas se calculan para todo el catálogo de una
+vez, sin recorrer producto por producto en Python.
+
+    punto de reposición = demanda media * L + z * desvío * sqrt(L)
+
+donde L es el tiempo de reposición en días y z sale del nivel de servicio.
+"""
+import datetime
+from itertools import chain
+from statistics import NormalDist
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import DateField, F, Func, IntegerField, Sum, Value
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+
+from ventas.models import ItemVenta
+from .models import MovimientoStock, Producto
+from . import cambios, kpis
+
+TAMANIO_LOTE = 10000
+# Ventana mínima para productos nuevos: evita que una sola venta reciente
+# se tome como la demanda de todos los días
+DIAS_MINIMOS = 28
+
+
+class DiasDesde(Func):
+    """Días enteros desde la fecha `desde` hasta la fecha de la expresión."""
+    template = '(%(expressions)s)'
+    arg_joiner = ' - '
+    output_field = IntegerField()
+
+    def __init__(self, expresion, desde):
+        super().__init__(expresion, Cast(Value(desde), DateField()))
+
+    def as_sqlite(self, compiler, connection, **extra):
+        return self.as_sql(
+            compiler, connection, template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(', **extra
+        )
+
+
+def _valores(cursor):
+    """Los valores de todas las filas del cursor, leídas por lotes."""
+    for lote in iter(lambda: cursor.fetchmany(TAMANIO_LOTE), []):
+        yield from chain.from_iterable(lote)
+
+
+def cargar_demanda(desde):
+    """
+    Devuelve (producto_ids, dias, cantidades) como arreglos de NumPy, donde
+    `dias` es la cantidad de días desde `desde`. Un mismo (producto, día)
+    puede venir dos veces (ventas y otras salidas): calcular_puntos los suma.
+    """
+    # order_by() vacío: la UNION no admite el ordenamiento por defecto de cada modelo
+    ventas = ItemVenta.objects.filter(venta__fecha__gte=desde).order_by().values(
+        'producto_id', dia=DiasDesde('venta__fecha', desde)
+    ).annotate(total=Sum('cantidad')).values_list('producto_id', 'dia', 'total')
+    inicio = timezone.make_aware(datetime.datetime.combine(desde, datetime.time.min))
+    # Las salidas generadas por ventas ya están contadas en ItemVenta
+    salidas = MovimientoStock.objects.filter(
+        tipo='salida', fecha__gte=inicio
+    ).exclude(origen='venta').order_by().values(
+        'producto_id', dia=DiasDesde(TruncDate('fecha'), desde)
+    ).annotate(total=Sum('cantidad')).values_list('producto_id', 'dia', 'total')
+
+    sql, params = ventas.union(salidas, all=True).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        filas = np.fromiter(_valores(cursor), dtype=np.int64).reshape(-1, 3)
+    return filas[:, 0].copy(), filas[:, 1].copy(), filas[:, 2].astype(np.float64)
+
+
+def calcular_puntos(productos, dias, cantidades, total_dias, lead_time, nivel_servicio):
+    """
+    Devuelve (ids, media diaria, desvío diario, punto de reposición) para
+    los productos con demanda en el período.
+    """
+    if not len(productos):
+        vacio = np.array([], dtype=np.float64)
+        return np.array([], dtype=np.int64), vacio, vacio, vacio
+
+    # Demanda por (producto, día): se codifica el par en un solo entero
+    clave = productos * total_dias + dias
+    claves, inversa = np.unique(clave, return_inverse=True)
+    por_dia = np.bincount(inversa, weights=cantidades)
+
+    # Agregados por producto. Las claves están ordenadas, así que el primer
+    # índice de cada producto corresponde a su primer día con demanda.
+    producto_de_clave = claves // total_dias
+    ids, primero, indice = np.unique(producto_de_clave, return_index=True, return_inverse=True)
+    suma = np.bincount(indice, weights=por_dia)
+    suma_cuadrados = np.bincount(indice, weights=por_dia ** 2)
+
+    # Los días sin demanda cuentan como cero desde la primera venta del producto
+    dias_activos = np.maximum(
+        total_dias - claves[primero] % total_dias, min(DIAS_MINIMOS, total_dias)
+    ).astype(np.float64)
+    media = suma / dias_activos
+    desvio = np.sqrt(np.maximum(suma_cuadrados / dias_activos - media ** 2, 0))
+
+    z = NormalDist().inv_cdf(nivel_servicio)
+    punto = np.ceil(media * lead_time + z * desvio * np.sqrt(lead_time))
+    return ids, media, desvio, punto
+
+
+def sugerir_stock_minimo(dias_historia, lead_time, nivel_servicio, minimo=0):
+    """Devuelve {producto_id: stock_minimo sugerido} para los productos con demanda."""
+    hasta = timezone.localdate()
+    desde = hasta - datetime.timedelta(days=dias_historia - 1)
+    productos, dias, cantidades = cargar_demanda(desde)
+    ids, _, _, punto = calcular_puntos(productos, dias, cantidades, dias_historia, lead_time, nivel_servicio)
+    punto = np.maximum(punto, minimo).astype(np.int64)
+    return dict(zip(ids.tolist(), punto.tolist()))
+
+
+def guardar_stock_minimo(sugeridos, tamanio_lote=1000):
+    """
+    Escribe los valores sugeridos que cambiaron y ajusta el indicador de
+    productos bajo el mínimo. Devuelve la cantidad de productos actualizados.
+    """
+    ahora = timezone.now()
+    modificados = []
+    bajo_minimo = 0
+    productos = Producto.objects.values_list('pk', 'stock_minimo', 'stock').iterator(chunk_size=TAMANIO_LOTE)
+    for pk, actual, stock in productos:
+        if pk not in sugeridos or sugeridos[pk] == actual:
+            continue
+        bajo_minimo += (stock < sugeridos[pk]) - (stock < actual)
+        modificados.append(Producto(
+            pk=pk, stock_minimo=sugeridos[pk], version=F('version') + 1,
+            fecha_actualizacion=ahora, secuencia=cambios.SiguienteSecuencia(),
+            transaccion=cambios.TransaccionActual(),
+        ))
+    with transaction.atomic():
+        Producto.objects.bulk_update(
+            modificados, ['stock_minimo', 'version', 'fecha_actualizacion', 'secuencia', 'transaccion'],
+            batch_size=tamanio_lote,
+        )
+        kpis.sumar(kpis.STOCK_BAJO, bajo_minimo)
+    return len(modificados)
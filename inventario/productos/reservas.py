@@ -0,0 +1,135 @@
+# -----------------------------------------------------------------------------
+# productos/reservas.py
+# Reservas de stock de corta duración para las ventas que se están armando.
+# -----------------------------------------------------------------------------
+"""
+Mientras un cajero arma una venta, cada línea retiene sus unidades con una
+ReservaStock (una por carrito y producto) que vence a los RESERVAS_MINUTOS
+minutos de la última modificación. `Producto.reservado` guarda la suma de
+las reservas vigentes, así el disponible (`stock - reservado`) se lee de la
+propia fila del producto sin sumar reservas.
+
+- Reservar es un UPDATE condicional (`stock >= reservado + delta`) en
+  autocommit: no queda ningún bloqueo tomado mientras el cajero sigue
+  cargando la venta.
+- Al confirmar la venta, sus reservas se liberan y el stock se descuenta en
+  la misma transacción, respetando las reservas de los otros carritos.
+- Una reserva vencida deja de retener stock aunque nadie la haya liberado:
+  cuando una reserva o una venta no alcanza, primero se liberan las
+  reservas vencidas de ese producto y se vuelve a intentar.
+- `liberar_vencidas()` (comando liberar_reservas o la tarea
+  productos.liberar_reservas) devuelve por lotes las reservas abandonadas
+  de todos los productos; solo corrige `reservado` en los listados.
+
+En los productos con stock fragmentado la reserva se compara con
+`Producto.stock`, que refleja la suma de fragmentos con unos segundos de
+atraso; el descuento final sigue siendo condicional sobre los fragmentos.
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Producto, ReservaStock
+from .stock import StockInsuficiente
+
+DURACION = datetime.timedelta(minutes=getattr(settings, 'RESERVAS_MINUTOS', 10))
+TAMANIO_LOTE = 500
+
+
+def disponible(producto_id):
+    return Producto.objects.filter(pk=producto_id).values_list(
+        F('stock') - F('reservado'), flat=True
+    ).first()
+
+
+def _retener(producto_id, delta):
+    return Producto.objects.filter(pk=producto_id, stock__gte=F('reservado') + delta).update(
+        reservado=F('reservado') + delta
+    )
+
+
+def reservar(carrito, producto_id, cantidad, usuario=''):
+    """
+    Deja en `cantidad` la reserva del carrito sobre el producto (0 la libera)
+    y renueva su vencimiento. Devuelve el disponible; lanza StockInsuficiente.
+    """
+    with transaction.atomic():
+        actual = ReservaStock.objects.select_for_update().filter(carrito=carrito, producto_id=producto_id).first()
+        delta = cantidad - (actual.cantidad if actual else 0)
+        if delta > 0:
+            if not _retener(producto_id, delta) and not (
+                liberar_vencidas_de(producto_id, excepto_carrito=carrito) and _retener(producto_id, delta)
+            ):
+                raise StockInsuficiente(Producto.objects.only('nombre').get(pk=producto_id), cantidad)
+        elif delta < 0:
+            Producto.objects.filter(pk=producto_id).update(reservado=Greatest(F('reservado') + delta, Value(0)))
+
+        if not cantidad:
+            if actual:
+                actual.delete()
+        elif actual:
+            ReservaStock.objects.filter(pk=actual.pk).update(cantidad=cantidad, vence=timezone.now() + DURACION)
+        else:
+            ReservaStock.objects.create(
+                carrito=carrito, producto_id=producto_id, cantidad=cantidad,
+                vence=timezone.now() + DURACION, usuario=usuario,
+            )
+    return disponible(producto_id)
+
+
+def _liberar(reservas):
+    """Descuenta las reservas (ya bloqueadas) de Producto.reservado y las borra."""
+    por_producto = defaultdict(int)
+    for reserva in reservas:
+        por_producto[reserva.producto_id] += reserva.cantidad
+    # En orden de id, como el resto de las escrituras sobre varios productos
+    for producto_id in sorted(por_producto):
+        Producto.objects.filter(pk=producto_id).update(
+            reservado=Greatest(F('reservado') - por_producto[producto_id], Value(0))
+        )
+    ReservaStock.objects.filter(pk__in=[r.pk for r in reservas]).delete()
+
+
+def liberar_carrito(carrito):
+    """Libera las reservas del carrito. La venta lo llama en su transacción, antes de descontar."""
+    reservas = list(ReservaStock.objects.select_for_update().filter(carrito=carrito).order_by('producto_id'))
+    if reservas:
+        _liberar(reservas)
+    return {r.producto_id: r.cantidad for r in reservas}
+
+
+def liberar_vencidas_de(producto_id, excepto_carrito=None):
+    """Libera las reservas vencidas de un producto. Devuelve las unidades liberadas."""
+    with transaction.atomic():
+        reservas = ReservaStock.objects.select_for_update(skip_locked=True).filter(
+            producto_id=producto_id, vence__lt=timezone.now()
+        )
+        if excepto_carrito:
+            reservas = reservas.exclude(carrito=excepto_carrito)
+        reservas = list(reservas)
+        if reservas:
+            _liberar(reservas)
+    return sum(r.cantidad for r in reservas)
+
+
+def liberar_vencidas(tamanio_lote=TAMANIO_LOTE):
+    """Libera las reservas vencidas, un lote por transacción. Devuelve la cantidad."""
+    liberadas = 0
+    while True:
+        with transaction.atomic():
+            # SKIP LOCKED: las que un cajero está renovando quedan para la próxima pasada
+            reservas = list(
+                ReservaStock.objects.select_for_update(skip_locked=True)
+                .filter(vence__lt=timezone.now()).order_by('vence')[:tamanio_lote]
+            )
+            if not reservas:
+                return liberadas
+            _liberar(reservas)
+        liberadas += len(reservas)
+        if len(reservas) < tamanio_lote:
+            return liberadas
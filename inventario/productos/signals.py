@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import cambios, sku_index
+from .models import Deposito, Producto, StockDeposito
+
+# Cambió el precio de los productos `producto_ids` (alta, edición o ajuste masivo)
+precio_modificado = Signal()
+
+
+@receiver(pre_save, sender=Producto)
+def numerar_cambio(sender, instance, raw=False, **kwargs):
+    # Cada guardado recibe un número nuevo para el feed de cambios
+    if not raw:
+        instance.secuencia, instance.transaccion = cambios.numeracion()
+
+
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if created and not raw:
+        # El stock inicial queda en el depósito principal
+        StockDeposito.objects.create(deposito_id=Deposito.id_principal(), producto=instance, stock=instance.stock)
+    if not raw and (created or update_fields is None or 'precio' in update_fields):
+        precio_modificado.send(sender=Producto, producto_ids=[instance.pk])
+    if instance.archivado:
+        sku_index.indice.quitar(instance.pk)
+    else:
+        sku_index.indice.actualizar(instance)
+    if update_fields is None or not sku_index.CAMPOS_CATALOGO.isdisjoint(update_fields):
+        sku_index.marcar_cambio()
+
+
+@receiver(post_delete, sender=Producto)
+def producto_eliminado(sender, instance, **kwargs):
+    # Los archivados ya se informaron como baja al archivarlos (bajas.py)
+    if not instance.archivado:
+        cambios.registrar_baja(instance)
+    sku_index.indice.quitar(instance.pk)
+    sku_index.marcar_cambio(borrado=True)
@@ -0,0 +1,157 @@
+# -----------------------------------------------------------------------------
+# productos/sku_index.py
+# Índice en memoria SKU -> (id, nombre, precio, stock) para los lectores de código.
+# -----------------------------------------------------------------------------
+"""
+Cada proceso guarda una copia compacta del catálogo (id, nombre, precio,
+stock) indexada por SKU, y una consulta que la encuentra no va a la base.
+
+Cada SKU_INDEX_TTL segundos, en la primera consulta después de vencido el
+plazo, el proceso lee VersionCatalogo (una fila, por clave primaria) y los
+productos escritos después de su cursor del feed de cambios (ver
+cambios.py): toda escritura sobre Producto, incluidos los movimientos de
+stock, le asigna una secuencia nueva, así que la relectura trae solo lo
+modificado y casi siempre vuelve vacía. Las bajas incrementan la
+generación, que obliga a recargar el índice completo. El stock puede quedar
+atrasado hasta SKU_INDEX_TTL segundos, como la suma de fragmentos en caché.
+
+En los productos fragmentados la columna stock no se actualiza en cada
+venta: se toma la suma de fragmentos de stock.stock_total, que usa la caché
+compartida.
+
+El índice se carga al iniciar cada proceso (wsgi.py / asgi.py) con
+calentar(); si la base no estaba disponible, en la primera consulta.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from inventario import metricas
+from . import cambios, stock
+from .models import Producto, VersionCatalogo
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = ('pk', 'sku', 'nombre', 'precio', 'stock', 'shards', 'transaccion', 'secuencia')
+# Un guardado que no toca ninguno de estos no cambia el índice
+CAMPOS_CATALOGO = frozenset({'sku', 'nombre', 'precio', 'archivado'})
+
+# Segundos entre verificaciones contra la base
+TTL = getattr(settings, 'SKU_INDEX_TTL', 2)
+
+
+def _leer_version():
+    return VersionCatalogo.objects.filter(pk=1).values_list('version', 'generacion').first() or (0, 0)
+
+
+def marcar_cambio(borrado=False):
+    """Avisa a todos los procesos que cambiaron datos del catálogo; se confirma con la transacción en curso."""
+    cambios_version = {'version': F('version') + 1}
+    if borrado:
+        cambios_version['generacion'] = F('generacion') + 1
+    if not VersionCatalogo.objects.filter(pk=1).update(**cambios_version):
+        VersionCatalogo.objects.get_or_create(pk=1)
+        VersionCatalogo.objects.filter(pk=1).update(**cambios_version)
+
+
+class IndiceSku:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filas = {}     # sku -> (id, nombre, precio, stock, shards)
+        self._skus = {}      # id -> sku, para detectar cambios de SKU
+        self._version = None
+        self._cursor = (0, 0)  # (transaccion, secuencia) leído, como en cambios.leer
+        self._verificado = 0.0  # time.monotonic() de la última verificación
+        self.cargado = False
+
+    def _guardar(self, pk, sku, nombre, precio, stock_actual, shards):
+        anterior = self._skus.pop(pk, None)
+        if anterior is not None:
+            self._filas.pop(anterior, None)
+        if sku:
+            self._filas[sku] = (pk, nombre, precio, stock_actual, shards)
+            self._skus[pk] = sku
+
+    def _cargar(self, queryset):
+        # El tope se toma antes de leer: lo que confirme después queda por
+        # delante del cursor y se relee en el próximo refresco
+        tope = cambios.tope_confirmado()
+        cursor = self._cursor
+        for pk, sku, nombre, precio, stock_actual, shards, transaccion, secuencia in (
+            queryset.values_list(*CAMPOS).iterator(chunk_size=5000)
+        ):
+            self._guardar(pk, sku, nombre, precio, stock_actual, shards)
+            cursor = max(cursor, (transaccion, secuencia))
+        self._cursor = cursor if tope is None else min(cursor, (tope, 0))
+
+    def cargar(self):
+        """Lee el catálogo completo."""
+        with self._lock:
+            inicio = time.perf_counter()
+            version = _leer_version()
+            self._filas, self._skus, self._cursor = {}, {}, (0, 0)
+            self._cargar(Producto.objects.exclude(sku__isnull=True).exclude(sku='').order_by())
+            self._version = version
+            self._verificado = time.monotonic()
+            self.cargado = True
+        logger.info("Índice de SKU cargado: %d productos en %.2f s", len(self._filas), time.perf_counter() - inicio)
+
+    def _refrescar(self, version):
+        with self._lock:
+            transaccion, secuencia = self._cursor
+            self._cargar(Producto.objects.filter(
+                Q(transaccion__gt=transaccion) | Q(transaccion=transaccion, secuencia__gt=secuencia)
+            ).order_by())
+            self._version = version
+            self._verificado = time.monotonic()
+
+    def asegurar_fresco(self):
+        vigente = self.cargado and time.monotonic() - self._verificado < TTL
+        metricas.registrar_cache('sku_index', vigente)
+        if vigente:
+            return
+        version = _leer_version()
+        if not self.cargado or version[1] != self._version[1]:
+            self.cargar()
+        else:
+            self._refrescar(version)
+
+    def buscar(self, skus):
+        """Devuelve {sku: (id, nombre, precio, stock)} para los SKU encontrados."""
+        self.asegurar_fresco()
+        encontrados = {}
+        for sku in skus:
+            fila = self._filas.get(sku)
+            if fila is None:
+                continue
+            pk, nombre, precio, stock_actual, shards = fila
+            if shards:
+                stock_actual = stock.stock_total(Producto(pk=pk, shards=shards, stock=stock_actual))
+            encontrados[sku] = (pk, nombre, precio, stock_actual)
+        return encontrados
+
+    # Actualizaciones locales desde las señales: el proceso que hizo el cambio
+    # no espera a releer la base
+    def actualizar(self, producto):
+        with self._lock:
+            self._guardar(producto.pk, producto.sku, producto.nombre, producto.precio, producto.stock, producto.shards)
+
+    def quitar(self, producto_id):
+        with self._lock:
+            sku = self._skus.pop(producto_id, None)
+            if sku is not None:
+                self._filas.pop(sku, None)
+
+
+indice = IndiceSku()
+
+
+def calentar():
+    """Carga el índice al iniciar el proceso. Si la base no está disponible se cargará en la primera consulta."""
+    try:
+        indice.cargar()
+    except Exception:
+        logger.exception("No se pudo cargar el índice de SKU al iniciar")
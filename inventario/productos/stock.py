@@ -0,0 +1,469 @@
+# -----------------------------------------------------------------------------
+# productos/stock.py
+# Operaciones de escritura y lectura sobre el stock de los productos.
+# -----------------------------------------------------------------------------
+"""
+Todas las vistas que cambian stock pasan por este módulo.
+
+Cada producto tiene una fila de StockDeposito por depósito y
+`Producto.stock` es el total. En modo normal cada escritura cambia las dos
+filas en la misma transacción y siempre en ese orden (primero el producto,
+después el depósito), así nunca hay que sumar los depósitos para conocer el
+total. Sin depósito se usa el principal. Una transferencia no cambia el
+total: es un único UPDATE sobre las dos filas de depósito.
+
+En modo fragmentado (opcional, para los productos más vendidos) el stock de
+cada depósito se reparte en `shards` filas de StockShard y cada escritura
+elige un fragmento del depósito al azar, así las ventas concurrentes no se
+encolan sobre la misma fila. Ahí los fragmentos son la fuente de verdad:
+`Producto.stock` y las filas de StockDeposito quedan como copias de sus
+sumas, que `stock_total()` pone al día cada pocos segundos.
+
+Las salidas son siempre condicionales (`stock >= cantidad`) para no vender
+nunca más de lo que hay; las ventas además respetan las unidades reservadas
+por otras ventas en curso (ver reservas.py).
+"""
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, When
+
+from inventario import metricas
+from .models import Deposito, Producto, StockDeposito, StockShard
+from . import cambios, kpis
+
+# Segundos que se reutiliza la suma de fragmentos antes de volver a calcularla
+CACHE_TTL = getattr(settings, 'STOCK_SHARDS_CACHE_TTL', 2)
+
+
+class StockInsuficiente(Exception):
+    """No hay stock suficiente para registrar la salida."""
+
+    def __init__(self, producto, cantidad):
+        self.producto = producto
+        self.cantidad = cantidad
+        super().__init__(f"No hay stock suficiente de {producto.nombre} para descontar {cantidad}")
+
+
+def _clave_cache(producto_id):
+    return f"productos:stock_total:{producto_id}"
+
+
+def _repartir(total, partes):
+    """Divide `total` en `partes` enteros lo más parejos posible."""
+    base, resto = divmod(total, partes)
+    return [base + (1 if i < resto else 0) for i in range(partes)]
+
+
+def _refrescar_modo(producto):
+    producto.shards = Producto.objects.values_list('shards', flat=True).get(pk=producto.pk)
+
+
+# -----------------------------------------------------------------------------
+# Escrituras
+# -----------------------------------------------------------------------------
+def _id_deposito(deposito):
+    """Id del depósito (instancia o id); None es el principal."""
+    if deposito is None:
+        return Deposito.id_principal()
+    return getattr(deposito, 'pk', deposito)
+
+
+def _sumar_en_deposito(producto_id, deposito_id, cantidad):
+    filas = StockDeposito.objects.filter(producto_id=producto_id, deposito_id=deposito_id)
+    if not filas.update(stock=F('stock') + cantidad):
+        # Primera vez del producto en ese depósito
+        StockDeposito.objects.bulk_create(
+            [StockDeposito(producto_id=producto_id, deposito_id=deposito_id)], ignore_conflicts=True
+        )
+        filas.update(stock=F('stock') + cantidad)
+
+
+def _restar_en_deposito(producto, deposito_id, cantidad):
+    if not StockDeposito.objects.filter(
+        producto_id=producto.pk, deposito_id=deposito_id, stock__gte=cantidad
+    ).update(stock=F('stock') - cantidad):
+        raise StockInsuficiente(producto, cantidad)
+
+
+def _aplicar_diferencia(por_deposito, diferencia):
+    """
+    {deposito_id: stock} después de un cambio del total: las altas van al
+    principal y las bajas salen primero del principal y después del resto.
+    """
+    principal = Deposito.id_principal()
+    nuevo = dict(por_deposito)
+    if diferencia >= 0:
+        nuevo[principal] = nuevo.get(principal, 0) + diferencia
+        return nuevo
+    restante = -diferencia
+    for deposito_id in sorted(nuevo, key=lambda d: (d != principal, d)):
+        tomar = min(nuevo[deposito_id], restante)
+        nuevo[deposito_id] -= tomar
+        restante -= tomar
+    return nuevo
+
+
+def aplicar_en_depositos(producto_id, diferencia):
+    """
+    Aplica al depósito principal un cambio del total. Si el principal no
+    alcanza para una baja, el resto sale de los demás depósitos.
+    """
+    if diferencia >= 0:
+        if diferencia:
+            _sumar_en_deposito(producto_id, Deposito.id_principal(), diferencia)
+        return
+    filas = list(
+        StockDeposito.objects.select_for_update().filter(producto_id=producto_id, stock__gt=0).order_by('deposito_id')
+    )
+    nuevo = _aplicar_diferencia({fila.deposito_id: fila.stock for fila in filas}, diferencia)
+    for fila in filas:
+        fila.stock = nuevo[fila.deposito_id]
+    StockDeposito.objects.bulk_update(filas, ['stock'])
+
+
+def _guardar_depositos(producto_id, por_deposito):
+    """Deja las filas de StockDeposito del producto con esos valores (las crea si faltan)."""
+    StockDeposito.objects.bulk_create(
+        [StockDeposito(producto_id=producto_id, deposito_id=d) for d in por_deposito], ignore_conflicts=True
+    )
+    for deposito_id, valor in sorted(por_deposito.items()):
+        StockDeposito.objects.filter(producto_id=producto_id, deposito_id=deposito_id).exclude(stock=valor).update(
+            stock=valor
+        )
+
+
+def _fragmentos(producto_id, deposito_id=None):
+    fragmentos = StockShard.objects.filter(producto_id=producto_id)
+    return fragmentos if deposito_id is None else fragmentos.filter(deposito_id=deposito_id)
+
+
+def _suma_por_deposito(fragmentos):
+    por_deposito = defaultdict(int)
+    for fragmento in fragmentos:
+        por_deposito[fragmento.deposito_id] += fragmento.stock
+    return por_deposito
+
+
+def _crear_fragmentos(producto_id, deposito_id, cantidad, stock=0):
+    StockShard.objects.bulk_create([
+        StockShard(producto_id=producto_id, deposito_id=deposito_id, indice=i, stock=parte)
+        for i, parte in enumerate(_repartir(stock, cantidad))
+    ], ignore_conflicts=True)
+
+
+def _reescribir_fragmentos(producto, fragmentos, por_deposito):
+    """Reparte en los fragmentos (ya bloqueados) el stock de cada depósito."""
+    propios = defaultdict(list)
+    for fragmento in fragmentos:
+        propios[fragmento.deposito_id].append(fragmento)
+    modificados = []
+    for deposito_id, valor in por_deposito.items():
+        if not propios[deposito_id]:
+            _crear_fragmentos(producto.pk, deposito_id, producto.shards, valor)
+            continue
+        for fragmento, nuevo in zip(propios[deposito_id], _repartir(valor, len(propios[deposito_id]))):
+            fragmento.stock = nuevo
+            modificados.append(fragmento)
+    StockShard.objects.bulk_update(modificados, ['stock'])
+
+
+def incrementar(producto, cantidad, deposito=None):
+    """Suma `cantidad` al stock del producto en el depósito (por defecto, el principal)."""
+    anterior = producto.stock
+    deposito_id = _id_deposito(deposito)
+    with transaction.atomic():
+        if not _incrementar(producto, cantidad, deposito_id):
+            _sumar_en_deposito(producto.pk, deposito_id, cantidad)
+    producto.stock = anterior + cantidad
+    kpis.registrar_cambio_stock(producto, anterior)
+    metricas.registrar_stock('entrada', cantidad)
+
+
+def _incrementar(producto, cantidad, deposito_id):
+    """Suma al total. Devuelve True si lo hizo en un fragmento del depósito (no hay fila de depósito que tocar)."""
+    if not producto.shards:
+        # La condición shards=0 evita escribir en la columna si el producto
+        # se fragmentó mientras tanto.
+        if Producto.objects.filter(pk=producto.pk, shards=0).update(
+            stock=F('stock') + cantidad, **cambios.marcas()
+        ):
+            return False
+        _refrescar_modo(producto)
+
+    indice = random.randrange(producto.shards)
+    if _fragmentos(producto.pk, deposito_id).filter(indice=indice).update(stock=F('stock') + cantidad):
+        return True
+    # Los fragmentos se desactivaron entre la lectura y la escritura, o es la
+    # primera entrada en ese depósito desde que se fragmentó. Con el producto
+    # bloqueado no puede activarse ni desactivarse el modo mientras tanto
+    producto.shards = Producto.objects.select_for_update().values_list('shards', flat=True).get(pk=producto.pk)
+    if producto.shards:
+        _crear_fragmentos(producto.pk, deposito_id, producto.shards)
+    return _incrementar(producto, cantidad, deposito_id)
+
+
+def decrementar(producto, cantidad, respetar_reservas=False, deposito=None):
+    """
+    Descuenta `cantidad` del stock del depósito (por defecto, el principal) y
+    del total, sin dejar ninguno negativo.
+    Con `respetar_reservas` tampoco toma unidades reservadas (solo en modo normal).
+    Lanza StockInsuficiente si no alcanza.
+    """
+    anterior = producto.stock
+    deposito_id = _id_deposito(deposito)
+    # Si el depósito no alcanza se deshace también el descuento del total
+    with transaction.atomic():
+        if not _decrementar(producto, cantidad, respetar_reservas, deposito_id):
+            _restar_en_deposito(producto, deposito_id, cantidad)
+    producto.stock = anterior - cantidad
+    kpis.registrar_cambio_stock(producto, anterior)
+    metricas.registrar_stock('salida', cantidad)
+
+
+def _descontar_columna(producto, cantidad, respetar_reservas):
+    minimo = F('reservado') + cantidad if respetar_reservas else cantidad
+    return Producto.objects.filter(pk=producto.pk, shards=0, stock__gte=minimo).update(
+        stock=F('stock') - cantidad, **cambios.marcas()
+    )
+
+
+def _decrementar(producto, cantidad, respetar_reservas, deposito_id):
+    """Descuenta del total. Devuelve True si lo hizo en los fragmentos del depósito (ver _incrementar)."""
+    if not producto.shards:
+        if _descontar_columna(producto, cantidad, respetar_reservas):
+            return False
+        if respetar_reservas:
+            # Las reservas vencidas que nadie liberó todavía no retienen stock
+            # (import local: reservas.py importa este módulo)
+            from .reservas import liberar_vencidas_de
+            if liberar_vencidas_de(producto.pk) and _descontar_columna(producto, cantidad, respetar_reservas):
+                return False
+        _refrescar_modo(producto)
+        if not producto.shards:
+            raise StockInsuficiente(producto, cantidad)
+
+    # Primero se intenta con un único fragmento del depósito, empezando por uno al azar
+    indices = list(range(producto.shards))
+    random.shuffle(indices)
+    for indice in indices:
+        if _fragmentos(producto.pk, deposito_id).filter(
+            indice=indice, stock__gte=cantidad
+        ).update(stock=F('stock') - cantidad):
+            return True
+
+    # Ningún fragmento alcanza por sí solo: se descuenta de varios bajo bloqueo
+    with transaction.atomic():
+        fragmentos = list(_fragmentos(producto.pk, deposito_id).select_for_update().order_by('indice'))
+        if not fragmentos:
+            _refrescar_modo(producto)
+            if not producto.shards:
+                return _decrementar(producto, cantidad, respetar_reservas, deposito_id)
+        if sum(f.stock for f in fragmentos) < cantidad:
+            raise StockInsuficiente(producto, cantidad)
+
+        restante = cantidad
+        for fragmento in fragmentos:
+            tomar = min(fragmento.stock, restante)
+            if tomar:
+                fragmento.stock -= tomar
+                fragmento.save(update_fields=['stock'])
+                restante -= tomar
+            if not restante:
+                break
+    return True
+
+
+@transaction.atomic
+def fijar(producto, valor, deposito=None):
+    """
+    Establece el stock del producto en `valor`. Con `deposito`, `valor` es el
+    stock de ese depósito y el total cambia en la misma diferencia; sin él,
+    `valor` es el total y la diferencia va al depósito principal.
+    Devuelve la diferencia respecto del stock anterior.
+    """
+    bloqueado = Producto.objects.select_for_update().get(pk=producto.pk)
+    producto.shards = bloqueado.shards
+    if bloqueado.shards:
+        return _fijar_fragmentado(producto, valor, deposito)
+    anterior = bloqueado.stock
+
+    if deposito is None:
+        diferencia = valor - anterior
+        aplicar_en_depositos(producto.pk, diferencia)
+    else:
+        deposito_id = _id_deposito(deposito)
+        StockDeposito.objects.bulk_create(
+            [StockDeposito(producto_id=producto.pk, deposito_id=deposito_id)], ignore_conflicts=True
+        )
+        fila = StockDeposito.objects.select_for_update().get(producto_id=producto.pk, deposito_id=deposito_id)
+        diferencia = valor - fila.stock
+        StockDeposito.objects.filter(pk=fila.pk).update(stock=valor)
+        valor = max(anterior + diferencia, 0)
+    return _guardar_ajuste(producto, anterior, valor, diferencia)
+
+
+def _fijar_fragmentado(producto, valor, deposito):
+    fragmentos = list(_fragmentos(producto.pk).select_for_update().order_by('deposito_id', 'indice'))
+    por_deposito = _suma_por_deposito(fragmentos)
+    anterior = sum(por_deposito.values())
+    if deposito is None:
+        diferencia = valor - anterior
+        nuevo = _aplicar_diferencia(por_deposito, diferencia)
+    else:
+        deposito_id = _id_deposito(deposito)
+        diferencia = valor - por_deposito.get(deposito_id, 0)
+        nuevo = {**por_deposito, deposito_id: valor}
+    _reescribir_fragmentos(producto, fragmentos, nuevo)
+    _guardar_depositos(producto.pk, nuevo)
+    cache.delete(_clave_cache(producto.pk))
+    return _guardar_ajuste(producto, anterior, sum(nuevo.values()), diferencia)
+
+
+def _guardar_ajuste(producto, anterior, valor, diferencia):
+    Producto.objects.filter(pk=producto.pk).update(stock=valor, **cambios.marcas())
+    producto.stock = valor
+    kpis.registrar_cambio_stock(producto, anterior)
+    metricas.registrar_stock('ajuste', diferencia)
+    return diferencia
+
+
+def transferir(producto, origen, destino, cantidad):
+    """
+    Pasa `cantidad` unidades del depósito `origen` al `destino`. El total del
+    producto no cambia. Lanza StockInsuficiente si el origen no alcanza.
+    """
+    origen, destino = _id_deposito(origen), _id_deposito(destino)
+    if origen == destino:
+        raise ValueError("El depósito de origen y el de destino son el mismo")
+    if producto.shards and _transferir_fragmentado(producto, origen, destino, cantidad):
+        metricas.registrar_stock('transferencia', cantidad)
+        return
+    StockDeposito.objects.bulk_create(
+        [StockDeposito(producto_id=producto.pk, deposito_id=destino)], ignore_conflicts=True
+    )
+    with transaction.atomic():
+        # Un solo UPDATE sobre las dos filas: el origen solo entra si le alcanza.
+        # Recorre el índice único en orden de depósito, así dos transferencias
+        # cruzadas se bloquean en el mismo orden y no se traban entre sí
+        movidas = StockDeposito.objects.filter(
+            Q(deposito_id=destino) | Q(deposito_id=origen, stock__gte=cantidad), producto_id=producto.pk,
+        ).update(stock=Case(
+            When(deposito_id=origen, then=F('stock') - cantidad), default=F('stock') + cantidad,
+        ))
+        if movidas != 2:
+            # Solo se sumó al destino: se deshace
+            raise StockInsuficiente(producto, cantidad)
+    metricas.registrar_stock('transferencia', cantidad)
+
+
+@transaction.atomic
+def _transferir_fragmentado(producto, origen, destino, cantidad):
+    """Como transferir() sobre los fragmentos. Devuelve False si el producto ya no está fragmentado."""
+    producto.shards = Producto.objects.select_for_update().values_list('shards', flat=True).get(pk=producto.pk)
+    if not producto.shards:
+        return False
+    fragmentos = list(
+        _fragmentos(producto.pk).filter(deposito_id__in=[origen, destino])
+        .select_for_update().order_by('deposito_id', 'indice')
+    )
+    por_deposito = _suma_por_deposito(fragmentos)
+    if por_deposito[origen] < cantidad:
+        raise StockInsuficiente(producto, cantidad)
+    por_deposito[origen] -= cantidad
+    por_deposito[destino] += cantidad
+    _reescribir_fragmentos(producto, fragmentos, por_deposito)
+    _guardar_depositos(producto.pk, por_deposito)
+    return True
+
+
+# -----------------------------------------------------------------------------
+# Lecturas
+# -----------------------------------------------------------------------------
+def stock_total(producto):
+    """
+    Stock actual del producto. En modo fragmentado suma los fragmentos y
+    guarda el resultado en caché unos segundos.
+    """
+    if not producto.shards:
+        return producto.stock
+
+    def calcular():
+        por_deposito = _suma_por_deposito(_fragmentos(producto.pk).only('deposito_id', 'stock'))
+        total = sum(por_deposito.values())
+        # Se refleja la suma en Producto.stock y en StockDeposito para que los
+        # listados y filtros (stock bajo, búsquedas) sigan funcionando. Como
+        # mucho una pasada por producto cada CACHE_TTL segundos.
+        Producto.objects.filter(pk=producto.pk).exclude(stock=total).update(stock=total, **cambios.marcas())
+        _guardar_depositos(producto.pk, por_deposito)
+        return total
+
+    total = cache.get(_clave_cache(producto.pk))
+    metricas.registrar_cache('stock_total', total is not None)
+    if total is None:
+        total = calcular()
+        cache.set(_clave_cache(producto.pk), total, CACHE_TTL)
+    producto.stock = total
+    return total
+
+
+def _stock_depositos(producto, deposito_id=None):
+    """{deposito_id: stock} del producto; en modo fragmentado, la suma de los fragmentos."""
+    if producto.shards:
+        fragmentos = _fragmentos(producto.pk, deposito_id)
+        return dict(fragmentos.order_by().values('deposito_id').annotate(total=Sum('stock')).values_list(
+            'deposito_id', 'total'
+        ))
+    filas = StockDeposito.objects.filter(producto_id=producto.pk)
+    if deposito_id is not None:
+        filas = filas.filter(deposito_id=deposito_id)
+    return dict(filas.values_list('deposito_id', 'stock'))
+
+
+def stock_en_deposito(producto, deposito):
+    deposito_id = _id_deposito(deposito)
+    return _stock_depositos(producto, deposito_id).get(deposito_id, 0)
+
+
+def stock_por_deposito(producto):
+    """[(deposito, stock)] del producto en los depósitos activos, con 0 donde no tiene stock."""
+    stock_filas = _stock_depositos(producto)
+    return [(deposito, stock_filas.get(deposito.pk, 0)) for deposito in Deposito.objects.filter(activo=True)]
+
+
+# -----------------------------------------------------------------------------
+# Activación / desactivación del modo fragmentado
+# -----------------------------------------------------------------------------
+@transaction.atomic
+def activar_fragmentos(producto, cantidad=None):
+    """Reparte el stock actual del producto en `cantidad` fragmentos."""
+    cantidad = cantidad or getattr(settings, 'STOCK_SHARDS_POR_DEFECTO', 8)
+    bloqueado = Producto.objects.select_for_update().get(pk=producto.pk)
+    if bloqueado.shards:
+        desactivar_fragmentos(bloqueado)
+
+    # Cada depósito con stock reparte el suyo; los demás reciben fragmentos
+    # con la primera entrada (ver _incrementar)
+    for fila in StockDeposito.objects.select_for_update().filter(producto_id=producto.pk, stock__gt=0):
+        _crear_fragmentos(producto.pk, fila.deposito_id, cantidad, fila.stock)
+    # Con marcas(): el índice de SKU se entera por el feed de que el stock pasa a los fragmentos
+    Producto.objects.filter(pk=producto.pk).update(shards=cantidad, **cambios.marcas())
+    producto.shards = cantidad
+    cache.delete(_clave_cache(producto.pk))
+
+
+@transaction.atomic
+def desactivar_fragmentos(producto):
+    """Vuelve a guardar el stock del producto en la columna y en las filas de depósito."""
+    Producto.objects.select_for_update().get(pk=producto.pk)
+    por_deposito = _suma_por_deposito(_fragmentos(producto.pk).select_for_update())
+    total = sum(por_deposito.values())
+    _guardar_depositos(producto.pk, por_deposito)
+    _fragmentos(producto.pk).delete()
+    Producto.objects.filter(pk=producto.pk).update(stock=total, shards=0, **cambios.marcas())
+    producto.stock = total
+    producto.shards = 0
+    cache.delete(_clave_cache(producto.pk))
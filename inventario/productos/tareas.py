@@ -0,0 +1,35 @@
+# Tareas en segundo plano de productos (ver tareas/cola.py)
+from django.conf import settings
+
+from tareas.cola import tarea
+
+from . import kpis, reservas, valuacion
+from .models import Producto
+
+
+@tarea(prioridad=10)
+def procesar_imagen(producto_id):
+    """Redimensiona la imagen de un producto recién subida."""
+    producto = Producto.todos.filter(pk=producto_id).first()
+    if producto is not None:
+        producto.procesar_imagen()
+
+
+@tarea(cada=getattr(settings, 'KPI_RECALCULO_HORAS', 24) * 3600)
+def recalcular_kpis(dias=30):
+    kpis.recalcular(dias)
+
+
+@tarea(prioridad=5, cada=getattr(settings, 'KPI_CONSOLIDAR_SEGUNDOS', 60))
+def consolidar_kpis():
+    return {'deltas': kpis.consolidar()}
+
+
+@tarea()
+def valuar_inventario():
+    return {'movimientos': valuacion.procesar()}
+
+
+@tarea(prioridad=5)
+def liberar_reservas():
+    return {'liberadas': reservas.liberar_vencidas()}
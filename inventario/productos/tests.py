@@ -1,3 +1,793 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Cliente
+from ventas.models import ItemVenta, Venta
+from . import (
+    bajas, cambios, carga, conciliacion, en_vivo, kpis, particiones, precios, reposicion, reservas, sku_index, stock,
+    valuacion,
+)
+from .admin import ProductoAdmin
+from .cargador import CargadorProductos
+from .models import (
+    CapaCosto, DeltaIndicador, Deposito, HistorialPrecio, Indicador, MovimientoStock, Producto, ProductoEliminado,
+    ReservaStock, ResumenMovimientoMensual, StockDeposito, StockShard, ValuacionProducto, VersionCatalogo,
+)
+
+
+class BaseStockTest(TestCase):
+    def setUp(self):
+        # El depósito principal y las sumas de fragmentos se guardan en caché
+        cache.clear()
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='1 kg', precio=Decimal('10.00'), stock=10)
+
+    def recargar(self):
+        self.producto = Producto.objects.get(pk=self.producto.pk)
+        return self.producto
+
+    def en_deposito(self, deposito_id=None):
+        return StockDeposito.objects.get(
+            producto=self.producto, deposito_id=deposito_id or Deposito.id_principal()
+        ).stock
+
+
+class DecrementoTests(BaseStockTest):
+    def test_descuenta_del_total_y_del_deposito(self):
+        stock.decrementar(self.producto, 4)
+        self.assertEqual(self.recargar().stock, 6)
+        self.assertEqual(self.en_deposito(), 6)
+
+    def test_no_deja_stock_negativo(self):
+        with self.assertRaises(stock.StockInsuficiente):
+            stock.decrementar(self.producto, 11)
+        self.assertEqual(self.recargar().stock, 10)
+        self.assertEqual(self.en_deposito(), 10)
+
+    def test_descuento_condicional_con_instancia_desactualizada(self):
+        # Otra venta se llevó el stock después de leer el producto
+        desactualizado = Producto.objects.get(pk=self.producto.pk)
+        stock.decrementar(self.producto, 8)
+        with self.assertRaises(stock.StockInsuficiente):
+            stock.decrementar(desactualizado, 5)
+        self.assertEqual(self.recargar().stock, 2)
+
+
+class FragmentosTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        stock.activar_fragmentos(self.producto, 4)
+
+    def fragmentos(self):
+        return list(StockShard.objects.filter(producto=self.producto).values_list('stock', flat=True))
+
+    def test_reparte_el_stock_en_los_fragmentos(self):
+        self.assertEqual(sorted(self.fragmentos()), [2, 2, 3, 3])
+        self.assertEqual(stock.stock_total(self.recargar()), 10)
+
+    def test_descuenta_de_varios_fragmentos_si_uno_no_alcanza(self):
+        stock.decrementar(self.producto, 7)
+        self.assertEqual(sum(self.fragmentos()), 3)
+        self.assertTrue(all(valor >= 0 for valor in self.fragmentos()))
+
+    def test_no_vende_mas_de_lo_que_suman_los_fragmentos(self):
+        with self.assertRaises(stock.StockInsuficiente):
+            stock.decrementar(self.producto, 11)
+        self.assertEqual(sorted(self.fragmentos()), [2, 2, 3, 3])
+
+    def test_entradas_y_lectura_en_cache(self):
+        stock.incrementar(self.producto, 5)
+        cache.clear()
+        self.assertEqual(stock.stock_total(self.recargar()), 15)
+        # La suma se refleja en la columna y en el depósito
+        self.assertEqual(self.recargar().stock, 15)
+        self.assertEqual(self.en_deposito(), 15)
+
+    def test_desactivar_vuelve_el_stock_a_la_columna(self):
+        stock.decrementar(self.producto, 3)
+        stock.desactivar_fragmentos(self.producto)
+        self.assertEqual(self.recargar().stock, 7)
+        self.assertEqual(self.producto.shards, 0)
+        self.assertFalse(StockShard.objects.filter(producto=self.producto).exists())
+        self.assertEqual(self.en_deposito(), 7)
+
+
+class AccionesAdminTests(TestCase):
+    def acciones(self, *permisos):
+        usuario = User.objects.create_user('staff', password='x', is_staff=True)
+        usuario.user_permissions.add(*Permission.objects.filter(codename__in=permisos))
+        request = RequestFactory().get('/admin/productos/producto/')
+        request.user = User.objects.get(pk=usuario.pk)
+        return ProductoAdmin(Producto, site).get_actions(request)
+
+    def test_solo_lectura_no_cambia_el_modo_de_stock(self):
+        acciones = self.acciones('view_producto')
+        self.assertNotIn('activar_stock_fragmentado', acciones)
+        self.assertNotIn('desactivar_stock_fragmentado', acciones)
+
+    def test_con_permiso_de_cambio(self):
+        acciones = self.acciones('view_producto', 'change_producto')
+        self.assertIn('activar_stock_fragmentado', acciones)
+        self.assertIn('desactivar_stock_fragmentado', acciones)
+
+
+class ListadoAdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.bajo = Producto.objects.create(nombre='Yerba', descripcion='1 kg', precio=Decimal('10.00'), stock=2)
+        self.alto = Producto.objects.create(nombre='Aceite', descripcion='1 l', precio=Decimal('20.00'), stock=50)
+        self.archivado = Producto.objects.create(
+            nombre='Azúcar', descripcion='1 kg', precio=Decimal('5.00'), stock=1, archivado=True,
+        )
+
+    def listar(self, **parametros):
+        respuesta = self.client.get(reverse('admin:productos_producto_changelist'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.context['cl']
+
+    def test_muestra_los_archivados_y_filtra_por_rango(self):
+        self.assertEqual([p.pk for p in self.listar().result_list], [self.archivado.pk, self.alto.pk, self.bajo.pk])
+        bajos = self.listar(rango_stock='bajo').result_list
+        self.assertEqual([p.pk for p in bajos], [self.archivado.pk, self.bajo.pk])
+        self.assertTrue(all(p.necesita_reposicion for p in bajos))
+
+    def test_la_columna_de_reposicion_no_ordena(self):
+        columna = self.listar().list_display.index('reposicion')
+        # Pedir orden por esa columna deja el orden por defecto
+        cl = self.listar(o=str(columna))
+        self.assertEqual([p.pk for p in cl.result_list], [self.archivado.pk, self.alto.pk, self.bajo.pk])
+
+    def test_listados_de_las_tablas_grandes(self):
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='1', email='ana@example.com')
+        venta = Venta.objects.create(codigo='V1', cliente=cliente)
+        ItemVenta.objects.create(venta=venta, producto=self.bajo, cantidad=1, precio_unitario=10)
+        MovimientoStock.objects.create(producto=self.bajo, tipo='salida', cantidad=1, usuario='test')
+        for modelo in ('productos_movimientostock', 'ventas_venta', 'ventas_itemventa', 'clientes_cliente'):
+            respuesta = self.client.get(reverse(f'admin:{modelo}_changelist'), {'q': 'V1'})
+            self.assertEqual(respuesta.status_code, 200, modelo)
+        respuesta = self.client.get(reverse('admin:ventas_venta_change', args=[venta.pk]))
+        self.assertContains(respuesta, 'Yerba')
+
+
+class ArchivoMovimientosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='1 kg', precio=Decimal('10.00'))
+        self.fecha = datetime.datetime(2020, 3, 15, tzinfo=datetime.timezone.utc)
+
+    def mover(self, tipo, cantidad, fecha=None):
+        MovimientoStock.objects.create(
+            producto=self.producto, tipo=tipo, cantidad=cantidad, fecha=fecha or self.fecha, usuario='test',
+        )
+
+    def leer(self, nombre):
+        with gzip.open(os.path.join(self.directorio, nombre), 'rt', encoding='utf-8') as archivo:
+            return [json.loads(linea) for linea in archivo]
+
+    def test_exporta_resume_y_quita_el_mes(self):
+        self.mover('entrada', 5)
+        self.mover('salida', 2)
+        self.mover('entrada', 1, fecha=self.fecha + datetime.timedelta(days=30))
+
+        self.assertEqual(particiones.archivar_mes(2020, 3, self.directorio), 2)
+        self.assertEqual(len(self.leer('movimientos_2020_03.jsonl.gz')), 2)
+        resumen = ResumenMovimientoMensual.objects.get(producto=self.producto)
+        self.assertEqual((resumen.entradas, resumen.salidas, resumen.cantidad_movimientos), (5, 2, 2))
+        # El mes siguiente queda en la tabla
+        self.assertEqual(MovimientoStock.objects.count(), 1)
+
+    def test_un_movimiento_posterior_va_a_otro_archivo_y_suma_al_resumen(self):
+        self.mover('entrada', 5)
+        particiones.archivar_mes(2020, 3, self.directorio)
+        self.mover('entrada', 3)
+
+        self.assertEqual(particiones.archivar_mes(2020, 3, self.directorio), 1)
+        self.assertEqual(len(self.leer('movimientos_2020_03.jsonl.gz')), 1)
+        self.assertEqual(len(self.leer('movimientos_2020_03_2.jsonl.gz')), 1)
+        resumen = ResumenMovimientoMensual.objects.get(producto=self.producto)
+        self.assertEqual((resumen.entradas, resumen.cantidad_movimientos), (8, 2))
+
+    def test_si_lo_exportado_no_coincide_no_cambia_nada(self):
+        self.mover('entrada', 5)
+        self.mover('salida', 2)
+        exportar = particiones._exportar
+
+        def exportar_incompleto(movimientos, ruta):
+            return exportar(movimientos, ruta) - 1
+
+        with mock.patch.object(particiones, '_exportar', exportar_incompleto):
+            with self.assertRaises(particiones.ArchivoIncompleto):
+                particiones.archivar_mes(2020, 3, self.directorio)
+        self.assertEqual(MovimientoStock.objects.count(), 2)
+        self.assertFalse(ResumenMovimientoMensual.objects.exists())
+        self.assertEqual(os.listdir(self.directorio), [])
+
+
+class IndicadoresTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        kpis.recalcular()
+
+    def test_los_cambios_de_stock_solo_agregan_deltas(self):
+        stock.decrementar(self.producto, 3)
+        self.assertEqual(Indicador.objects.get(clave=kpis.VALOR_INVENTARIO).valor, Decimal('100'))
+        self.assertTrue(DeltaIndicador.objects.exists())
+        self.assertEqual(kpis.calcular_resumen()['valor_inventario'], Decimal('70'))
+
+    def test_consolidar_suma_los_deltas_y_los_borra(self):
+        stock.decrementar(self.producto, 3)
+        stock.decrementar(self.producto, 3)
+        # Dos cambios de valor y la entrada en stock bajo
+        self.assertEqual(kpis.consolidar(tamanio_lote=1), 3)
+        self.assertFalse(DeltaIndicador.objects.exists())
+        resumen = kpis.calcular_resumen()
+        self.assertEqual(resumen['valor_inventario'], Decimal('40'))
+        self.assertEqual(resumen['stock_bajo'], 1)
+
+    def test_recalcular_reemplaza_los_deltas(self):
+        kpis.sumar(kpis.VALOR_INVENTARIO, Decimal('999'))
+        kpis.recalcular()
+        self.assertFalse(DeltaIndicador.objects.exists())
+        self.assertEqual(kpis.calcular_resumen()['valor_inventario'], Decimal('100'))
+
+
+class ReposicionTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        self.hoy = timezone.localdate()
+        self.cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='1', email='ana@example.com')
+
+    def vender(self, dias_atras, cantidad):
+        venta = Venta.objects.create(codigo=f"V{Venta.objects.count()}", cliente=self.cliente)
+        Venta.objects.filter(pk=venta.pk).update(fecha=self.hoy - datetime.timedelta(days=dias_atras))
+        ItemVenta.objects.create(venta=venta, producto=self.producto, cantidad=cantidad, precio_unitario=1)
+
+    def test_agrupa_la_demanda_por_producto_y_dia(self):
+        self.vender(2, 3)
+        self.vender(2, 4)
+        self.vender(0, 1)
+        MovimientoStock.objects.create(
+            producto=self.producto, tipo='salida', cantidad=5, usuario='test', origen='manual',
+            fecha=timezone.now() - datetime.timedelta(days=1),
+        )
+        # Las salidas de ventas ya están en ItemVenta
+        MovimientoStock.objects.create(producto=self.producto, tipo='salida', cantidad=8, usuario='t', origen='venta')
+
+        productos, dias, cantidades = reposicion.cargar_demanda(self.hoy - datetime.timedelta(days=9))
+        filas = sorted(zip(productos.tolist(), dias.tolist(), cantidades.tolist()))
+        pk = self.producto.pk
+        self.assertEqual(filas, [(pk, 7, 7.0), (pk, 8, 5.0), (pk, 9, 1.0)])
+
+    def test_sugerir_stock_minimo(self):
+        for dias_atras in range(28):
+            self.vender(dias_atras, 2)
+        sugeridos = reposicion.sugerir_stock_minimo(28, lead_time=7, nivel_servicio=0.95)
+        self.assertEqual(sugeridos, {self.producto.pk: 14})
+
+    def test_guardar_ajusta_el_indicador_de_stock_bajo(self):
+        kpis.recalcular()
+        self.assertEqual(reposicion.guardar_stock_minimo({self.producto.pk: 12}), 1)
+        self.assertEqual(self.recargar().stock_minimo, 12)
+        self.assertEqual(kpis.calcular_resumen()['stock_bajo'], 1)
+        reposicion.guardar_stock_minimo({self.producto.pk: 3})
+        self.assertEqual(kpis.calcular_resumen()['stock_bajo'], 0)
+
+
+class ConciliacionTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        kpis.recalcular()
+
+    def historial(self, neto):
+        MovimientoStock.objects.filter(producto=self.producto).delete()
+        MovimientoStock.objects.create(
+            producto=self.producto, tipo='entrada' if neto >= 0 else 'salida', cantidad=abs(neto), usuario='test',
+        )
+
+    def test_fuente_stock_registra_movimientos_compensatorios(self):
+        self.historial(7)
+        self.assertEqual(conciliacion.reparar_stock([self.producto.pk]), (1, []))
+        self.assertEqual(conciliacion.diferencias_stock(ids=[self.producto.pk]), [])
+        self.assertEqual(self.recargar().stock, 10)
+
+    def test_fuente_movimientos_corrige_stock_depositos_e_indicadores(self):
+        self.historial(7)
+        self.assertEqual(conciliacion.reparar_stock([self.producto.pk], fuente='movimientos'), (1, []))
+        self.assertEqual(self.recargar().stock, 7)
+        self.assertEqual(self.en_deposito(), 7)
+        self.assertEqual(kpis.calcular_resumen()['valor_inventario'], Decimal('70'))
+
+    def test_no_escribe_stock_negativo(self):
+        self.historial(-3)
+        corregidos, omitidos = conciliacion.reparar_stock([self.producto.pk], fuente='movimientos')
+        self.assertEqual(corregidos, 0)
+        self.assertEqual(omitidos, [(self.producto.pk, 10, -3, conciliacion.OMITIDO_NEGATIVO)])
+        self.assertEqual(self.recargar().stock, 10)
+
+    def test_no_aplica_una_baja_que_los_depositos_no_cubren(self):
+        self.historial(2)
+        StockDeposito.objects.filter(producto=self.producto).update(stock=5)
+        corregidos, omitidos = conciliacion.reparar_stock([self.producto.pk], fuente='movimientos')
+        self.assertEqual(corregidos, 0)
+        self.assertEqual(omitidos, [(self.producto.pk, 10, 2, conciliacion.OMITIDO_DEPOSITOS)])
+        self.assertEqual(self.recargar().stock, 10)
+        self.assertEqual(self.en_deposito(), 5)
+
+    def test_fragmentado_usa_la_suma_de_fragmentos(self):
+        stock.activar_fragmentos(self.producto, 4)
+        self.historial(6)
+        self.assertEqual(conciliacion.reparar_stock([self.producto.pk], fuente='movimientos'), (1, []))
+        cache.clear()
+        self.assertEqual(stock.stock_total(self.recargar()), 6)
+        self.assertEqual(kpis.calcular_resumen()['valor_inventario'], Decimal('60'))
+
+
+class PruebaCargaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        kpis.recalcular()
+
+    def test_limpiar_borra_el_escenario_y_recalcula_los_indicadores(self):
+        escenario = carga.preparar(2, 10)
+        self.assertTrue(User.objects.filter(pk=escenario.usuario.pk).exists())
+        carga.limpiar(escenario)
+        self.assertFalse(User.objects.filter(username__startswith=carga.USUARIO).exists())
+        self.assertFalse(Producto.todos.exists())
+        self.assertFalse(DeltaIndicador.objects.exists())
+        self.assertEqual(kpis.calcular_resumen()['valor_inventario'], 0)
+
+
+class IndiceSkuTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        Producto.objects.filter(pk=self.producto.pk).update(sku='779001')
+        self.indice = sku_index.IndiceSku()
+        self.indice.cargar()
+
+    def test_un_acierto_no_consulta_la_base(self):
+        with self.assertNumQueries(0):
+            encontrados = self.indice.buscar(['779001', 'no-existe'])
+        self.assertEqual(encontrados, {'779001': (self.producto.pk, 'Yerba', Decimal('10.00'), 10)})
+
+    def test_vencido_el_plazo_relee_los_cambios_de_stock(self):
+        stock.decrementar(self.recargar(), 4)
+        self.assertEqual(self.indice.buscar(['779001'])['779001'][3], 10)
+        with mock.patch.object(sku_index, 'TTL', 0):
+            self.assertEqual(self.indice.buscar(['779001'])['779001'][3], 6)
+
+    def test_una_baja_recarga_el_indice(self):
+        self.recargar().delete()
+        with mock.patch.object(sku_index, 'TTL', 0):
+            self.assertEqual(self.indice.buscar(['779001']), {})
+
+    def test_fragmentado_toma_la_suma_de_fragmentos(self):
+        stock.activar_fragmentos(self.recargar(), 4)
+        stock.decrementar(self.recargar(), 3)
+        with mock.patch.object(sku_index, 'TTL', 0):
+            self.assertEqual(self.indice.buscar(['779001'])['779001'][3], 7)
+
+    def test_vista_acepta_varios_sku(self):
+        usuario = User.objects.create_user('cajero', password='x')
+        usuario.user_permissions.add(Permission.objects.get(codename='view_producto'))
+        self.client.force_login(usuario)
+        with mock.patch.object(sku_index, 'indice', self.indice):
+            respuesta = self.client.get(reverse('productos:buscar_sku'), {'sku': '779001,otro'})
+        datos = respuesta.json()
+        self.assertEqual(datos['productos']['779001']['stock'], 10)
+        self.assertEqual(datos['no_encontrados'], ['otro'])
+
+
+class AjustePreciosTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        self.otro = Producto.objects.create(nombre='Azúcar', descripcion='1 kg', precio=Decimal('3.00'), stock=0)
+        kpis.recalcular()
+
+    def test_porcentaje_redondeado_con_historial(self):
+        cambiados = precios.aplicar(Producto.objects.all(), 'porcentaje', '12', paso=Decimal('0.05'), motivo='Lista')
+        self.assertEqual(cambiados, 2)
+        self.assertEqual(self.recargar().precio, Decimal('11.20'))
+        self.assertEqual(Producto.objects.get(pk=self.otro.pk).precio, Decimal('3.35'))
+        historial = HistorialPrecio.objects.get(producto=self.producto)
+        self.assertEqual((historial.precio_anterior, historial.precio_nuevo), (Decimal('10.00'), Decimal('11.20')))
+        self.assertEqual(kpis.calcular_resumen()['valor_inventario'], Decimal('112'))
+
+    def test_monto_fijo_hacia_arriba(self):
+        precios.aplicar(Producto.objects.filter(pk=self.producto.pk), 'fijo', '0.31', paso=1, direccion='arriba')
+        self.assertEqual(self.recargar().precio, Decimal('11.00'))
+
+    def test_no_aplica_si_algun_precio_queda_en_cero(self):
+        with self.assertRaises(precios.PrecioNoPositivo) as contexto:
+            precios.aplicar(Producto.objects.all(), 'fijo', '-5')
+        self.assertEqual(contexto.exception.cantidad, 1)
+        self.assertEqual(self.recargar().precio, Decimal('10.00'))
+        self.assertFalse(HistorialPrecio.objects.exists())
+
+
+class HistorialStockTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        self.hoy = timezone.localdate()
+        for dias_atras, tipo, cantidad in ((3, 'entrada', 5), (2, 'salida', 2), (0, 'salida', 1)):
+            fecha = timezone.make_aware(
+                datetime.datetime.combine(self.hoy - datetime.timedelta(days=dias_atras), datetime.time(12))
+            )
+            MovimientoStock.objects.create(
+                producto=self.producto, tipo=tipo, cantidad=cantidad, fecha=fecha, usuario='test',
+            )
+        usuario = User.objects.create_user('consulta', password='x')
+        usuario.user_permissions.add(Permission.objects.get(codename='view_producto'))
+        self.client.force_login(usuario)
+
+    def pedir(self, **parametros):
+        return self.client.get(reverse('productos:historial_stock', args=[self.producto.pk]), parametros)
+
+    def test_nivel_de_stock_por_dia_desde_el_actual(self):
+        respuesta = self.pedir(desde=(self.hoy - datetime.timedelta(days=6)).isoformat(), periodo='dia')
+        datos = respuesta.json()
+        self.assertEqual(datos['periodo'], 'dia')
+        self.assertEqual(
+            [(p['entradas'], p['salidas'], p['stock']) for p in datos['puntos']],
+            [(5, 0, 13), (0, 2, 11), (0, 1, 10)],
+        )
+
+    def test_junta_periodos_hasta_la_cantidad_de_puntos(self):
+        puntos = self.pedir(desde=(self.hoy - datetime.timedelta(days=6)).isoformat(), periodo='dia', puntos=2)
+        self.assertEqual(
+            [(p['entradas'], p['salidas'], p['stock']) for p in puntos.json()['puntos']],
+            [(5, 2, 11), (0, 1, 10)],
+        )
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.pedir(periodo='anio').status_code, 400)
+        self.assertEqual(self.pedir(desde='ayer').status_code, 400)
+        self.assertEqual(self.pedir(puntos=0).status_code, 400)
+
+
+class FeedCambiosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='', precio=Decimal('1.00'), sku=f'S{i}')
+            for i in range(3)
+        ]
+
+    def ids(self, filas, campo='id'):
+        return [fila[campo] for fila in filas]
+
+    def test_pagina_con_el_cursor(self):
+        productos, eliminados, cursor, hay_mas = cambios.leer(limite=2)
+        self.assertEqual(self.ids(productos), [p.pk for p in self.productos[:2]])
+        self.assertTrue(hay_mas)
+
+        productos, eliminados, cursor, hay_mas = cambios.leer(cursor, limite=2)
+        self.assertEqual(self.ids(productos), [self.productos[2].pk])
+        self.assertFalse(hay_mas)
+        self.assertEqual(cambios.leer(cursor)[:2], ([], []))
+
+    def test_modificaciones_y_bajas_despues_del_cursor(self):
+        cursor = cambios.leer()[2]
+        stock.incrementar(self.productos[0], 5)
+        borrado = self.productos[1].pk
+        self.productos[1].delete()
+
+        productos, eliminados, nuevo, _ = cambios.leer(cursor)
+        self.assertEqual(self.ids(productos), [self.productos[0].pk])
+        self.assertEqual(productos[0]['stock'], 5)
+        self.assertEqual(self.ids(eliminados, 'producto_id'), [borrado])
+        self.assertGreater(nuevo, cursor)
+
+    def test_no_corta_una_pagina_entre_filas_con_el_mismo_numero(self):
+        cursor = cambios.leer()[2]
+        secuencia, transaccion = cambios.numeracion()
+        Producto.objects.update(precio=Decimal('2.00'), secuencia=secuencia, transaccion=transaccion)
+
+        productos, _, cursor, _ = cambios.leer(cursor, limite=2)
+        self.assertEqual(len(productos), 3)
+        self.assertEqual(cambios.leer(cursor, limite=2)[0], [])
+
+    def test_cursor_en_texto(self):
+        self.assertEqual(cambios.leer_cursor('12.345'), (12, 345))
+        self.assertEqual(cambios.leer_cursor('345'), (0, 345))
+        self.assertEqual(cambios.escribir_cursor((12, 345)), '12.345')
+        with self.assertRaises(ValueError):
+            cambios.leer_cursor('-1')
+
+
+class CargadorTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        self.otro = Producto.objects.create(nombre='Azúcar', descripcion='1 kg', precio=Decimal('3.00'))
+
+    def test_cada_producto_se_lee_una_vez(self):
+        cargador = CargadorProductos()
+        with self.assertNumQueries(1):
+            productos = cargador.cargar([self.producto.pk, self.otro.pk, 999])
+            self.assertIs(cargador.obtener(self.producto.pk), productos[self.producto.pk])
+            self.assertIsNone(cargador.obtener(999))
+        self.assertEqual(set(productos), {self.producto.pk, self.otro.pk})
+
+    def test_asignar_completa_las_fk_con_una_consulta(self):
+        movimientos = [
+            MovimientoStock.objects.create(producto=producto, tipo='entrada', cantidad=1, usuario='test')
+            for producto in (self.producto, self.otro, self.producto)
+        ]
+        movimientos = list(MovimientoStock.objects.filter(pk__in=[m.pk for m in movimientos]).order_by('pk'))
+        cargador = CargadorProductos()
+        with self.assertNumQueries(1):
+            cargador.asignar(movimientos)
+            self.assertIs(movimientos[0].producto, movimientos[2].producto)
+
+    def test_archivado_no_se_obtiene(self):
+        Producto.todos.filter(pk=self.otro.pk).update(archivado=True)
+        cargador = CargadorProductos()
+        self.assertIn(self.otro.pk, cargador.cargar([self.otro.pk]))
+        with self.assertRaises(Http404):
+            cargador.obtener_o_404(self.otro.pk)
+        with self.assertRaises(Http404):
+            cargador.obtener_o_404('abc')
+
+    def lecturas_del_producto(self, consultas):
+        tabla = Producto._meta.db_table
+        return [
+            c['sql'] for c in consultas
+            if f'FROM "{tabla}"' in c['sql'] and 'UPDATE' not in c['sql'] and 'FOR UPDATE' not in c['sql']
+        ]
+
+    def test_el_movimiento_lee_el_producto_una_vez(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        ruta = reverse('productos:movimiento_create', args=[self.producto.pk])
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(ruta).status_code, 200)
+        self.assertEqual(len(self.lecturas_del_producto(consultas.captured_queries)), 1)
+
+        datos = {'tipo': 'entrada', 'cantidad': 3, 'deposito': Deposito.id_principal(), 'motivo': 'Compra'}
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.post(ruta, datos).status_code, 302)
+        self.assertEqual(len(self.lecturas_del_producto(consultas.captured_queries)), 1)
+        self.assertEqual(self.recargar().stock, 13)
+
+
+class StockEnVivoTests(BaseStockTest):
+    def test_informa_solo_los_cambios_de_stock(self):
+        difusor = en_vivo.Difusor()
+        self.assertEqual(difusor._leer(), [])
+        stock.decrementar(self.producto, 6)
+        self.assertEqual(difusor._leer(), [{'id': self.producto.pk, 'stock': 4, 'bajo': True}])
+        # Sigue dentro del margen de relectura, pero no cambió
+        self.assertEqual(difusor._leer(), [])
+
+    def test_un_error_de_lectura_se_registra_y_no_corta_el_bucle(self):
+        difusor = en_vivo.Difusor(intervalo=0)
+        difusor._suscripciones.add(object())
+
+        def fallar():
+            difusor._suscripciones.clear()
+            raise RuntimeError("base caída")
+
+        with mock.patch.object(difusor, '_leer', side_effect=fallar):
+            with self.assertLogs('productos.en_vivo', 'ERROR') as registro:
+                asyncio.run(difusor._bucle())
+        self.assertIn("base caída", registro.output[0])
+        self.assertIsNone(difusor._tarea)
+
+
+class EdicionProductoTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.ruta = reverse('productos:producto_update', args=[self.producto.pk])
+
+    def editar(self, version, **cambios_form):
+        datos = {
+            'nombre': 'Yerba', 'sku': '', 'descripcion': '1 kg', 'precio': '10.00', 'stock_minimo': 5,
+            'version': version, **cambios_form,
+        }
+        return self.client.post(self.ruta, datos)
+
+    def test_guarda_con_la_version_leida_y_no_toca_el_stock(self):
+        version = self.producto.version
+        stock.decrementar(self.producto, 4)
+        respuesta = self.editar(version, precio='12.00', stock=99)
+        self.assertEqual(respuesta.status_code, 302)
+        producto = self.recargar()
+        self.assertEqual((producto.precio, producto.stock, producto.version), (Decimal('12.00'), 6, version + 1))
+
+    def test_una_version_vieja_responde_conflicto_con_las_diferencias(self):
+        version = self.producto.version
+        self.assertEqual(self.editar(version, nombre='Yerba mate').status_code, 302)
+
+        respuesta = self.editar(version, precio='15.00')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertIn(('Precio', Decimal('15.00'), Decimal('10.00')), respuesta.context['diferencias'])
+        self.assertEqual(respuesta.context['form']['version'].value(), version + 1)
+        producto = self.recargar()
+        self.assertEqual((producto.nombre, producto.precio), ('Yerba mate', Decimal('10.00')))
+
+
+class BajasTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        MovimientoStock.objects.create(producto=self.producto, tipo='entrada', cantidad=10, usuario='test')
+        kpis.recalcular()
+
+    def test_archivar_descuenta_el_stock_actual_del_inventario(self):
+        desactualizado = Producto.objects.get(pk=self.producto.pk)
+        stock.decrementar(self.producto, 6)
+        generacion = VersionCatalogo.objects.get(pk=1).generacion
+
+        self.assertTrue(bajas.archivar(desactualizado))
+        self.assertEqual(kpis.calcular_resumen()['valor_inventario'], 0)
+        self.assertFalse(Producto.objects.filter(pk=self.producto.pk).exists())
+        self.assertTrue(ProductoEliminado.objects.filter(producto_id=self.producto.pk).exists())
+        self.assertEqual(VersionCatalogo.objects.get(pk=1).generacion, generacion + 1)
+        self.assertFalse(bajas.archivar(desactualizado))
+
+    def test_purga_un_producto_sin_ventas(self):
+        bajas.archivar(self.producto)
+        self.assertTrue(bajas.purgar_producto(self.producto, tamanio_lote=1))
+        self.assertFalse(Producto.todos.filter(pk=self.producto.pk).exists())
+        self.assertFalse(MovimientoStock.objects.exists())
+
+    def test_con_ventas_resume_los_movimientos_y_queda_archivado(self):
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='1', email='ana@example.com')
+        venta = Venta.objects.create(codigo='V1', cliente=cliente)
+        ItemVenta.objects.create(venta=venta, producto=self.producto, cantidad=2, precio_unitario=10)
+        MovimientoStock.objects.create(producto=self.producto, tipo='salida', cantidad=2, usuario='test')
+        bajas.archivar(self.producto)
+
+        self.assertFalse(bajas.purgar_producto(self.producto, tamanio_lote=1))
+        self.assertTrue(Producto.todos.filter(pk=self.producto.pk).exists())
+        self.assertFalse(MovimientoStock.objects.exists())
+        resumen = ResumenMovimientoMensual.objects.get(producto=self.producto)
+        self.assertEqual((resumen.entradas, resumen.salidas, resumen.cantidad_movimientos), (10, 2, 2))
+
+
+class ValuacionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.producto = Producto.objects.create(nombre='Aceite', descripcion='1 l', precio=Decimal('20.00'))
+
+    def mover(self, tipo, cantidad, costo=None, origen='manual'):
+        MovimientoStock.objects.create(
+            producto=self.producto, tipo=tipo, cantidad=cantidad, costo_unitario=costo, usuario='test', origen=origen,
+        )
+
+    def test_las_salidas_consumen_las_capas_mas_viejas(self):
+        self.mover('entrada', 10, Decimal('5'))
+        self.mover('entrada', 10, Decimal('7'))
+        self.mover('salida', 12, origen='venta')
+        self.assertEqual(valuacion.procesar(tamanio_lote=2), 3)
+
+        v = ValuacionProducto.objects.get(producto=self.producto)
+        self.assertEqual((v.cantidad, v.valor), (8, Decimal('56')))
+        self.assertEqual(list(CapaCosto.objects.values_list('cantidad', 'costo_unitario')), [(8, Decimal('7'))])
+        mes = timezone.localtime().date()
+        self.assertEqual(valuacion.cierre(mes.year, mes.month)['costo_vendido'], Decimal('64'))
+
+    def test_procesar_solo_toma_movimientos_nuevos(self):
+        self.mover('entrada', 4, Decimal('5'))
+        valuacion.procesar()
+        self.assertEqual(valuacion.procesar(), 0)
+        self.mover('salida', 1)
+        self.assertEqual(valuacion.procesar(), 1)
+        self.assertEqual(valuacion.valor_inventario(), Decimal('15'))
+
+    def test_saldo_inicial_sin_costo_no_cambia_nada(self):
+        Producto.objects.filter(pk=self.producto.pk).update(stock=10)
+        with self.assertRaises(valuacion.CostoFaltante) as error:
+            valuacion.saldo_inicial({})
+        self.assertEqual(error.exception.producto_ids, [self.producto.pk])
+        self.assertFalse(ValuacionProducto.objects.exists())
+
+    def test_saldo_inicial_abre_una_capa_con_el_stock_actual(self):
+        Producto.objects.filter(pk=self.producto.pk).update(stock=10)
+        self.assertEqual(valuacion.saldo_inicial({self.producto.pk: Decimal('3')}), 1)
+        self.assertEqual(valuacion.valor_inventario(), Decimal('30'))
+        self.mover('salida', 4, origen='venta')
+        valuacion.procesar()
+        self.assertEqual(valuacion.valor_inventario(), Decimal('18'))
+
+    def test_los_ajustes_no_cambian_la_valuacion(self):
+        Producto.objects.filter(pk=self.producto.pk).update(stock=10)
+        # Pendiente al abrir la valuación: no se descuenta del saldo
+        self.mover('ajuste', -3)
+        self.assertEqual(valuacion.saldo_inicial({self.producto.pk: Decimal('3')}), 1)
+        self.assertEqual(valuacion.valor_inventario(), Decimal('30'))
+        self.mover('ajuste', 5)
+        valuacion.procesar()
+        v = ValuacionProducto.objects.get(producto=self.producto)
+        self.assertEqual((v.cantidad, v.valor), (10, Decimal('30')))
+
+
+class ReservasTests(BaseStockTest):
+    def test_una_reserva_retiene_el_stock(self):
+        self.assertEqual(reservas.reservar('a' * 32, self.producto.pk, 7), 3)
+        with self.assertRaises(stock.StockInsuficiente):
+            reservas.reservar('b' * 32, self.producto.pk, 4)
+        self.assertEqual(self.recargar().reservado, 7)
+
+    def test_la_venta_respeta_las_reservas_de_otros_carritos(self):
+        reservas.reservar('a' * 32, self.producto.pk, 7)
+        with self.assertRaises(stock.StockInsuficiente):
+            stock.decrementar(self.producto, 4, respetar_reservas=True)
+        stock.decrementar(self.producto, 3, respetar_reservas=True)
+        self.assertEqual(self.recargar().stock, 7)
+
+    def test_confirmar_la_venta_convierte_la_reserva_en_descuento(self):
+        reservas.reservar('a' * 32, self.producto.pk, 7)
+        self.assertEqual(reservas.liberar_carrito('a' * 32), {self.producto.pk: 7})
+        stock.decrementar(self.producto, 7, respetar_reservas=True)
+        self.assertEqual(self.recargar().stock, 3)
+        self.assertEqual(self.producto.reservado, 0)
+
+    def test_una_reserva_vencida_no_retiene_stock(self):
+        reservas.reservar('a' * 32, self.producto.pk, 7)
+        ReservaStock.objects.update(vence=timezone.now() - datetime.timedelta(minutes=1))
+        stock.decrementar(self.producto, 10, respetar_reservas=True)
+        self.assertEqual(self.recargar().stock, 0)
+        self.assertEqual(self.producto.reservado, 0)
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_liberar_vencidas(self):
+        reservas.reservar('a' * 32, self.producto.pk, 2)
+        reservas.reservar('b' * 32, self.producto.pk, 3)
+        ReservaStock.objects.filter(carrito='a' * 32).update(vence=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertEqual(reservas.liberar_vencidas(), 1)
+        self.assertEqual(self.recargar().reservado, 3)
+
+
+class DepositosTests(BaseStockTest):
+    def setUp(self):
+        super().setUp()
+        self.sucursal = Deposito.objects.create(nombre='Sucursal', codigo='SUC')
+
+    def test_fijar_en_un_deposito_cambia_el_total(self):
+        stock.fijar(self.producto, 4, deposito=self.sucursal)
+        self.assertEqual(self.recargar().stock, 14)
+        self.assertEqual(stock.stock_en_deposito(self.producto, self.sucursal), 4)
+
+    def test_transferir_no_cambia_el_total(self):
+        stock.transferir(self.producto, None, self.sucursal, 6)
+        self.assertEqual(self.en_deposito(), 4)
+        self.assertEqual(self.en_deposito(self.sucursal.pk), 6)
+        self.assertEqual(self.recargar().stock, 10)
+
+    def test_transferir_sin_stock_en_el_origen_no_cambia_nada(self):
+        with self.assertRaises(stock.StockInsuficiente):
+            stock.transferir(self.producto, None, self.sucursal, 11)
+        self.assertEqual(self.en_deposito(), 10)
+        self.assertEqual(self.en_deposito(self.sucursal.pk), 0)
+
+    def test_salida_de_un_deposito_sin_stock_no_toca_el_total(self):
+        with self.assertRaises(stock.StockInsuficiente):
+            stock.decrementar(self.producto, 1, deposito=self.sucursal)
+        self.assertEqual(self.recargar().stock, 10)
+
+    def test_fragmentado_por_deposito(self):
+        stock.transferir(self.producto, None, self.sucursal, 6)
+        stock.activar_fragmentos(self.producto, 2)
+        stock.decrementar(self.producto, 5, deposito=self.sucursal)
+        with self.assertRaises(stock.StockInsuficiente):
+            stock.decrementar(self.producto, 2, deposito=self.sucursal)
+        self.assertEqual(stock.stock_en_deposito(self.producto, self.sucursal), 1)
+        self.assertEqual(stock.stock_en_deposito(self.producto, None), 4)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import en_vivo, views
 
 app_name = 'productos'
 
@@ -11,5 +11,11 @@ urlpatterns = [
     path('<int:pk>/eliminar/', views.ProductoDeleteView.as_view(), name='producto_delete'),
     path('<int:pk>/movimiento/', views.MovimientoStockCreateView.as_view(), name='movimiento_create'),
     path('<int:pk>/ajustar-stock/', views.AjusteStockView.as_view(), name='ajustar_stock'),
+    path('<int:pk>/transferir/', views.TransferenciaStockView.as_view(), name='transferir_stock'),
+    path('<int:pk>/historial-stock/', views.HistorialStockView.as_view(), name='historial_stock'),
     path('stock-bajo/', views.StockBajoListView.as_view(), name='stock_bajo_list'),
+    path('panel/', views.PanelView.as_view(), name='panel'),
+    path('sku/', views.BusquedaSkuView.as_view(), name='buscar_sku'),
+    path('cambios/', views.CambiosView.as_view(), name='cambios'),
+    path('en-vivo/stock/', en_vivo.stream_stock, name='stock_en_vivo'),
 ]
\ No newline at end of file
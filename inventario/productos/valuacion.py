@@ -0,0 +1,354 @@
+# -----------------------------------------------------------------------------
+# productos/valuacion.py
+# Valuación de inventario a costo FIFO, procesada de forma incremental.
+# -----------------------------------------------------------------------------
+"""
+Cada entrada abre una capa (CapaCosto) con sus unidades y su costo unitario;
+cada salida consume las capas más viejas del producto. Las capas agotadas se
+borran, así el estado de un producto es su ValuacionProducto más las pocas
+capas que siguen abiertas.
+
+`procesar()` (comando valuar_inventario, por cron) avanza desde el último
+movimiento procesado, guardado en EstadoValuacion, y solo lee los
+movimientos nuevos. Igual que el feed de cambios (ver cambios.py), recorre
+los movimientos en orden de (transacción, id) y no toma los de transacciones
+que pueden seguir en curso: uno que confirma tarde siempre queda por delante
+de lo ya procesado. Dentro de cada lote se aplican en orden de id.
+
+`saldo_inicial()` (comando valuacion_inicial) abre la valuación sobre un
+inventario que ya tiene stock: cada producto arranca con una capa por su
+stock actual al costo indicado, y el procesamiento sigue desde ahí. Sin ese
+paso, el stock anterior al primer movimiento procesado (o el de los meses
+ya archivados) se valuaría a costo 0.
+
+ValuacionMensual acumula el costo de lo vendido del mes y deja las
+existencias valuadas al cierre: la valuación de fin de mes es una lectura
+(`cierre()`), no una reconstrucción del historial.
+
+- Una entrada sin costo usa el último costo conocido del producto.
+- Los movimientos de tipo "ajuste" son informativos y no cambian el stock
+  (ver conciliacion.py): se saltean.
+- Una salida sin capas suficientes (stock negativo) se valúa al último costo
+  y queda anotada en `sin_capa`; las entradas siguientes la cubren primero.
+- Las transferencias entre depósitos no cambian las existencias: se saltean.
+"""
+import datetime
+from decimal import Decimal
+from operator import itemgetter
+
+from django.db import connection, transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from . import cambios, conciliacion
+from .models import (
+    CapaCosto, EstadoValuacion, MovimientoStock, Producto, ValuacionMensual, ValuacionProducto,
+)
+
+TAMANIO_LOTE = 2000
+CAMPOS_MOVIMIENTO = ('id', 'producto_id', 'tipo', 'cantidad', 'costo_unitario', 'fecha', 'origen', 'transaccion')
+CAMPOS_VALUACION = ('cantidad', 'valor', 'ultimo_costo', 'sin_capa')
+CAMPOS_MENSUAL = ('unidades_vendidas', 'costo_vendido', 'costo_otras_salidas', 'cantidad_cierre', 'valor_cierre')
+
+
+def _mes(fecha):
+    return timezone.localtime(fecha).date().replace(day=1)
+
+
+class _Estado:
+    """Estado en memoria de un producto mientras se procesa un lote."""
+
+    def __init__(self, valuacion, capas):
+        self.valuacion = valuacion
+        self.capas = capas  # abiertas, de la más vieja a la más nueva
+        self.borradas = []
+        self.modificadas = set()  # pks de capas guardadas con cantidad nueva
+        self.meses = {}
+
+    def mensual(self, mes):
+        fila = self.meses.get(mes)
+        if fila is None:
+            fila = self.meses[mes] = dict.fromkeys(CAMPOS_MENSUAL, 0)
+        return fila
+
+    def entrada(self, movimiento, cantidad, costo):
+        v = self.valuacion
+        costo = v.ultimo_costo if costo is None else costo
+        v.ultimo_costo = costo
+        cubiertas = min(cantidad, v.sin_capa)
+        v.sin_capa -= cubiertas
+        cantidad_capa = cantidad - cubiertas
+        v.cantidad += cantidad
+        # Las unidades que cubren faltantes ya se valuaron al salir
+        v.valor += cantidad_capa * costo
+        if cantidad_capa:
+            self.capas.append(CapaCosto(
+                producto_id=v.producto_id, movimiento_id=movimiento['id'], fecha=movimiento['fecha'],
+                costo_unitario=costo, cantidad=cantidad_capa,
+            ))
+
+    def salida(self, cantidad):
+        """Consume capas FIFO y devuelve el costo de las unidades."""
+        v = self.valuacion
+        costo = Decimal(0)
+        pendiente = cantidad
+        while pendiente and self.capas:
+            capa = self.capas[0]
+            tomadas = min(pendiente, capa.cantidad)
+            costo += tomadas * capa.costo_unitario
+            capa.cantidad -= tomadas
+            pendiente -= tomadas
+            if not capa.cantidad:
+                self.capas.pop(0)
+                if capa.pk:
+                    self.borradas.append(capa.pk)
+                    self.modificadas.discard(capa.pk)
+            elif capa.pk:
+                self.modificadas.add(capa.pk)
+        if pendiente:
+            v.sin_capa += pendiente
+            costo += pendiente * v.ultimo_costo
+        v.cantidad -= cantidad
+        # Con faltantes no queda ninguna capa abierta
+        v.valor = Decimal(0) if v.sin_capa else v.valor - costo
+        return costo
+
+    def aplicar(self, movimiento):
+        if movimiento['origen'] == 'transferencia' or movimiento['tipo'] == 'ajuste':
+            return
+        cantidad = movimiento['cantidad']
+        tipo = movimiento['tipo']
+        if not cantidad:
+            return
+        if tipo == 'entrada':
+            self.entrada(movimiento, cantidad, movimiento['costo_unitario'])
+        else:
+            costo = self.salida(cantidad)
+            fila = self.mensual(_mes(movimiento['fecha']))
+            if movimiento['origen'] == 'venta':
+                fila['unidades_vendidas'] += cantidad
+                fila['costo_vendido'] += costo
+            else:
+                fila['costo_otras_salidas'] += costo
+        fila = self.mensual(_mes(movimiento['fecha']))
+        fila['cantidad_cierre'] = self.valuacion.cantidad
+        fila['valor_cierre'] = self.valuacion.valor
+
+
+def _confirmados():
+    """Movimientos de transacciones que ya terminaron, en orden de (transacción, id)."""
+    movimientos = MovimientoStock.objects.order_by('transaccion', 'id')
+    tope = cambios.tope_confirmado()
+    return movimientos if tope is None else movimientos.filter(transaccion__lt=tope)
+
+
+def _posteriores(transaccion, movimiento_id):
+    return Q(transaccion__gt=transaccion) | Q(transaccion=transaccion, id__gt=movimiento_id)
+
+
+def _siguientes(estado_global, tamanio_lote):
+    """Movimientos confirmados posteriores al último procesado."""
+    return list(
+        _confirmados().filter(_posteriores(estado_global.ultima_transaccion, estado_global.ultimo_movimiento))
+        .values(*CAMPOS_MOVIMIENTO)[:tamanio_lote]
+    )
+
+
+def _efecto(movimiento):
+    """Cambio en las existencias que produce el movimiento."""
+    if movimiento['origen'] == 'transferencia' or movimiento['tipo'] == 'ajuste':
+        return 0
+    return -movimiento['cantidad'] if movimiento['tipo'] == 'salida' else movimiento['cantidad']
+
+
+def _guardar_mensual(estados):
+    claves = {(producto_id, mes) for producto_id, e in estados.items() for mes in e.meses}
+    if not claves:
+        return
+    existentes = {
+        (f.producto_id, f.mes): f for f in ValuacionMensual.objects.filter(
+            producto_id__in={p for p, _ in claves}, mes__in={m for _, m in claves}
+        )
+    }
+    nuevas, actualizadas = [], []
+    for producto_id, estado in estados.items():
+        for mes, valores in estado.meses.items():
+            fila = existentes.get((producto_id, mes))
+            if fila is None:
+                nuevas.append(ValuacionMensual(producto_id=producto_id, mes=mes, **valores))
+                continue
+            fila.unidades_vendidas += valores['unidades_vendidas']
+            fila.costo_vendido += valores['costo_vendido']
+            fila.costo_otras_salidas += valores['costo_otras_salidas']
+            fila.cantidad_cierre = valores['cantidad_cierre']
+            fila.valor_cierre = valores['valor_cierre']
+            actualizadas.append(fila)
+    ValuacionMensual.objects.bulk_create(nuevas)
+    ValuacionMensual.objects.bulk_update(actualizadas, list(CAMPOS_MENSUAL))
+
+
+def _procesar_lote(estado_global, tamanio_lote):
+    movimientos = _siguientes(estado_global, tamanio_lote)
+    if not movimientos:
+        return 0
+
+    # Los movimientos de productos ya purgados se saltean
+    ids = set(Producto.todos.filter(pk__in={m['producto_id'] for m in movimientos}).values_list('pk', flat=True))
+    valuaciones = {v.producto_id: v for v in ValuacionProducto.objects.filter(producto_id__in=ids)}
+    capas = {}
+    for capa in CapaCosto.objects.filter(producto_id__in=ids).order_by('producto_id', 'movimiento_id'):
+        capas.setdefault(capa.producto_id, []).append(capa)
+    existentes = list(valuaciones.values())
+    nuevas_valuaciones = [ValuacionProducto(producto_id=pk) for pk in ids if pk not in valuaciones]
+    for valuacion in nuevas_valuaciones:
+        valuaciones[valuacion.producto_id] = valuacion
+    estados = {pk: _Estado(valuaciones[pk], capas.get(pk, [])) for pk in ids}
+
+    for movimiento in sorted(movimientos, key=itemgetter('id')):
+        estado = estados.get(movimiento['producto_id'])
+        if estado is not None:
+            estado.aplicar(movimiento)
+
+    borradas, modificadas, creadas = [], [], []
+    for estado in estados.values():
+        borradas.extend(estado.borradas)
+        modificadas.extend(c for c in estado.capas if c.pk in estado.modificadas)
+        creadas.extend(c for c in estado.capas if not c.pk)
+    CapaCosto.objects.filter(pk__in=borradas).delete()
+    CapaCosto.objects.bulk_update(modificadas, ['cantidad'])
+    CapaCosto.objects.bulk_create(creadas)
+
+    ValuacionProducto.objects.bulk_create(nuevas_valuaciones)
+    ValuacionProducto.objects.bulk_update(existentes, list(CAMPOS_VALUACION))
+    _guardar_mensual(estados)
+
+    estado_global.ultima_transaccion = movimientos[-1]['transaccion']
+    estado_global.ultimo_movimiento = movimientos[-1]['id']
+    estado_global.fecha = timezone.now()
+    estado_global.save(update_fields=['ultima_transaccion', 'ultimo_movimiento', 'fecha'])
+    return len(movimientos)
+
+
+def procesar(tamanio_lote=TAMANIO_LOTE):
+    """Valúa los movimientos nuevos, un lote por transacción. Devuelve la cantidad procesada."""
+    procesados = 0
+    while True:
+        with transaction.atomic():
+            EstadoValuacion.objects.get_or_create(pk=1)
+            # Bloquear la fila única serializa corridas concurrentes
+            estado = EstadoValuacion.objects.select_for_update().get(pk=1)
+            cantidad = _procesar_lote(estado, tamanio_lote)
+        procesados += cantidad
+        if cantidad < tamanio_lote:
+            return procesados
+
+
+class CostoFaltante(Exception):
+    """Productos con stock para los que no se indicó costo inicial."""
+
+    def __init__(self, producto_ids):
+        self.producto_ids = producto_ids
+        super().__init__(f"Sin costo inicial para {len(producto_ids)} productos con stock")
+
+
+def saldo_inicial(costos, costo_por_defecto=None):
+    """
+    Reinicia la valuación tomando el stock actual de cada producto como saldo
+    inicial, en una capa a `costos[producto_id]` (o `costo_por_defecto`), y
+    sigue desde el último movimiento confirmado. Lanza CostoFaltante, sin
+    escribir nada, si un producto con stock no tiene costo. Devuelve la
+    cantidad de productos con saldo.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Stock y movimientos tienen que salir de la misma foto de la base
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        EstadoValuacion.objects.get_or_create(pk=1)
+        estado = EstadoValuacion.objects.select_for_update().get(pk=1)
+        ultimo = _confirmados().values('transaccion', 'id').last()
+        desde = (ultimo['transaccion'], ultimo['id']) if ultimo else (0, 0)
+
+        # Lo confirmado después del punto de partida ya está en el stock y se
+        # va a procesar igual: se descuenta del saldo
+        existencias = conciliacion.stock_registrado()
+        for movimiento in MovimientoStock.objects.filter(_posteriores(*desde)).values(*CAMPOS_MOVIMIENTO):
+            producto_id = movimiento['producto_id']
+            existencias[producto_id] = existencias.get(producto_id, 0) - _efecto(movimiento)
+
+        faltantes = sorted(
+            producto_id for producto_id, cantidad in existencias.items()
+            if cantidad and costos.get(producto_id, costo_por_defecto) is None
+        )
+        if faltantes:
+            raise CostoFaltante(faltantes)
+
+        ahora = timezone.now()
+        valuaciones, capas = [], []
+        for producto_id, cantidad in existencias.items():
+            costo = costos.get(producto_id, costo_por_defecto)
+            if costo is None:
+                # Sin stock ni costo: la valuación arranca con su primer movimiento
+                continue
+            costo = Decimal(costo)
+            en_capa = max(cantidad, 0)
+            valuaciones.append(ValuacionProducto(
+                producto_id=producto_id, cantidad=cantidad, valor=en_capa * costo, ultimo_costo=costo,
+                sin_capa=max(-cantidad, 0),
+            ))
+            if en_capa:
+                # Movimiento 0: la capa inicial es la más vieja
+                capas.append(CapaCosto(
+                    producto_id=producto_id, movimiento_id=0, fecha=ahora, costo_unitario=costo, cantidad=en_capa,
+                ))
+        CapaCosto.objects.all().delete()
+        ValuacionProducto.objects.all().delete()
+        ValuacionProducto.objects.bulk_create(valuaciones, batch_size=TAMANIO_LOTE)
+        CapaCosto.objects.bulk_create(capas, batch_size=TAMANIO_LOTE)
+
+        # El cierre del mes en curso parte del saldo inicial
+        mes = _mes(ahora)
+        saldos = {v.producto_id: v for v in valuaciones}
+        existentes = list(ValuacionMensual.objects.filter(mes=mes))
+        for fila in existentes:
+            saldo = saldos.pop(fila.producto_id, None)
+            fila.cantidad_cierre = saldo.cantidad if saldo else 0
+            fila.valor_cierre = saldo.valor if saldo else 0
+        ValuacionMensual.objects.bulk_update(existentes, ['cantidad_cierre', 'valor_cierre'], batch_size=TAMANIO_LOTE)
+        ValuacionMensual.objects.bulk_create([
+            ValuacionMensual(producto_id=v.producto_id, mes=mes, cantidad_cierre=v.cantidad, valor_cierre=v.valor)
+            for v in saldos.values()
+        ], batch_size=TAMANIO_LOTE)
+
+        estado.ultima_transaccion, estado.ultimo_movimiento = desde
+        estado.fecha = ahora
+        estado.save(update_fields=['ultima_transaccion', 'ultimo_movimiento', 'fecha'])
+    return len(valuaciones)
+
+
+# -----------------------------------------------------------------------------
+# Lecturas
+# -----------------------------------------------------------------------------
+def valor_inventario():
+    """Valor actual de las existencias a costo FIFO (al último movimiento procesado)."""
+    return ValuacionProducto.objects.aggregate(total=Sum('valor', default=0))['total']
+
+
+def cierre(anio, mes):
+    """
+    Valuación al cierre del mes: {'valor', 'costo_vendido', 'unidades_vendidas', 'productos'}.
+    Cada producto aporta su último cierre mensual hasta ese mes.
+    """
+    mes = datetime.date(anio, mes, 1)
+    ultimo = ValuacionMensual.objects.filter(
+        producto_id=OuterRef('producto_id'), mes__lte=mes
+    ).order_by('-mes').values('pk')[:1]
+    cierres = ValuacionMensual.objects.filter(pk=Subquery(ultimo))
+    del_mes = ValuacionMensual.objects.filter(mes=mes).aggregate(
+        costo_vendido=Sum('costo_vendido', default=0), unidades_vendidas=Sum('unidades_vendidas', default=0),
+    )
+    return {
+        'valor': cierres.aggregate(total=Sum('valor_cierre', default=0))['total'],
+        **del_mes,
+        'productos': cierres.select_related('producto').order_by('producto__nombre'),
+    }
@@ -2,16 +2,20 @@
 # productos/views.py
 # Este archivo contiene la lógica de la aplicación a través de las Vistas Basadas en Clases (CBVs).
 # -----------------------------------------------------------------------------
+from django.http import JsonResponse
 from django.shortcuts import render
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView, FormView
+from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView, FormView, TemplateView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.shortcuts import get_object_or_404, redirect
+from django.shortcuts import redirect
+from django.db import transaction
 from django.db.models import Q, F
 from django.utils import timezone
+from datetime import date, timedelta
 from .models import Producto, MovimientoStock
-from .forms import ProductoForm, MovimientoStockForm, AjusteStockForm
+from .forms import ProductoForm, MovimientoStockForm, AjusteStockForm, TransferenciaStockForm, EdicionConflictiva
+from . import bajas, cambios, cargador, historial, kpis, sku_index, stock
 
 
 # ============================================================================
@@ -44,6 +48,21 @@ class StockGroupPermissionMixin(PermissionRequiredMixin):
 
 
 
+# ============================================================================
+# Acceso al producto de la URL a través del cargador de la petición
+# (productos/cargador.py): vista, formulario y plantilla usan la misma instancia
+# ============================================================================
+class ProductoDeUrlMixin:
+    def get_producto(self):
+        return cargador.de(self.request).obtener_o_404(self.kwargs["pk"])
+
+
+class ProductoObjetoMixin(ProductoDeUrlMixin):
+    """Para las vistas de un solo objeto cuyo objeto es el propio producto."""
+    def get_object(self, queryset=None):
+        return self.get_producto()
+
+
 class ProductoListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
     """Muestra una lista de todos los productos - Accesible a cualquier usuario autenticado."""
     permission_required = 'productos.view_producto'
@@ -56,10 +75,10 @@ class ProductoListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
         """Sobrescribe para permitir el filtrado por stock bajo."""
         queryset = super().get_queryset()
 
-        # Filtro por nombre (q)
+        # Filtro por nombre o SKU exacto (q)
         q = self.request.GET.get('q')
         if q:
-            queryset = queryset.filter(nombre__icontains=q)
+            queryset = queryset.filter(Q(nombre__icontains=q) | Q(sku=q))
 
         # Filtra por stock bajo si se solicita
         stock_bajo = self.request.GET.get('stock_bajo')
@@ -85,7 +104,7 @@ class ProductoListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
         return context
     
 
-class ProductoDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
+class ProductoDetailView(LoginRequiredMixin, PermissionRequiredMixin, ProductoObjetoMixin, DetailView):
     """Muestra los detalles de un producto específico - Accesible a cualquier usuario autenticado."""
     permission_required = 'productos.view_producto'
     model = Producto
@@ -95,8 +114,13 @@ class ProductoDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView
     def get_context_data(self, **kwargs):
         """Añade los últimos 10 movimientos y el formulario de ajuste al contexto."""
         context = super().get_context_data(**kwargs)
+        # Con stock fragmentado, actualiza producto.stock con la suma de los fragmentos
+        stock.stock_total(self.object)
         # Accede a los movimientos a través del related_name en el modelo
-        context["movimientos"] = self.object.movimientos.all()[:10]
+        context["movimientos"] = self.object.movimientos.select_related("deposito")[:10]
+        # Totales mensuales de los movimientos que ya se archivaron
+        context["resumenes_archivados"] = self.object.resumenes_mensuales.all()[:12]
+        context["stock_depositos"] = stock.stock_por_deposito(self.object)
         context["form_ajuste"] = AjusteStockForm
         return context
     
@@ -119,15 +143,17 @@ class ProductoCreateView(LoginRequiredMixin, StockGroupPermissionMixin, CreateVi
                 tipo="entrada",
                 cantidad=form.cleaned_data["stock"],
                 motivo = "Stock inicial",
+                costo_unitario=form.cleaned_data.get("costo_unitario"),
                 fecha = timezone.now(),
                 usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema" #esto hay que sacarlo una vez implementemos autenticación
             )
 
+        kpis.registrar_producto(None, (self.object.precio, self.object.stock, self.object.stock_minimo))
         messages.success(self.request, "Producto creado exitosamente")
         return response
     
 
-class ProductoUpdateView(LoginRequiredMixin, StockGroupPermissionMixin, UpdateView):
+class ProductoUpdateView(LoginRequiredMixin, StockGroupPermissionMixin, ProductoObjetoMixin, UpdateView):
     """Vista para actualizar un producto existente."""
     permission_required = 'productos.change_producto'
     model = Producto
@@ -137,25 +163,56 @@ class ProductoUpdateView(LoginRequiredMixin, StockGroupPermissionMixin, UpdateVi
 
     def form_valid(self, form):
         """Sobrescribe para mostrar un mensaje de éxito."""
-        response = super().form_valid(form)
+        # form.initial conserva los valores que tenía el producto al leerlo; el
+        # stock no se edita en este formulario
+        anterior = (form.initial["precio"], self.object.stock, form.initial["stock_minimo"])
+        try:
+            response = super().form_valid(form)
+        except EdicionConflictiva as conflicto:
+            return self.conflicto(form, conflicto.actual)
+        kpis.registrar_producto(anterior, (self.object.precio, self.object.stock, self.object.stock_minimo))
         messages.success(self.request, "Producto actualizado exitosamente")
         return response
+
+    def conflicto(self, form, actual):
+        """
+        Responde 409 con las diferencias entre lo enviado y lo guardado por
+        otro usuario, y el formulario con los datos enviados sobre la versión
+        actual para que el usuario decida si los vuelve a guardar.
+        """
+        diferencias = []
+        for nombre in form._meta.fields:
+            if nombre not in form.fields or nombre == "imagen":
+                continue
+            enviado, guardado = form.cleaned_data.get(nombre), getattr(actual, nombre)
+            if enviado != guardado:
+                diferencias.append((form.fields[nombre].label or nombre, enviado, guardado))
+
+        datos = self.request.POST.copy()
+        datos["version"] = actual.version
+        return render(self.request, "productos/producto_conflicto.html", {
+            "producto": actual,
+            "form": ProductoForm(datos, instance=actual),
+            "diferencias": diferencias,
+            "imagen_descartada": "imagen" in self.request.FILES,
+        }, status=409)
     
 
-class ProductoDeleteView(LoginRequiredMixin, StockGroupPermissionMixin, DeleteView):
+class ProductoDeleteView(LoginRequiredMixin, StockGroupPermissionMixin, ProductoObjetoMixin, DeleteView):
     """Vista para eliminar un producto."""
     permission_required = 'productos.delete_producto'
     model = Producto
     template_name = "productos/producto_confirm_delete.html"
     success_url = reverse_lazy("productos:producto_list")
 
-    def delete(self, request, *args, **kwargs):
-        """Sobrescribe para mostrar un mensaje de éxito después de eliminar."""
+    def form_valid(self, form):
+        """Archiva el producto en lugar de borrarlo; la purga de su historial corre aparte (bajas.py)."""
+        bajas.archivar(self.object)
         messages.success(self.request, "Producto eliminado exitosamente")
-        return super().delete(request, *args, **kwargs)
-    
+        return redirect(self.get_success_url())
+
 
-class MovimientoStockCreateView(LoginRequiredMixin, StockGroupPermissionMixin, CreateView):
+class MovimientoStockCreateView(LoginRequiredMixin, StockGroupPermissionMixin, ProductoDeUrlMixin, CreateView):
     """Vista para registrar un nuevo movimiento de stock."""
     permission_required = 'productos.add_movimientostock'
     model = MovimientoStock
@@ -165,39 +222,39 @@ class MovimientoStockCreateView(LoginRequiredMixin, StockGroupPermissionMixin, C
     def get_form_kwargs(self):
         """Pasa la instancia del producto al formulario."""
         kwargs = super().get_form_kwargs()
-        kwargs["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        kwargs["producto"] = self.get_producto()
         return kwargs
     
     def get_context_data(self, **kwargs):
         """Añade la instancia del producto al contexto de la plantilla."""
         context = super().get_context_data(**kwargs)
-        context["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        context["producto"] = self.get_producto()
         return context #esto no aparece en el video pero es necesario para que funcione el template
 
     def form_valid(self, form):
         """Maneja la lógica de negocio para actualizar el stock."""
         movimiento = form.save(commit=False)
-        movimiento.producto = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        movimiento.producto = self.get_producto()
         movimiento.usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema" # tambien se modifica esto una vez implementemos autenticación
 
-        if movimiento.tipo == "entrada":
-            movimiento.producto.stock += movimiento.cantidad
-        elif movimiento.tipo == "salida":
+        try:
+            # El stock y el movimiento se guardan juntos o no se guarda ninguno
+            with transaction.atomic():
+                if movimiento.tipo == "entrada":
+                    stock.incrementar(movimiento.producto, movimiento.cantidad, deposito=movimiento.deposito)
+                elif movimiento.tipo == "salida":
+                    # Descuento condicional: falla si otro usuario se llevó el stock antes
+                    stock.decrementar(movimiento.producto, movimiento.cantidad, deposito=movimiento.deposito)
+                movimiento.save()
+        except stock.StockInsuficiente:
             # Si no hay suficiente stock, se añade un error y se re-renderiza el formulario
-            if movimiento.producto.stock >= movimiento.cantidad:
-                movimiento.producto.stock -= movimiento.cantidad
-            else:
-                form.add_error("cantidad", "No hay stock suficiente")
-                return self.form_invalid(form)
-        
-        # Guarda el producto actualizado y el nuevo movimiento
-        movimiento.producto.save()
-        movimiento.save()
+            form.add_error("cantidad", "No hay stock suficiente")
+            return self.form_invalid(form)
 
         messages.success(self.request, f"Movimiento de stock registrado exitosamente")
         return redirect("productos:producto_detail", pk=movimiento.producto.pk)       
 
-class AjusteStockView(LoginRequiredMixin, StockGroupPermissionMixin, FormView):
+class AjusteStockView(LoginRequiredMixin, StockGroupPermissionMixin, ProductoDeUrlMixin, FormView):
     """Vista para ajustar el stock de un producto a un valor específico."""
     permission_required = 'productos.change_producto'
     form_class = AjusteStockForm
@@ -206,39 +263,41 @@ class AjusteStockView(LoginRequiredMixin, StockGroupPermissionMixin, FormView):
     def get_form_kwargs(self):
         """Pasa la instancia del producto al formulario para que pueda pre-llenar los datos."""
         kwargs = super().get_form_kwargs()
-        kwargs["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        kwargs["producto"] = self.get_producto()
         return kwargs
     
     def get_context_data(self, **kwargs):
         """Añade la instancia del producto al contexto de la plantilla."""
         context = super().get_context_data(**kwargs)
-        context["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        context["producto"] = self.get_producto()
         return context #esto no aparece en el video pero es necesario para que funcione el template
 
     def form_valid(self, form):
         """
         Calcula la diferencia de stock, registra un movimiento y actualiza el stock del producto.
         """
-        producto = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        producto = self.get_producto()
         nueva_cantidad = form.cleaned_data["cantidad"]
         motivo = form.cleaned_data["motivo"] or "Ajuste de stock"
-
-        diferencia = nueva_cantidad - producto.stock
+        deposito = form.cleaned_data.get("deposito")
+
+        with transaction.atomic():
+            # fijar() bloquea el producto, así la diferencia no queda desactualizada
+            diferencia = stock.fijar(producto, nueva_cantidad, deposito=deposito)
+
+            if diferencia != 0:
+                tipo = "entrada" if diferencia > 0 else "salida" 
+                MovimientoStock.objects.create(
+                    producto=producto,
+                    tipo=tipo,
+                    cantidad=abs(diferencia),
+                    motivo=motivo,
+                    deposito=deposito,
+                    fecha=timezone.now(),
+                    usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
+                )
 
         if diferencia != 0:
-            tipo = "entrada" if diferencia > 0 else "salida" 
-            MovimientoStock.objects.create(
-                producto=producto,
-                tipo=tipo,
-                cantidad=abs(diferencia),
-                motivo=motivo,
-                fecha=timezone.now(),
-                usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
-            )
-
-            producto.stock = nueva_cantidad
-            producto.save()
-
             messages.success(self.request, f"Stock actualizado exitosamente")
         else:
             messages.info(self.request, f"El stock no ha cambiado")
@@ -246,6 +305,46 @@ class AjusteStockView(LoginRequiredMixin, StockGroupPermissionMixin, FormView):
         return redirect("productos:producto_detail", pk=producto.pk)
 
 
+class TransferenciaStockView(LoginRequiredMixin, StockGroupPermissionMixin, ProductoDeUrlMixin, FormView):
+    """Vista para pasar stock de un producto de un depósito a otro."""
+    permission_required = 'productos.add_movimientostock'
+    form_class = TransferenciaStockForm
+    template_name = "productos/transferencia_form.html"
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["producto"] = self.get_producto()
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["producto"] = self.get_producto()
+        return context
+
+    def form_valid(self, form):
+        """Mueve el stock y deja una salida en el origen y una entrada en el destino."""
+        producto = self.get_producto()
+        origen, destino = form.cleaned_data["origen"], form.cleaned_data["destino"]
+        cantidad = form.cleaned_data["cantidad"]
+        motivo = form.cleaned_data["motivo"] or f"Transferencia {origen} → {destino}"
+        usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
+
+        try:
+            with transaction.atomic():
+                stock.transferir(producto, origen, destino, cantidad)
+                MovimientoStock.objects.bulk_create([
+                    MovimientoStock(producto=producto, tipo=tipo, cantidad=cantidad, motivo=motivo,
+                                    usuario=usuario, origen="transferencia", deposito=deposito)
+                    for tipo, deposito in (("salida", origen), ("entrada", destino))
+                ])
+        except stock.StockInsuficiente:
+            form.add_error("cantidad", f"No hay stock suficiente en {origen}")
+            return self.form_invalid(form)
+
+        messages.success(self.request, f"Se transfirieron {cantidad} unidades de {origen} a {destino}")
+        return redirect("productos:producto_detail", pk=producto.pk)
+
+
 class StockBajoListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
     """Muestra una lista filtrada solo para productos con stock bajo - Accesible a cualquier usuario autenticado."""
     permission_required = 'productos.view_producto'
@@ -259,4 +358,102 @@ class StockBajoListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
         cuyo stock sea menor que el stock mínimo.
         """
         # Se ha corregido la sintaxis. Se usa F() para una comparación eficiente
-        return Producto.objects.filter(stock__lt=F("stock_minimo")).order_by("stock")
\ No newline at end of file
+        return Producto.objects.filter(stock__lt=F("stock_minimo")).order_by("stock")
+
+
+class PanelView(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
+    """Panel de control con los indicadores principales del negocio."""
+    permission_required = 'productos.view_producto'
+    template_name = "productos/panel.html"
+
+    def get_context_data(self, **kwargs):
+        """Los indicadores salen de la caché; no se recorren las tablas de productos ni ventas."""
+        context = super().get_context_data(**kwargs)
+        context.update(kpis.resumen())
+        return context
+
+
+class BusquedaSkuView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """
+    Búsqueda por SKU para los lectores de código de barras. Responde JSON con
+    los datos del índice en memoria (productos/sku_index.py), sin consultar
+    la base mientras el índice esté vigente.
+    Acepta varios SKU: ?sku=A&sku=B o ?sku=A,B
+    """
+    permission_required = 'productos.view_producto'
+    MAX_SKUS = 200
+
+    def get(self, request, *args, **kwargs):
+        skus = [sku.strip() for valor in request.GET.getlist("sku") for sku in valor.split(",") if sku.strip()]
+        if not skus:
+            return JsonResponse({"error": "Indicar al menos un SKU"}, status=400)
+        if len(skus) > self.MAX_SKUS:
+            return JsonResponse({"error": f"Máximo {self.MAX_SKUS} SKU por consulta"}, status=400)
+
+        encontrados = sku_index.indice.buscar(skus)
+        return JsonResponse({
+            "productos": {
+                sku: {"id": pk, "nombre": nombre, "precio": str(precio), "stock": stock_actual}
+                for sku, (pk, nombre, precio, stock_actual) in encontrados.items()
+            },
+            "no_encontrados": [sku for sku in skus if sku not in encontrados],
+        })
+
+
+class HistorialStockView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """
+    Evolución del stock de un producto para los gráficos del detalle (JSON).
+    Parámetros: desde, hasta (AAAA-MM-DD), periodo (dia/semana/mes, opcional) y puntos.
+    """
+    permission_required = 'productos.view_producto'
+
+    def get(self, request, pk, *args, **kwargs):
+        producto = cargador.de(request).obtener_o_404(pk)
+        hoy = timezone.localdate()
+        try:
+            hasta = date.fromisoformat(request.GET["hasta"]) if request.GET.get("hasta") else hoy
+            desde = date.fromisoformat(request.GET["desde"]) if request.GET.get("desde") else hasta - timedelta(days=365)
+            puntos = int(request.GET.get("puntos", historial.PUNTOS_POR_DEFECTO))
+        except ValueError:
+            return JsonResponse({"error": "Parámetros inválidos"}, status=400)
+        periodo = request.GET.get("periodo") or None
+        if periodo is not None and periodo not in historial.PERIODOS:
+            return JsonResponse({"error": f"Período inválido: {periodo}"}, status=400)
+        if desde > hasta or not 1 <= puntos <= historial.PUNTOS_MAXIMOS:
+            return JsonResponse({"error": "Rango o cantidad de puntos inválidos"}, status=400)
+
+        periodo, serie = historial.serie_stock(producto, desde, hasta, periodo, puntos)
+        return JsonResponse({
+            "producto": producto.pk,
+            "periodo": periodo,
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "puntos": serie,
+        })
+
+
+class CambiosView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """
+    Feed de cambios del catálogo (JSON) para sincronizar la tienda online y las
+    terminales de sucursal. Parámetros: cursor (el devuelto por la llamada
+    anterior, 0 la primera vez) y limite. Mientras `hay_mas` sea verdadero se
+    vuelve a pedir con el nuevo cursor.
+    """
+    permission_required = 'productos.view_producto'
+
+    def get(self, request, *args, **kwargs):
+        try:
+            cursor = cambios.leer_cursor(request.GET.get("cursor", 0))
+            limite = int(request.GET.get("limite", cambios.LIMITE_POR_DEFECTO))
+        except ValueError:
+            return JsonResponse({"error": "Parámetros inválidos"}, status=400)
+        if not 1 <= limite <= cambios.LIMITE_MAXIMO:
+            return JsonResponse({"error": f"El límite debe estar entre 1 y {cambios.LIMITE_MAXIMO}"}, status=400)
+
+        productos, eliminados, nuevo_cursor, hay_mas = cambios.leer(cursor, limite)
+        return JsonResponse({
+            "cursor": cambios.escribir_cursor(nuevo_cursor),
+            "hay_mas": hay_mas,
+            "productos": productos,
+            "eliminados": eliminados,
+        })
@@ -0,0 +1,30 @@
+from django.contrib import admin, messages
+
+from . import cola
+from .models import Tarea
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'nombre', 'estado', 'prioridad', 'intentos', 'creada', 'terminada', 'trabajador']
+    list_filter = ['estado', 'nombre']
+    date_hierarchy = 'creada'
+    readonly_fields = [
+        'nombre', 'argumentos', 'estado', 'intentos', 'creada', 'iniciada', 'latido', 'terminada',
+        'trabajador', 'resultado', 'error',
+    ]
+    actions = ['reintentar', 'cancelar']
+
+    def has_add_permission(self, request):
+        # Las tareas se encolan desde el código (cola.encolar)
+        return False
+
+    @admin.action(description="Reintentar", permissions=['change'])
+    def reintentar(self, request, queryset):
+        cantidad = sum(cola.reintentar(pk) for pk in queryset.values_list('pk', flat=True))
+        self.message_user(request, f"{cantidad} tareas encoladas nuevamente", messages.SUCCESS)
+
+    @admin.action(description="Cancelar", permissions=['change'])
+    def cancelar(self, request, queryset):
+        cantidad = sum(cola.cancelar(pk) for pk in queryset.values_list('pk', flat=True))
+        self.message_user(request, f"{cantidad} tareas canceladas", messages.SUCCESS)
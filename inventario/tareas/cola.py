@@ -0,0 +1,264 @@
+# -----------------------------------------------------------------------------
+# tareas/cola.py
+# Cola de trabajos en segundo plano guardada en la propia base de datos.
+# -----------------------------------------------------------------------------
+"""
+Sin Redis ni Celery: cada trabajo es una fila de Tarea.
+
+Una app declara sus tareas en <app>/tareas.py con el decorador `@tarea` y
+las encola con `encolar('<app>.<funcion>', **argumentos)`. La fila se
+inserta en la transacción en curso: si la transacción se revierte, la
+tarea tampoco queda encolada. Los argumentos tienen que ser serializables
+a JSON (ids, no instancias).
+
+Los trabajadores (comando run_workers, ver trabajador.py) toman la próxima
+tarea pendiente con SELECT ... FOR UPDATE SKIP LOCKED, así varios procesos
+leen la cola a la vez sin esperarse ni tomar la misma fila. En SQLite, que
+no lo soporta, la tarea se reclama con un UPDATE condicional sobre el
+estado.
+
+- Orden: mayor `prioridad` primero y, a igual prioridad, la más vieja.
+- Reintentos: una tarea que lanza una excepción vuelve a la cola con espera
+  exponencial hasta `max_intentos`; después queda fallida con el traceback.
+- Latido: mientras una tarea se ejecuta, un hilo del trabajador renueva
+  `Tarea.latido` cada TAREAS_LATIDO segundos. Una tarea en curso sin latido
+  por más de TAREAS_TIEMPO_MAXIMO segundos (el trabajador se cayó) vuelve a
+  la cola con `recuperar_colgadas()`; una que sigue ejecutándose, por larga
+  que sea, no.
+
+Una tarea declarada con `cada=<segundos>` es periódica: el proceso
+principal de run_workers la encola en su mantenimiento si no hay una
+pendiente o en curso ni se encoló otra en ese intervalo
+(`programar_periodicas()`).
+
+Con TAREAS_INMEDIATAS=True `encolar` ejecuta la tarea al confirmar la
+transacción, sin trabajadores (desarrollo y pruebas).
+"""
+import datetime
+import json
+import threading
+import time
+import traceback
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from inventario import metricas
+from .models import Tarea
+
+ESPERA_BASE = datetime.timedelta(seconds=getattr(settings, 'TAREAS_ESPERA_REINTENTO', 10))
+LATIDO = getattr(settings, 'TAREAS_LATIDO', 30)
+TIEMPO_MAXIMO = datetime.timedelta(seconds=getattr(settings, 'TAREAS_TIEMPO_MAXIMO', 300))
+DIAS_RETENCION = getattr(settings, 'TAREAS_DIAS_RETENCION', 14)
+
+Definicion = namedtuple('Definicion', 'funcion max_intentos prioridad cada')
+_registro = {}
+
+
+class TareaDesconocida(Exception):
+    """No hay ninguna función registrada con ese nombre."""
+
+
+def tarea(nombre=None, max_intentos=3, prioridad=0, cada=None):
+    """
+    Registra la función como tarea; el nombre por defecto es '<app>.<funcion>'.
+    Con `cada` (segundos) se encola sola con esa frecuencia.
+    """
+    def registrar(funcion):
+        clave = nombre or f"{funcion.__module__.split('.')[0]}.{funcion.__name__}"
+        _registro[clave] = Definicion(funcion, max_intentos, prioridad, cada)
+        funcion.nombre_tarea = clave
+        return funcion
+    return registrar
+
+
+def registradas():
+    return sorted(_registro)
+
+
+def encolar(nombre, prioridad=None, demora=None, max_intentos=None, **argumentos):
+    """Encola la tarea (nombre o función decorada) y devuelve la fila creada."""
+    nombre = getattr(nombre, 'nombre_tarea', nombre)
+    definicion = _registro.get(nombre)
+    if definicion is None:
+        raise TareaDesconocida(nombre)
+    ahora = timezone.now()
+    nueva = Tarea.objects.create(
+        nombre=nombre,
+        # Ida y vuelta por JSON para que fechas y decimales lleguen como texto
+        argumentos=json.loads(json.dumps(argumentos, cls=DjangoJSONEncoder)),
+        prioridad=definicion.prioridad if prioridad is None else prioridad,
+        max_intentos=definicion.max_intentos if max_intentos is None else max_intentos,
+        ejecutar_desde=ahora + demora if demora else ahora,
+        creada=ahora,
+    )
+    if getattr(settings, 'TAREAS_INMEDIATAS', False):
+        transaction.on_commit(lambda: _ejecutar_inmediata(nueva.pk))
+    return nueva
+
+
+def _ejecutar_inmediata(pk):
+    ahora = timezone.now()
+    if Tarea.objects.filter(pk=pk, estado=Tarea.PENDIENTE).update(
+        estado=Tarea.EN_CURSO, iniciada=ahora, latido=ahora, trabajador='inmediata', intentos=F('intentos') + 1,
+    ):
+        ejecutar(Tarea.objects.get(pk=pk))
+
+
+# -----------------------------------------------------------------------------
+# Trabajadores
+# -----------------------------------------------------------------------------
+def _pendientes(ahora):
+    return Tarea.objects.filter(estado=Tarea.PENDIENTE, ejecutar_desde__lte=ahora).order_by(
+        '-prioridad', 'ejecutar_desde', 'id'
+    )
+
+
+def tomar(trabajador):
+    """Reclama la próxima tarea pendiente para `trabajador`; None si no hay ninguna."""
+    ahora = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            siguiente = _pendientes(ahora).select_for_update(skip_locked=True).first()
+            if siguiente is None:
+                return None
+            siguiente.estado = Tarea.EN_CURSO
+            siguiente.iniciada = siguiente.latido = ahora
+            siguiente.trabajador = trabajador
+            siguiente.intentos += 1
+            siguiente.save(update_fields=['estado', 'iniciada', 'latido', 'trabajador', 'intentos'])
+            return siguiente
+
+    # Sin SKIP LOCKED: gana quien logre cambiar el estado primero
+    for pk in _pendientes(ahora).values_list('pk', flat=True)[:10]:
+        if Tarea.objects.filter(pk=pk, estado=Tarea.PENDIENTE).update(
+            estado=Tarea.EN_CURSO, iniciada=ahora, latido=ahora, trabajador=trabajador, intentos=F('intentos') + 1,
+        ):
+            return Tarea.objects.get(pk=pk)
+    return None
+
+
+def _en_curso(tarea_en_curso):
+    return Tarea.objects.filter(pk=tarea_en_curso.pk, estado=Tarea.EN_CURSO, trabajador=tarea_en_curso.trabajador)
+
+
+@contextmanager
+def _latiendo(tarea_en_curso):
+    """Renueva el latido de la tarea en un hilo aparte mientras dura el bloque."""
+    fin = threading.Event()
+
+    def latir():
+        try:
+            while not fin.wait(LATIDO):
+                try:
+                    _en_curso(tarea_en_curso).update(latido=timezone.now())
+                except DatabaseError:
+                    pass  # se reintenta en el próximo latido
+        finally:
+            # El hilo tiene su propia conexión
+            connection.close()
+
+    hilo = threading.Thread(target=latir, name=f"latido-{tarea_en_curso.pk}", daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        fin.set()
+        hilo.join()
+
+
+def _serializable(resultado):
+    try:
+        return json.loads(json.dumps(resultado, cls=DjangoJSONEncoder))
+    except (TypeError, ValueError):
+        return str(resultado)
+
+
+def ejecutar(tarea_en_curso):
+    """Ejecuta una tarea ya reclamada y guarda el resultado o programa el reintento."""
+    definicion = _registro.get(tarea_en_curso.nombre)
+    inicio = time.perf_counter()
+    cambios = {}
+    try:
+        if definicion is None:
+            raise TareaDesconocida(tarea_en_curso.nombre)
+        with _latiendo(tarea_en_curso):
+            resultado = definicion.funcion(**tarea_en_curso.argumentos)
+    except Exception:
+        ahora = timezone.now()
+        cambios['error'] = traceback.format_exc()
+        if definicion is not None and tarea_en_curso.intentos < tarea_en_curso.max_intentos:
+            cambios['estado'] = Tarea.PENDIENTE
+            cambios['ejecutar_desde'] = ahora + ESPERA_BASE * 2 ** (tarea_en_curso.intentos - 1)
+            cambios['trabajador'] = ''
+        else:
+            cambios['estado'] = Tarea.FALLIDA
+            cambios['terminada'] = ahora
+    else:
+        cambios.update(
+            estado=Tarea.COMPLETADA, terminada=timezone.now(), resultado=_serializable(resultado), error='',
+        )
+    metricas.registrar_tarea(tarea_en_curso.nombre, cambios['estado'], time.perf_counter() - inicio)
+
+    # Condicional: si la tarea se dio por colgada y la tomó otro trabajador, no se pisa
+    _en_curso(tarea_en_curso).update(**cambios)
+    for campo, valor in cambios.items():
+        setattr(tarea_en_curso, campo, valor)
+    return tarea_en_curso
+
+
+# -----------------------------------------------------------------------------
+# Mantenimiento y acciones manuales
+# -----------------------------------------------------------------------------
+def recuperar_colgadas():
+    """Devuelve a la cola las tareas en curso sin latido desde hace más de TIEMPO_MAXIMO. Devuelve la cantidad."""
+    ahora = timezone.now()
+    colgadas = Tarea.objects.filter(estado=Tarea.EN_CURSO, latido__lt=ahora - TIEMPO_MAXIMO)
+    fallidas = colgadas.filter(intentos__gte=F('max_intentos')).update(
+        estado=Tarea.FALLIDA, terminada=ahora, error="El trabajador no terminó la tarea a tiempo",
+    )
+    return fallidas + colgadas.update(estado=Tarea.PENDIENTE, ejecutar_desde=ahora, trabajador='')
+
+
+def programar_periodicas():
+    """Encola las tareas periódicas que no se encolaron en su intervalo. Devuelve sus nombres."""
+    ahora = timezone.now()
+    encoladas = []
+    for nombre, definicion in sorted(_registro.items()):
+        if not definicion.cada:
+            continue
+        recientes = Tarea.objects.filter(nombre=nombre).filter(
+            Q(estado__in=[Tarea.PENDIENTE, Tarea.EN_CURSO])
+            | Q(creada__gt=ahora - datetime.timedelta(seconds=definicion.cada))
+        )
+        if not recientes.exists():
+            encolar(nombre)
+            encoladas.append(nombre)
+    return encoladas
+
+
+def purgar(dias=DIAS_RETENCION):
+    """Borra las tareas completadas o canceladas hace más de `dias` días."""
+    limite = timezone.now() - datetime.timedelta(days=dias)
+    return Tarea.objects.filter(
+        estado__in=[Tarea.COMPLETADA, Tarea.CANCELADA], terminada__lt=limite
+    ).delete()[0]
+
+
+def reintentar(pk):
+    """Vuelve a encolar una tarea fallida o cancelada, con los intentos en cero."""
+    return bool(Tarea.objects.filter(pk=pk, estado__in=[Tarea.FALLIDA, Tarea.CANCELADA]).update(
+        estado=Tarea.PENDIENTE, intentos=0, ejecutar_desde=timezone.now(), terminada=None, trabajador='',
+    ))
+
+
+def cancelar(pk):
+    """Cancela una tarea que todavía no empezó."""
+    return bool(Tarea.objects.filter(pk=pk, estado=Tarea.PENDIENTE).update(
+        estado=Tarea.CANCELADA, terminada=timezone.now(),
+    ))
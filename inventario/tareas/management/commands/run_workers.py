@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tareas import cola
+from tareas.trabajador import Pool
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta las tareas en segundo plano de la cola con un pool de procesos. '
+        'Termina con SIGTERM o Ctrl+C después de completar las tareas en curso.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=settings.TAREAS_PROCESOS, help='Cantidad de procesos trabajadores',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0, help='Segundos de espera cuando la cola está vacía',
+        )
+        parser.add_argument(
+            '--hasta-vaciar', action='store_true', help='Sale cuando no quedan tareas pendientes (para cron)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Tareas registradas: {', '.join(cola.registradas()) or '-'}")
+        pool = Pool(
+            max(options['procesos'], 1), options['intervalo'], options['hasta_vaciar'], salida=self.stdout.write,
+        )
+        pool.ejecutar()
+        self.stdout.write(self.style.SUCCESS('Trabajadores detenidos.'))
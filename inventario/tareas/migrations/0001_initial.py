@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='Argumentos')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('completada', 'Completada'), ('fallida', 'Fallida'), ('cancelada', 'Cancelada')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('prioridad', models.SmallIntegerField(default=0, verbose_name='Prioridad')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('max_intentos', models.PositiveSmallIntegerField(default=3, verbose_name='Máximo de intentos')),
+                ('ejecutar_desde', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Ejecutar desde')),
+                ('creada', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Creada')),
+                ('iniciada', models.DateTimeField(blank=True, null=True, verbose_name='Iniciada')),
+                ('terminada', models.DateTimeField(blank=True, null=True, verbose_name='Terminada')),
+                ('trabajador', models.CharField(blank=True, max_length=100, verbose_name='Trabajador')),
+                ('resultado', models.JSONField(blank=True, null=True, verbose_name='Resultado')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'ordering': ['-creada'],
+                'indexes': [models.Index(condition=models.Q(('estado', 'pendiente')), fields=['-prioridad', 'ejecutar_desde', 'id'], name='tarea_cola_idx'), models.Index(condition=models.Q(('estado', 'en_curso')), fields=['iniciada'], name='tarea_en_curso_idx'), models.Index(fields=['estado', '-creada'], name='tarea_estado_creada_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:33
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def latido_inicial(apps, schema_editor):
+    # Las tareas que ya estaban en curso cuentan desde que empezaron
+    Tarea = apps.get_model('tareas', 'Tarea')
+    Tarea.objects.filter(estado='en_curso').update(latido=F('iniciada'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='tarea',
+            name='tarea_en_curso_idx',
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='latido',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último latido'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(condition=models.Q(('estado', 'en_curso')), fields=['latido'], name='tarea_en_curso_idx'),
+        ),
+        migrations.RunPython(latido_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Tarea(models.Model):
+    """Trabajo en segundo plano encolado en la base (ver tareas/cola.py)."""
+
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    CANCELADA = 'cancelada'
+    ESTADO_CHOICES = [
+        (PENDIENTE, "Pendiente"),
+        (EN_CURSO, "En curso"),
+        (COMPLETADA, "Completada"),
+        (FALLIDA, "Fallida"),
+        (CANCELADA, "Cancelada"),
+    ]
+
+    nombre = models.CharField("Nombre", max_length=100)
+    argumentos = models.JSONField("Argumentos", default=dict, blank=True)
+    estado = models.CharField("Estado", max_length=20, choices=ESTADO_CHOICES, default=PENDIENTE)
+    # Mayor número, antes se ejecuta
+    prioridad = models.SmallIntegerField("Prioridad", default=0)
+    intentos = models.PositiveSmallIntegerField("Intentos", default=0)
+    max_intentos = models.PositiveSmallIntegerField("Máximo de intentos", default=3)
+    ejecutar_desde = models.DateTimeField("Ejecutar desde", default=timezone.now)
+    creada = models.DateTimeField("Creada", default=timezone.now)
+    iniciada = models.DateTimeField("Iniciada", blank=True, null=True)
+    # Lo renueva el trabajador mientras la tarea se ejecuta (ver cola.ejecutar)
+    latido = models.DateTimeField("Último latido", blank=True, null=True)
+    terminada = models.DateTimeField("Terminada", blank=True, null=True)
+    trabajador = models.CharField("Trabajador", max_length=100, blank=True)
+    resultado = models.JSONField("Resultado", blank=True, null=True)
+    error = models.TextField("Error", blank=True)
+
+    class Meta:
+        """Meta definition for Tarea."""
+
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        ordering = ['-creada']
+        indexes = [
+            # Cola: solo las pendientes, en el orden en que se toman
+            models.Index(
+                fields=['-prioridad', 'ejecutar_desde', 'id'],
+                condition=models.Q(estado='pendiente'), name='tarea_cola_idx',
+            ),
+            # Recuperación de tareas de trabajadores caídos
+            models.Index(fields=['latido'], condition=models.Q(estado='en_curso'), name='tarea_en_curso_idx'),
+            models.Index(fields=['estado', '-creada'], name='tarea_estado_creada_idx'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of Tarea."""
+        return f"{self.nombre} #{self.pk} ({self.get_estado_display()})"
+
+    @property
+    def duracion(self):
+        if self.iniciada and self.terminada:
+            return self.terminada - self.iniciada
+        return None
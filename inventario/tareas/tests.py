@@ -0,0 +1,118 @@
+import datetime
+
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import cola
+from .models import Tarea
+
+
+@cola.tarea(nombre='pruebas.periodica', cada=3600)
+def periodica():
+    return 'ok'
+
+
+@cola.tarea(nombre='pruebas.sumar')
+def sumar(a, b):
+    return a + b
+
+
+@cola.tarea(nombre='pruebas.falla', max_intentos=2)
+def falla():
+    raise ValueError("no anda")
+
+
+class PeriodicasTests(TestCase):
+    def test_se_encola_una_vez_por_intervalo(self):
+        self.assertIn('pruebas.periodica', cola.programar_periodicas())
+        # Pendiente
+        self.assertNotIn('pruebas.periodica', cola.programar_periodicas())
+        tareas = Tarea.objects.filter(nombre='pruebas.periodica')
+        tareas.update(estado=Tarea.COMPLETADA, terminada=timezone.now())
+        # Terminada pero dentro del intervalo
+        self.assertNotIn('pruebas.periodica', cola.programar_periodicas())
+        tareas.update(creada=timezone.now() - datetime.timedelta(hours=2))
+        self.assertIn('pruebas.periodica', cola.programar_periodicas())
+        self.assertEqual(tareas.filter(estado=Tarea.PENDIENTE).count(), 1)
+
+
+class ColaTests(TestCase):
+    def test_encolar_una_tarea_desconocida(self):
+        with self.assertRaises(cola.TareaDesconocida):
+            cola.encolar('pruebas.no_existe')
+
+    def test_toma_por_prioridad_y_respeta_la_demora(self):
+        baja = cola.encolar(sumar, a=1, b=2)
+        alta = cola.encolar(sumar, prioridad=5, a=3, b=4)
+        cola.encolar(sumar, prioridad=9, demora=datetime.timedelta(hours=1), a=0, b=0)
+
+        tomada = cola.tomar('w1')
+        self.assertEqual((tomada.pk, tomada.estado, tomada.intentos), (alta.pk, Tarea.EN_CURSO, 1))
+        self.assertEqual(cola.tomar('w2').pk, baja.pk)
+        self.assertIsNone(cola.tomar('w3'))
+
+    def test_ejecutar_guarda_el_resultado(self):
+        cola.encolar(sumar, a=1, b=2)
+        tarea = cola.ejecutar(cola.tomar('w1'))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.resultado), (Tarea.COMPLETADA, 3))
+
+    def test_reintenta_y_despues_queda_fallida(self):
+        pk = cola.encolar(falla).pk
+        cola.ejecutar(cola.tomar('w1'))
+        tarea = Tarea.objects.get(pk=pk)
+        self.assertEqual((tarea.estado, tarea.trabajador), (Tarea.PENDIENTE, ''))
+        self.assertGreater(tarea.ejecutar_desde, timezone.now())
+        self.assertIn("no anda", tarea.error)
+
+        Tarea.objects.filter(pk=pk).update(ejecutar_desde=timezone.now())
+        cola.ejecutar(cola.tomar('w1'))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.FALLIDA, 2))
+        self.assertTrue(cola.reintentar(pk))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.PENDIENTE, 0))
+
+    def test_recuperar_colgadas(self):
+        viva = cola.encolar(sumar, a=1, b=1)
+        colgada = cola.encolar(sumar, a=1, b=1)
+        agotada = cola.encolar(sumar, max_intentos=1, a=1, b=1)
+        for _ in range(3):
+            cola.tomar('w1')
+        hace_rato = timezone.now() - cola.TIEMPO_MAXIMO - datetime.timedelta(seconds=1)
+        Tarea.objects.filter(pk__in=[colgada.pk, agotada.pk]).update(latido=hace_rato)
+
+        self.assertEqual(cola.recuperar_colgadas(), 2)
+        estados = dict(Tarea.objects.values_list('pk', 'estado'))
+        self.assertEqual(
+            [estados[viva.pk], estados[colgada.pk], estados[agotada.pk]],
+            [Tarea.EN_CURSO, Tarea.PENDIENTE, Tarea.FALLIDA],
+        )
+
+    def test_cancelar_solo_las_pendientes(self):
+        pendiente = cola.encolar(sumar, a=1, b=1)
+        self.assertTrue(cola.cancelar(pendiente.pk))
+        self.assertFalse(cola.cancelar(pendiente.pk))
+
+
+class VistasTests(TestCase):
+    def setUp(self):
+        usuario = User.objects.create_user('operador', password='x')
+        usuario.user_permissions.add(*Permission.objects.filter(codename__in=['view_tarea', 'change_tarea']))
+        self.client.force_login(usuario)
+
+    def test_lista_con_contadores_por_estado(self):
+        cola.encolar(sumar, a=1, b=1)
+        respuesta = self.client.get(reverse('tareas:lista'), {'estado': Tarea.PENDIENTE})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.context['tareas']), 1)
+        self.assertIn((Tarea.PENDIENTE, "Pendiente", 1), respuesta.context['estados'])
+
+    def test_cancelar_desde_el_detalle(self):
+        tarea = cola.encolar(sumar, a=1, b=1)
+        respuesta = self.client.post(reverse('tareas:accion', args=[tarea.pk, 'cancelar']))
+        self.assertRedirects(respuesta, reverse('tareas:detalle', args=[tarea.pk]))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, Tarea.CANCELADA)
@@ -0,0 +1,120 @@
+# -----------------------------------------------------------------------------
+# tareas/trabajador.py
+# Pool de procesos que ejecutan las tareas de la cola (comando run_workers).
+# -----------------------------------------------------------------------------
+"""
+El proceso principal arranca `procesos` hijos con fork y los vuelve a
+arrancar si alguno termina. Cada hijo toma tareas de a una
+(`cola.tomar`) y duerme `intervalo` segundos cuando la cola está vacía.
+
+Cada MANTENIMIENTO segundos el principal devuelve a la cola las tareas de
+trabajadores caídos, encola las tareas periódicas que corresponden y borra
+las tareas viejas ya terminadas.
+
+Con SIGTERM o SIGINT cada hijo termina la tarea que está ejecutando y sale;
+el principal espera a todos antes de salir.
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from django.db import close_old_connections, connections
+
+from . import cola
+
+MANTENIMIENTO = 60
+
+
+class _Bandera:
+    """Se activa con SIGTERM/SIGINT; se consulta entre tareas."""
+
+    def __init__(self):
+        self.activa = False
+
+    def activar(self, signum, frame):
+        self.activa = True
+
+    def instalar(self):
+        signal.signal(signal.SIGTERM, self.activar)
+        signal.signal(signal.SIGINT, self.activar)
+
+
+def identificador():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def bucle(intervalo, hasta_vaciar=False):
+    """Ciclo de un trabajador. Con `hasta_vaciar` sale cuando no quedan tareas pendientes."""
+    parar = _Bandera()
+    parar.instalar()
+    trabajador = identificador()
+    while not parar.activa:
+        # Descarta conexiones rotas o vencidas (CONN_MAX_AGE) entre tarea y tarea
+        close_old_connections()
+        tarea = cola.tomar(trabajador)
+        if tarea is not None:
+            cola.ejecutar(tarea)
+        elif hasta_vaciar:
+            break
+        else:
+            time.sleep(intervalo)
+    connections.close_all()
+
+
+class Pool:
+    def __init__(self, procesos, intervalo, hasta_vaciar=False, salida=None):
+        self.procesos = procesos
+        self.intervalo = intervalo
+        self.hasta_vaciar = hasta_vaciar
+        self.salida = salida or (lambda mensaje: None)
+        # fork: los hijos heredan Django ya configurado
+        self.contexto = multiprocessing.get_context('fork')
+        self.hijos = []
+
+    def _arrancar(self):
+        # El hijo no debe heredar la conexión abierta del principal
+        connections.close_all()
+        hijo = self.contexto.Process(target=bucle, args=(self.intervalo, self.hasta_vaciar), daemon=False)
+        hijo.start()
+        self.salida(f"Trabajador {hijo.pid} iniciado")
+        return hijo
+
+    def _mantenimiento(self):
+        recuperadas = cola.recuperar_colgadas()
+        if recuperadas:
+            self.salida(f"{recuperadas} tareas colgadas devueltas a la cola")
+        for nombre in cola.programar_periodicas():
+            self.salida(f"Tarea periódica encolada: {nombre}")
+        cola.purgar()
+        connections.close_all()
+
+    def ejecutar(self):
+        parar = _Bandera()
+        parar.instalar()
+        self._mantenimiento()
+        self.hijos = [self._arrancar() for _ in range(self.procesos)]
+        ultimo_mantenimiento = time.monotonic()
+
+        while not parar.activa:
+            vivos = [hijo for hijo in self.hijos if hijo.is_alive()]
+            if self.hasta_vaciar:
+                if not vivos:
+                    break
+            else:
+                for hijo in self.hijos:
+                    if not hijo.is_alive():
+                        self.salida(f"Trabajador {hijo.pid} terminó (código {hijo.exitcode}), se reinicia")
+                        vivos.append(self._arrancar())
+            self.hijos = vivos
+            if time.monotonic() - ultimo_mantenimiento >= MANTENIMIENTO:
+                self._mantenimiento()
+                ultimo_mantenimiento = time.monotonic()
+            time.sleep(1)
+
+        for hijo in self.hijos:
+            if hijo.is_alive():
+                hijo.terminate()  # SIGTERM: termina la tarea en curso y sale
+        for hijo in self.hijos:
+            hijo.join()
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'tareas'
+
+urlpatterns = [
+    path('', views.TareaListView.as_view(), name='lista'),
+    path('<int:pk>/', views.TareaDetailView.as_view(), name='detalle'),
+    path('<int:pk>/<str:accion>/', views.TareaAccionView.as_view(), name='accion'),
+]
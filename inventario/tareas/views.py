@@ -0,0 +1,68 @@
+from django.contrib import messages
+from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.db.models import Count
+from django.shortcuts import get_object_or_404, redirect
+from django.views import View
+from django.views.generic import DetailView, ListView
+
+from . import cola
+from .models import Tarea
+
+
+class TareaListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+    """Estado de la cola de tareas, filtrable por estado y nombre."""
+    permission_required = 'tareas.view_tarea'
+    model = Tarea
+    template_name = 'tareas/lista.html'
+    context_object_name = 'tareas'
+    paginate_by = 50
+
+    def get_queryset(self):
+        queryset = super().get_queryset().defer('argumentos', 'resultado', 'error')
+        estado = self.request.GET.get('estado')
+        if estado:
+            queryset = queryset.filter(estado=estado)
+        nombre = self.request.GET.get('nombre')
+        if nombre:
+            queryset = queryset.filter(nombre=nombre)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Un GROUP BY para los contadores de la cabecera
+        cantidades = dict(Tarea.objects.order_by().values_list('estado').annotate(n=Count('id')))
+        context['estados'] = [(clave, etiqueta, cantidades.get(clave, 0)) for clave, etiqueta in Tarea.ESTADO_CHOICES]
+        context['nombres'] = cola.registradas()
+        # Mantener filtros en la paginación
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['querystring'] = params.urlencode()
+        return context
+
+
+class TareaDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
+    """Argumentos, resultado y último error de una tarea."""
+    permission_required = 'tareas.view_tarea'
+    model = Tarea
+    template_name = 'tareas/detalle.html'
+    context_object_name = 'tarea'
+
+
+class TareaAccionView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """Reintenta una tarea fallida o cancela una pendiente."""
+    permission_required = 'tareas.change_tarea'
+    ACCIONES = {
+        'reintentar': (cola.reintentar, "Tarea encolada nuevamente", "Solo se reintentan tareas fallidas o canceladas"),
+        'cancelar': (cola.cancelar, "Tarea cancelada", "Solo se cancelan tareas que todavía no empezaron"),
+    }
+
+    def post(self, request, pk, accion):
+        tarea = get_object_or_404(Tarea, pk=pk)
+        if accion not in self.ACCIONES:
+            return redirect('tareas:detalle', pk=tarea.pk)
+        funcion, exito, error = self.ACCIONES[accion]
+        if funcion(tarea.pk):
+            messages.success(request, exito)
+        else:
+            messages.warning(request, error)
+        return redirect('tareas:detalle', pk=tarea.pk)
@@ -1,3 +1,87 @@
 from django.contrib import admin
 
+from inventario.admin_escalable import AdminEscalable
+from .models import ItemVenta, PrecioEfectivo, ReglaPrecio, Venta
+
+
+class ItemVentaInline(admin.TabularInline):
+    """Solo lectura: una venta ya registrada no se edita (el stock y las estadísticas ya se movieron)."""
+    model = ItemVenta
+    fields = ['producto', 'deposito', 'cantidad', 'precio_unitario', 'subtotal']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('producto', 'deposito')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # Register your models here.
+@admin.register(Venta)
+class VentaAdmin(AdminEscalable):
+    """Solo lectura, como sus líneas."""
+    list_display = ['codigo', 'fecha', 'cliente', 'total']
+    list_select_related = ['cliente']
+    search_fields = ['=codigo', '=cliente__documento']
+    date_hierarchy = 'fecha'
+    ordering = ['-fecha']
+    sortable_by = ['fecha']
+    inlines = [ItemVentaInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ItemVenta)
+class ItemVentaAdmin(AdminEscalable):
+    list_display = ['venta', 'producto', 'deposito', 'cantidad', 'precio_unitario', 'subtotal']
+    list_select_related = ['venta', 'producto', 'deposito']
+    search_fields = ['=venta__codigo', '=producto__sku', '^producto__nombre']
+    ordering = ['-id']
+    sortable_by = []
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ReglaPrecio)
+class ReglaPrecioAdmin(AdminEscalable):
+    """Al guardar o borrar una regla se recompilan los precios efectivos que afecta (ver ventas/signals.py)."""
+    list_display = ['__str__', 'cliente', 'producto', 'cantidad_minima', 'tipo', 'valor', 'activa']
+    list_select_related = ['cliente', 'producto']
+    list_filter = ['activa', 'tipo']
+    search_fields = ['=cliente__documento', '^cliente__apellido', '=producto__sku', '^producto__nombre']
+    autocomplete_fields = ['cliente', 'producto']
+
+
+@admin.register(PrecioEfectivo)
+class PrecioEfectivoAdmin(AdminEscalable):
+    """Solo lectura: la escribe ventas/listas_precios.py."""
+    list_display = ['producto', 'cliente', 'cantidad_minima', 'precio', 'precio_base']
+    list_select_related = ['producto', 'cliente']
+    search_fields = ['=producto__sku', '^producto__nombre']
+    ordering = ['-id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -1,6 +1,7 @@
 from django import forms
 from django.forms import inlineformset_factory
 from .models import Venta, ItemVenta
+from productos.models import Deposito
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit
 
@@ -14,10 +15,25 @@ class VentaForm(forms.ModelForm):
         self.helper = FormHelper()
         self.helper.add_input(Submit('submit', 'Registrar Venta'))
 
+class ItemVentaForm(forms.ModelForm):
+    class Meta:
+        model = ItemVenta
+        fields = ['producto', 'deposito', 'cantidad', 'precio_unitario']
+        help_texts = {
+            'deposito': "Vacío: depósito principal",
+            'precio_unitario': "Vacío: precio de lista del cliente",
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['deposito'].queryset = Deposito.objects.filter(activo=True)
+        self.fields['precio_unitario'].required = False
+
+
 # Formset para los items de la venta
 ItemVentaFormSet = inlineformset_factory(
     Venta, ItemVenta,
-    fields=['producto', 'cantidad', 'precio_unitario'],
+    form=ItemVentaForm,
     extra=1,
     can_delete=True
 )
@@ -0,0 +1,222 @@
+# -----------------------------------------------------------------------------
+# ventas/listas_precios.py
+# Listas de precios: reglas por cliente, producto y cantidad, compiladas en
+# una tabla de precios efectivos.
+# -----------------------------------------------------------------------------
+"""
+Las reglas (ReglaPrecio) no se evalúan al vender. Se compilan en
+PrecioEfectivo: por producto, una escala general (cliente vacío) y una
+escala por cliente solo donde ese cliente tiene reglas que cambian algo.
+Cada escala es una lista de (cantidad_minima, precio); el precio de una
+línea es el del mayor escalón que no supera la cantidad.
+
+- Entre las reglas que aplican a una cantidad gana el precio más bajo, y
+  nunca se cobra más que Producto.precio.
+- La cantidad es el total del producto en la venta, no la de cada línea.
+- `buscar()` resuelve todos los precios de una venta (o de un lote de
+  ventas) con una sola consulta.
+- Cada fila guarda el Producto.precio con el que se compiló: si el precio
+  cambió y la recompilación todavía no corrió (o falló), `buscar()` ignora
+  esas filas y calcula la escala en el momento con las reglas vigentes.
+
+La tabla se rehace de forma incremental con la tarea ventas.recompilar_precios,
+que se encola al cambiar el precio de un producto (señal precio_modificado)
+o una regla, solo para el alcance afectado: los productos de la regla, todos
+los productos de un cliente o, para una regla general sobre todos los
+productos, la tabla completa. El comando recompilar_precios la rehace entera.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from productos.models import Producto
+from tareas import cola
+from .models import PrecioEfectivo, ReglaPrecio
+
+TAMANIO_LOTE = 500
+CENTAVOS = Decimal('0.01')
+
+
+def _precio(base, regla):
+    if regla.tipo == ReglaPrecio.DESCUENTO:
+        return (base * (100 - regla.valor) / 100).quantize(CENTAVOS)
+    return regla.valor
+
+
+def escala(base, reglas):
+    """[(cantidad_minima, precio)] para un precio base y las reglas que le aplican."""
+    filas = []
+    for umbral in sorted({1} | {r.cantidad_minima for r in reglas}):
+        precio = min([base] + [_precio(base, r) for r in reglas if r.cantidad_minima <= umbral])
+        # Un escalón que no baja el precio no hace falta
+        if not filas or precio != filas[-1][1]:
+            filas.append((umbral, precio))
+    return filas
+
+
+# -----------------------------------------------------------------------------
+# Compilación
+# -----------------------------------------------------------------------------
+def _compilar_lote(productos, cliente_id=None):
+    """
+    Rehace las filas de esos productos: todas o, con `cliente_id`, solo las
+    de ese cliente. Devuelve la cantidad de filas escritas.
+    """
+    ids = [p.pk for p in productos]
+    reglas = ReglaPrecio.objects.filter(activa=True).filter(Q(producto_id__in=ids) | Q(producto__isnull=True))
+    anteriores = PrecioEfectivo.objects.filter(producto_id__in=ids)
+    if cliente_id is not None:
+        reglas = reglas.filter(Q(cliente__isnull=True) | Q(cliente_id=cliente_id))
+        anteriores = anteriores.filter(cliente_id=cliente_id)
+
+    generales = defaultdict(list)  # producto_id (None: todos) -> reglas
+    por_cliente = defaultdict(lambda: defaultdict(list))  # cliente_id -> producto_id -> reglas
+    for regla in reglas:
+        if regla.cliente_id is None:
+            generales[regla.producto_id].append(regla)
+        else:
+            por_cliente[regla.cliente_id][regla.producto_id].append(regla)
+
+    nuevas = []
+    for producto in productos:
+        propias_generales = generales[None] + generales[producto.pk]
+        general = escala(producto.precio, propias_generales)
+        if cliente_id is None:
+            nuevas.extend(
+                PrecioEfectivo(
+                    producto_id=producto.pk, cantidad_minima=umbral, precio=precio, precio_base=producto.precio,
+                )
+                for umbral, precio in general
+            )
+        for cliente, reglas_cliente in por_cliente.items():
+            propias = reglas_cliente[None] + reglas_cliente[producto.pk]
+            if not propias:
+                continue
+            filas = escala(producto.precio, propias_generales + propias)
+            if filas != general:
+                nuevas.extend(
+                    PrecioEfectivo(
+                        producto_id=producto.pk, cliente_id=cliente, cantidad_minima=umbral, precio=precio,
+                        precio_base=producto.precio,
+                    )
+                    for umbral, precio in filas
+                )
+
+    with transaction.atomic():
+        anteriores.delete()
+        PrecioEfectivo.objects.bulk_create(nuevas, batch_size=TAMANIO_LOTE)
+    return len(nuevas)
+
+
+def recompilar(producto_ids=None, cliente_id=None, tamanio_lote=TAMANIO_LOTE):
+    """
+    Rehace los precios efectivos de los productos indicados (todos si no se
+    indican), y solo los de `cliente_id` si se indica. Un lote de productos
+    por transacción. Devuelve la cantidad de filas escritas.
+    """
+    if producto_ids is not None:
+        # Los productos archivados solo pierden sus filas
+        PrecioEfectivo.objects.filter(producto_id__in=producto_ids).exclude(
+            producto_id__in=Producto.objects.filter(pk__in=producto_ids).values('pk')
+        ).delete()
+    escritas = 0
+    ultimo = 0
+    while True:
+        productos = Producto.objects.filter(pk__gt=ultimo).order_by('pk').only('pk', 'precio')
+        if producto_ids is not None:
+            productos = productos.filter(pk__in=producto_ids)
+        productos = list(productos[:tamanio_lote])
+        if not productos:
+            return escritas
+        escritas += _compilar_lote(productos, cliente_id)
+        ultimo = productos[-1].pk
+
+
+def _alcance(producto_id, cliente_id):
+    """Argumentos de recompilar() para lo que puede cambiar una regla con ese cliente y producto."""
+    if producto_id is not None:
+        return {'producto_ids': [producto_id]}
+    if cliente_id is not None:
+        return {'cliente_id': cliente_id}
+    return {}
+
+
+def programar(producto_ids=None, cliente_id=None):
+    """Encola la recompilación para ese alcance (ver recompilar)."""
+    cola.encolar('ventas.recompilar_precios', producto_ids=producto_ids, cliente_id=cliente_id)
+
+
+def programar_regla(*reglas):
+    """Encola la recompilación de lo que afectan las reglas (una regla y su versión anterior, por ejemplo)."""
+    alcances = []
+    for regla in reglas:
+        alcance = _alcance(regla.producto_id, regla.cliente_id)
+        if alcance not in alcances:
+            alcances.append(alcance)
+    if {} in alcances:
+        alcances = [{}]  # la tabla completa cubre cualquier otro alcance
+    for alcance in alcances:
+        programar(**alcance)
+
+
+# -----------------------------------------------------------------------------
+# Consulta
+# -----------------------------------------------------------------------------
+def _escalon(filas, cantidad):
+    # Todas las escalas empiezan en 1
+    return max(f for f in filas if f[0] <= max(cantidad, 1))[1]
+
+
+def buscar(pedidos):
+    """
+    Precios unitarios de varias líneas con una consulta.
+    pedidos: (cliente_id, producto_id, cantidad total del producto en la venta).
+    Devuelve {(cliente_id, producto_id, cantidad): precio}. Un producto sin
+    filas compiladas con su precio actual (recién creado o con la
+    recompilación pendiente) se calcula en el momento (ver _en_vivo).
+    """
+    pedidos = set(pedidos)
+    if not pedidos:
+        return {}
+    clientes = {cliente for cliente, _, _ in pedidos}
+    productos = {producto for _, producto, _ in pedidos}
+    escalas = defaultdict(list)  # (cliente_id o None, producto_id) -> [(cantidad_minima, precio)]
+    for cliente, producto, umbral, precio in (
+        PrecioEfectivo.objects.filter(producto_id__in=productos, precio_base=F('producto__precio'))
+        .filter(Q(cliente__isnull=True) | Q(cliente_id__in=clientes))
+        .values_list('cliente_id', 'producto_id', 'cantidad_minima', 'precio')
+    ):
+        escalas[cliente, producto].append((umbral, precio))
+
+    resultado = {}
+    for cliente, producto, cantidad in pedidos:
+        # La escala general está siempre que el producto está compilado
+        if (None, producto) in escalas:
+            filas = escalas.get((cliente, producto)) or escalas[None, producto]
+            resultado[cliente, producto, cantidad] = _escalon(filas, cantidad)
+    faltantes = [clave for clave in pedidos if clave not in resultado]
+    if faltantes:
+        resultado.update(_en_vivo(faltantes))
+    return resultado
+
+
+def _en_vivo(pedidos):
+    """Como buscar(), pero aplicando las reglas activas al precio actual del producto."""
+    productos = {producto for _, producto, _ in pedidos}
+    clientes = {cliente for cliente, _, _ in pedidos}
+    base = dict(Producto.todos.filter(pk__in=productos).values_list('pk', 'precio'))
+    reglas = list(
+        ReglaPrecio.objects.filter(activa=True)
+        .filter(Q(producto_id__in=productos) | Q(producto__isnull=True))
+        .filter(Q(cliente_id__in=clientes) | Q(cliente__isnull=True))
+    )
+    resultado = {}
+    for clave in pedidos:
+        cliente, producto, cantidad = clave
+        if producto not in base:
+            continue
+        propias = [r for r in reglas if r.producto_id in (None, producto) and r.cliente_id in (None, cliente)]
+        resultado[clave] = _escalon(escala(base[producto], propias), cantidad)
+    return resultado
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ventas import listas_precios
+
+
+class Command(BaseCommand):
+    help = (
+        'Rehace la tabla de precios efectivos a partir de las reglas de precio. '
+        'Normalmente se mantiene sola; sirve después de cargar reglas a mano o restaurar datos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--producto', type=int, action='append', dest='productos', help='Solo estos productos')
+        parser.add_argument('--cliente', type=int, help='Solo las filas de este cliente')
+        parser.add_argument('--lote', type=int, default=listas_precios.TAMANIO_LOTE, help='Productos por transacción')
+
+    def handle(self, *args, **options):
+        filas = listas_precios.recompilar(options['productos'], options['cliente'], options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{filas} precios efectivos escritos'))
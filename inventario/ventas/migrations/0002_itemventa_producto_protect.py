@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0010_archivado'),
+        ('ventas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='itemventa',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='productos.producto'),
+        ),
+    ]
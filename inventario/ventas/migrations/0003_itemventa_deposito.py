@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_depositos'),
+        ('ventas', '0002_itemventa_producto_protect'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemventa',
+            name='deposito',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='productos.deposito'),
+        ),
+    ]
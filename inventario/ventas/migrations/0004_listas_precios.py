@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def precios_generales(apps, schema_editor):
+    """Sin reglas todavía, el precio efectivo de cada producto es su precio."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO ventas_precioefectivo (producto_id, cliente_id, cantidad_minima, precio) "
+            "SELECT id, NULL, 1, precio FROM productos_producto WHERE NOT archivado"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_estadisticas_compras'),
+        ('productos', '0013_depositos'),
+        ('ventas', '0003_itemventa_deposito'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecioEfectivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad_minima', models.PositiveIntegerField(verbose_name='Desde cantidad')),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Precio')),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='clientes.cliente')),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Precio Efectivo',
+                'verbose_name_plural': 'Precios Efectivos',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('cliente__isnull', False)), fields=('producto', 'cliente', 'cantidad_minima'), name='precioefectivo_cliente_unico'), models.UniqueConstraint(condition=models.Q(('cliente__isnull', True)), fields=('producto', 'cantidad_minima'), name='precioefectivo_general_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReglaPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad_minima', models.PositiveIntegerField(default=1, verbose_name='Desde cantidad')),
+                ('tipo', models.CharField(choices=[('descuento', 'Descuento %'), ('precio', 'Precio fijo')], default='descuento', max_length=10, verbose_name='Tipo')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Valor')),
+                ('activa', models.BooleanField(default=True, verbose_name='Activa')),
+                ('cliente', models.ForeignKey(blank=True, help_text='Vacío: todos los clientes', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reglas_precio', to='clientes.cliente')),
+                ('producto', models.ForeignKey(blank=True, help_text='Vacío: todos los productos', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reglas_precio', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Regla de Precio',
+                'verbose_name_plural': 'Reglas de Precio',
+                'constraints': [models.CheckConstraint(condition=models.Q(('cantidad_minima__gte', 1)), name='reglaprecio_cantidad_minima'), models.CheckConstraint(condition=models.Q(('valor__gte', 0), models.Q(models.Q(('tipo', 'descuento'), _negated=True), ('valor__lte', 100), _connector='OR')), name='reglaprecio_valor_valido', violation_error_message='El descuento debe estar entre 0 y 100 y el precio no puede ser negativo.')],
+            },
+        ),
+        migrations.RunPython(precios_generales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_estadisticas_compras'),
+        ('ventas', '0004_listas_precios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['-fecha', '-id'], name='venta_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_precio_base(apps, schema_editor):
+    # Las filas existentes se compilaron con el precio actual del producto
+    PrecioEfectivo = apps.get_model('ventas', 'PrecioEfectivo')
+    Producto = apps.get_model('productos', 'Producto')
+    PrecioEfectivo.objects.update(
+        precio_base=Subquery(Producto.objects.filter(pk=OuterRef('producto_id')).values('precio')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0014_admin_indices'),
+        ('ventas', '0005_venta_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='precioefectivo',
+            name='precio_base',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Precio base'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copiar_precio_base, migrations.RunPython.noop),
+    ]
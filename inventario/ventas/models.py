@@ -1,19 +1,29 @@
 from django.db import models
 from clientes.models import Cliente
-from productos.models import Producto
+from productos.models import Deposito, Producto
+from inventario.seguimiento import SeguimientoCambiosMixin
 
-class Venta(models.Model):
+class Venta(SeguimientoCambiosMixin, models.Model):
     codigo = models.CharField(max_length=20, unique=True)
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     fecha = models.DateField(auto_now_add=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            # Listado y jerarquía de fechas del admin
+            models.Index(fields=['-fecha', '-id'], name='venta_fecha_idx'),
+        ]
+
     def __str__(self):
         return self.codigo
 
-class ItemVenta(models.Model):
+class ItemVenta(SeguimientoCambiosMixin, models.Model):
     venta = models.ForeignKey(Venta, on_delete=models.CASCADE, related_name='items')
-    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    # PROTECT: un producto con ventas solo se archiva, nunca se borra
+    producto = models.ForeignKey(Producto, on_delete=models.PROTECT)
+    # Depósito del que salió la mercadería; vacío en las ventas anteriores (principal)
+    deposito = models.ForeignKey(Deposito, on_delete=models.PROTECT, blank=True, null=True)
     cantidad = models.PositiveIntegerField()
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -23,4 +33,83 @@ class ItemVenta(models.Model):
         self.subtotal = self.cantidad * self.precio_unitario
         super().save(*args, **kwargs)
 
-# Create your models here.
+
+class ReglaPrecio(models.Model):
+    """
+    Regla de la lista de precios: descuento o precio fijo para un cliente y/o
+    un producto desde cierta cantidad. Cliente vacío: todos los clientes;
+    producto vacío: todos los productos. Las reglas se compilan en
+    PrecioEfectivo (ver ventas/listas_precios.py).
+    """
+
+    DESCUENTO = 'descuento'
+    PRECIO_FIJO = 'precio'
+    TIPO_CHOICES = [
+        (DESCUENTO, "Descuento %"),
+        (PRECIO_FIJO, "Precio fijo"),
+    ]
+
+    cliente = models.ForeignKey(
+        Cliente, on_delete=models.CASCADE, blank=True, null=True, related_name='reglas_precio',
+        help_text="Vacío: todos los clientes",
+    )
+    producto = models.ForeignKey(
+        Producto, on_delete=models.CASCADE, blank=True, null=True, related_name='reglas_precio',
+        help_text="Vacío: todos los productos",
+    )
+    cantidad_minima = models.PositiveIntegerField("Desde cantidad", default=1)
+    tipo = models.CharField("Tipo", max_length=10, choices=TIPO_CHOICES, default=DESCUENTO)
+    valor = models.DecimalField("Valor", max_digits=10, decimal_places=2)
+    activa = models.BooleanField("Activa", default=True)
+
+    class Meta:
+        verbose_name = 'Regla de Precio'
+        verbose_name_plural = 'Reglas de Precio'
+        constraints = [
+            models.CheckConstraint(condition=models.Q(cantidad_minima__gte=1), name='reglaprecio_cantidad_minima'),
+            models.CheckConstraint(
+                condition=models.Q(valor__gte=0) & (~models.Q(tipo='descuento') | models.Q(valor__lte=100)),
+                name='reglaprecio_valor_valido',
+                violation_error_message="El descuento debe estar entre 0 y 100 y el precio no puede ser negativo.",
+            ),
+        ]
+
+    def __str__(self):
+        alcance = f"{self.cliente or 'Todos'} / {self.producto or 'Todos'}"
+        valor = f"-{self.valor}%" if self.tipo == self.DESCUENTO else f"${self.valor}"
+        return f"{alcance} desde {self.cantidad_minima}: {valor}"
+
+
+class PrecioEfectivo(models.Model):
+    """
+    Precio unitario compilado de un producto para un cliente (vacío: el
+    general) a partir de `cantidad_minima` unidades. Lo escribe solo
+    ventas/listas_precios.py.
+    """
+
+    # Sin índices propios: los cubren los índices únicos (producto, ...)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+', db_index=False)
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    cantidad_minima = models.PositiveIntegerField("Desde cantidad")
+    precio = models.DecimalField("Precio", max_digits=10, decimal_places=2)
+    # Producto.precio con el que se compiló: si ya no coincide, la fila no se usa
+    precio_base = models.DecimalField("Precio base", max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Precio Efectivo'
+        verbose_name_plural = 'Precios Efectivos'
+        # Índices parciales: NULL no se compara en un índice único
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'cliente', 'cantidad_minima'], condition=models.Q(cliente__isnull=False),
+                name='precioefectivo_cliente_unico',
+            ),
+            models.UniqueConstraint(
+                fields=['producto', 'cantidad_minima'], condition=models.Q(cliente__isnull=True),
+                name='precioefectivo_general_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} / {self.cliente_id or '-'} desde {self.cantidad_minima}: {self.precio}"
+
@@ -0,0 +1,317 @@
+"""
+Registro de ventas en lote para las terminales de sucursal que trabajan sin
+conexión y envían las ventas acumuladas todas juntas.
+
+El código de cada venta es su clave de idempotencia: si ya existe, la venta se
+informa como duplicada y no se vuelve a registrar, así un reintento no la
+duplica. Todo el lote se procesa en una transacción: se bloquean los
+productos involucrados y sus filas de stock por depósito, se asigna el stock
+venta por venta (las que no alcanzan se rechazan), se descuenta lo de cada
+producto y depósito con una sola escritura y ventas, items y movimientos se
+insertan con bulk_create.
+
+Cada venta puede indicar el `deposito` del que sale la mercadería; sin él se
+usa el principal. Los items sin `precio_unitario` toman el precio de la
+lista del cliente (ver listas_precios.py), todos con una sola consulta.
+
+Precio, cantidad, subtotal y total se validan contra el rango de sus
+columnas: una venta que no entra se rechaza sola, sin hacer fallar el lote.
+"""
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+
+from clientes import estadisticas
+from clientes.models import Cliente
+from inventario import metricas
+from productos import kpis, stock
+from productos.models import Deposito, MovimientoStock, Producto, StockDeposito, StockShard
+from .models import ItemVenta, Venta
+from . import listas_precios
+
+MAX_VENTAS_POR_LOTE = 500
+TAMANIO_LOTE = 1000
+
+CREADA = 'creada'
+DUPLICADA = 'duplicada'
+RECHAZADA = 'rechazada'
+
+CENTAVO = Decimal('0.01')
+
+
+def _tope(modelo, campo):
+    """Primer valor que ya no entra en el DecimalField `campo` del modelo."""
+    campo = modelo._meta.get_field(campo)
+    return Decimal(10) ** (campo.max_digits - campo.decimal_places)
+
+
+PRECIO_TOPE = _tope(ItemVenta, 'precio_unitario')
+SUBTOTAL_TOPE = _tope(ItemVenta, 'subtotal')
+TOTAL_TOPE = _tope(Venta, 'total')
+
+
+def _cantidad_maxima():
+    return connection.ops.integer_field_range(ItemVenta._meta.get_field('cantidad').get_internal_type())[1]
+
+
+def _validar(datos, codigo_max):
+    """Devuelve (codigo, cliente_id, deposito_id, items, errores) con los items normalizados."""
+    errores = []
+    codigo = str(datos.get('codigo') or '').strip()
+    if not codigo:
+        errores.append("Falta el código de la venta")
+    elif len(codigo) > codigo_max:
+        errores.append(f"El código no puede tener más de {codigo_max} caracteres")
+
+    try:
+        cliente_id = int(datos.get('cliente'))
+    except (TypeError, ValueError):
+        cliente_id = None
+        errores.append("Cliente inválido")
+
+    deposito_id = None
+    if datos.get('deposito') not in (None, ''):
+        try:
+            deposito_id = int(datos['deposito'])
+        except (TypeError, ValueError):
+            errores.append("Depósito inválido")
+
+    items = []
+    cantidad_maxima = _cantidad_maxima()
+    items_recibidos = datos.get('items') or []
+    if not isinstance(items_recibidos, list):
+        errores.append("Los items deben ser una lista")
+        items_recibidos = []
+    for numero, item in enumerate(items_recibidos, start=1):
+        if not isinstance(item, dict):
+            errores.append(f"Item {numero}: datos inválidos")
+            continue
+        try:
+            producto_id = int(item['producto'])
+            cantidad = int(item['cantidad'])
+            # Sin precio se usa el de la lista de precios del cliente
+            precio = item.get('precio_unitario')
+            precio = None if precio in (None, '') else Decimal(str(precio)).quantize(CENTAVO)
+        except (KeyError, TypeError, ValueError, InvalidOperation, AttributeError):
+            errores.append(f"Item {numero}: datos inválidos")
+            continue
+        if cantidad <= 0:
+            errores.append(f"Item {numero}: la cantidad debe ser mayor a cero")
+        elif cantidad_maxima is not None and cantidad > cantidad_maxima:
+            errores.append(f"Item {numero}: la cantidad no puede superar {cantidad_maxima}")
+        elif precio is not None and (not precio.is_finite() or not 0 <= precio < PRECIO_TOPE):
+            errores.append(f"Item {numero}: precio inválido")
+        else:
+            items.append((producto_id, cantidad, precio))
+    if not items and not errores:
+        errores.append("La venta no tiene items")
+    return codigo, cliente_id, deposito_id, items, errores
+
+
+def _disponible(productos):
+    """Stock de cada producto (bloqueado), sumando fragmentos en los fragmentados."""
+    disponible = {p.pk: p.stock for p in productos.values() if not p.shards}
+    fragmentados = [p.pk for p in productos.values() if p.shards]
+    if fragmentados:
+        bloqueados = StockShard.objects.select_for_update().filter(producto_id__in=fragmentados)
+        list(bloqueados.order_by('producto_id', 'deposito_id', 'indice'))
+        disponible.update(
+            StockShard.objects.filter(producto_id__in=fragmentados).order_by()
+            .values('producto_id').annotate(total=Sum('stock')).values_list('producto_id', 'total')
+        )
+    return disponible
+
+
+def _disponible_por_deposito(productos, depositos):
+    """
+    {(producto_id, deposito_id): stock} de esas filas, bloqueadas. En los
+    fragmentados, la suma de los fragmentos del depósito (ya bloqueados por
+    _disponible).
+    """
+    simples = [p.pk for p in productos.values() if not p.shards]
+    fragmentados = [p.pk for p in productos.values() if p.shards]
+    disponible = {
+        (fila.producto_id, fila.deposito_id): fila.stock
+        for fila in StockDeposito.objects.select_for_update().filter(
+            producto_id__in=simples, deposito_id__in=depositos
+        ).order_by('deposito_id', 'producto_id')
+    }
+    if fragmentados:
+        disponible.update(
+            ((producto_id, deposito_id), total)
+            for producto_id, deposito_id, total in StockShard.objects.filter(
+                producto_id__in=fragmentados, deposito_id__in=depositos
+            ).order_by().values('producto_id', 'deposito_id').annotate(total=Sum('stock'))
+            .values_list('producto_id', 'deposito_id', 'total')
+        )
+    return disponible
+
+
+def _completar_precios(aceptadas):
+    """Pone el precio de lista en los items que no lo traen, con una consulta para todo el lote."""
+    totales = []
+    for _, _, cliente_id, _, items in aceptadas:
+        por_producto = defaultdict(int)
+        for producto_id, cantidad, _ in items:
+            por_producto[producto_id] += cantidad
+        totales.append(por_producto)
+    precios = listas_precios.buscar(
+        (venta[2], producto_id, cantidad)
+        for venta, por_producto in zip(aceptadas, totales)
+        if any(precio is None for _, _, precio in venta[4])
+        for producto_id, cantidad in por_producto.items()
+    )
+    return [
+        (posicion, codigo, cliente_id, deposito_id, [
+            (producto_id, cantidad,
+             precios[cliente_id, producto_id, por_producto[producto_id]] if precio is None else precio)
+            for producto_id, cantidad, precio in items
+        ])
+        for (posicion, codigo, cliente_id, deposito_id, items), por_producto in zip(aceptadas, totales)
+    ]
+
+
+def _fuera_de_rango(items):
+    """Errores de los subtotales y el total de una venta que no entran en sus columnas."""
+    errores = [
+        f"Item {numero}: el subtotal no puede llegar a {SUBTOTAL_TOPE}"
+        for numero, (_, cantidad, precio) in enumerate(items, start=1)
+        if cantidad * precio >= SUBTOTAL_TOPE
+    ]
+    if not errores and sum(cantidad * precio for _, cantidad, precio in items) >= TOTAL_TOPE:
+        errores.append(f"El total de la venta no puede llegar a {TOTAL_TOPE}")
+    return errores
+
+
+def _procesar(lote, usuario):
+    codigo_max = Venta._meta.get_field('codigo').max_length
+    resultados = [None] * len(lote)
+    pendientes = []  # (posición, codigo, cliente_id, deposito_id, items)
+
+    principal = Deposito.id_principal()
+    vistos = set()
+    for posicion, datos in enumerate(lote):
+        codigo, cliente_id, deposito_id, items, errores = _validar(datos, codigo_max)
+        if errores:
+            resultados[posicion] = {'codigo': codigo, 'estado': RECHAZADA, 'errores': errores}
+        elif codigo in vistos:
+            resultados[posicion] = {'codigo': codigo, 'estado': DUPLICADA, 'errores': ["Código repetido en el lote"]}
+        else:
+            vistos.add(codigo)
+            pendientes.append((posicion, codigo, cliente_id, deposito_id or principal, items))
+
+    # Ventas que ya se registraron en un envío anterior
+    existentes = dict(
+        Venta.objects.filter(codigo__in=[p[1] for p in pendientes]).values_list('codigo', 'pk')
+    )
+    clientes = set(
+        Cliente.objects.filter(pk__in={p[2] for p in pendientes}).values_list('pk', flat=True)
+    )
+    depositos = set(
+        Deposito.objects.filter(pk__in={p[3] for p in pendientes}, activo=True).values_list('pk', flat=True)
+    )
+    productos = {
+        p.pk: p
+        for p in Producto.objects.select_for_update().filter(
+            pk__in={item[0] for p in pendientes for item in p[4]}
+        ).order_by('pk')
+    }
+    # Primero los productos y después sus depósitos, como en productos/stock.py
+    disponible = _disponible(productos)
+    en_deposito = _disponible_por_deposito(productos, depositos)
+
+    candidatas = []
+    for posicion, codigo, cliente_id, deposito_id, items in pendientes:
+        if codigo in existentes:
+            resultados[posicion] = {'codigo': codigo, 'estado': DUPLICADA, 'venta_id': existentes[codigo]}
+            continue
+
+        errores = []
+        if cliente_id not in clientes:
+            errores.append(f"No existe el cliente {cliente_id}")
+        if deposito_id not in depositos:
+            errores.append(f"No existe el depósito {deposito_id} o está inactivo")
+        for producto_id in sorted({item[0] for item in items} - productos.keys()):
+            errores.append(f"No existe el producto {producto_id}")
+        if errores:
+            resultados[posicion] = {'codigo': codigo, 'estado': RECHAZADA, 'errores': errores}
+            continue
+        candidatas.append((posicion, codigo, cliente_id, deposito_id, items))
+
+    # Los precios de lista se completan antes de asignar stock: una venta
+    # cuyo total no entra en las columnas no debe quitarle stock a las demás
+    aceptadas = []
+    descontar = defaultdict(int)  # (producto_id, deposito_id) -> cantidad
+    for posicion, codigo, cliente_id, deposito_id, items in _completar_precios(candidatas):
+        errores = _fuera_de_rango(items)
+        pedido = defaultdict(int)
+        for producto_id, cantidad, _ in items:
+            pedido[producto_id] += cantidad
+        for producto_id, cantidad in pedido.items():
+            if (disponible[producto_id] < cantidad
+                    or en_deposito.get((producto_id, deposito_id), 0) < cantidad):
+                errores.append(f"No hay stock suficiente de {productos[producto_id].nombre} para descontar {cantidad}")
+        if errores:
+            resultados[posicion] = {'codigo': codigo, 'estado': RECHAZADA, 'errores': errores}
+            continue
+
+        for producto_id, cantidad in pedido.items():
+            disponible[producto_id] -= cantidad
+            en_deposito[producto_id, deposito_id] -= cantidad
+            descontar[producto_id, deposito_id] += cantidad
+        aceptadas.append((posicion, codigo, cliente_id, deposito_id, items))
+
+    # Una sola escritura de stock por producto y depósito; las filas ya están bloqueadas
+    for (producto_id, deposito_id), cantidad in sorted(descontar.items()):
+        stock.decrementar(productos[producto_id], cantidad, deposito=deposito_id)
+
+    ventas = Venta.objects.bulk_create(
+        [
+            Venta(codigo=codigo, cliente_id=cliente_id, total=sum(c * p for _, c, p in items))
+            for _, codigo, cliente_id, _, items in aceptadas
+        ],
+        batch_size=TAMANIO_LOTE,
+    )
+    items_venta, movimientos, por_venta = [], [], []
+    for venta, (posicion, codigo, _, deposito_id, items) in zip(ventas, aceptadas):
+        propios = [
+            ItemVenta(venta=venta, producto_id=producto_id, deposito_id=deposito_id, cantidad=cantidad,
+                      precio_unitario=precio, subtotal=cantidad * precio)
+            for producto_id, cantidad, precio in items
+        ]
+        items_venta.extend(propios)
+        por_venta.append((venta, propios))
+        movimientos.extend(
+            MovimientoStock(
+                producto_id=item.producto_id, tipo="salida", cantidad=item.cantidad,
+                motivo=f"Venta {codigo}", usuario=usuario, origen="venta", deposito_id=deposito_id,
+            )
+            for item in propios
+        )
+        resultados[posicion] = {'codigo': codigo, 'estado': CREADA, 'venta_id': venta.pk, 'total': str(venta.total)}
+    ItemVenta.objects.bulk_create(items_venta, batch_size=TAMANIO_LOTE)
+    MovimientoStock.objects.bulk_create(movimientos, batch_size=TAMANIO_LOTE)
+
+    for venta, propios in por_venta:
+        kpis.registrar_venta(venta, propios)
+        metricas.registrar_venta('lote', len(propios))
+    estadisticas.registrar_ventas(ventas)
+    return resultados
+
+
+def registrar_lote(lote, usuario="Sistema"):
+    """
+    Registra una lista de ventas ({'codigo', 'cliente', 'deposito' (opcional),
+    'items': [{'producto', 'cantidad', 'precio_unitario' (opcional)}]}). Devuelve un resultado por venta, en el
+    mismo orden, con estado 'creada', 'duplicada' o 'rechazada'.
+    """
+    try:
+        with transaction.atomic():
+            return _procesar(lote, usuario)
+    except IntegrityError:
+        # Otro envío registró alguno de los mismos códigos al mismo tiempo:
+        # se vuelve a procesar y esas ventas salen como duplicadas
+        with transaction.atomic():
+            return _procesar(lote, usuario)
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from productos.signals import precio_modificado
+from . import listas_precios
+from .models import ReglaPrecio
+
+
+@receiver(precio_modificado)
+def recompilar_precios_productos(sender, producto_ids, **kwargs):
+    listas_precios.programar(producto_ids=list(producto_ids))
+
+
+@receiver(pre_save, sender=ReglaPrecio)
+def recordar_regla_anterior(sender, instance, raw=False, **kwargs):
+    # Si la regla cambia de cliente o producto, también hay que rehacer lo que cubría antes
+    instance._anterior = None if raw or instance.pk is None else ReglaPrecio.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=ReglaPrecio)
+def regla_guardada(sender, instance, raw=False, **kwargs):
+    if not raw:
+        anterior = getattr(instance, '_anterior', None)
+        listas_precios.programar_regla(instance, *([anterior] if anterior else []))
+
+
+@receiver(post_delete, sender=ReglaPrecio)
+def regla_eliminada(sender, instance, **kwargs):
+    listas_precios.programar_regla(instance)
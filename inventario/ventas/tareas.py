@@ -0,0 +1,9 @@
+# Tareas en segundo plano de ventas (ver tareas/cola.py)
+from tareas.cola import tarea
+
+from . import listas_precios
+
+
+@tarea(prioridad=10)
+def recompilar_precios(producto_ids=None, cliente_id=None):
+    return {'filas': listas_precios.recompilar(producto_ids, cliente_id)}
@@ -1,3 +1,176 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from clientes.models import Cliente
+from productos import stock
+from productos.models import Deposito, MovimientoStock, Producto, StockDeposito
+from . import listas_precios, registro
+from .models import ItemVenta, PrecioEfectivo, ReglaPrecio, Venta
+
+
+class BaseVentasTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='1', email='ana@example.com')
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='1 kg', precio=Decimal('10.00'), stock=10)
+
+    def venta(self, codigo, cantidad, **extra):
+        return {
+            'codigo': codigo, 'cliente': self.cliente.pk,
+            'items': [{'producto': self.producto.pk, 'cantidad': cantidad, 'precio_unitario': '10.00'}],
+            **extra,
+        }
+
+    def stock_actual(self):
+        return Producto.objects.get(pk=self.producto.pk).stock
+
+
+class RegistroLoteTests(BaseVentasTest):
+    def test_crea_ventas_items_y_movimientos(self):
+        resultados = registro.registrar_lote([self.venta('A1', 3), self.venta('A2', 2)])
+        self.assertEqual([r['estado'] for r in resultados], [registro.CREADA, registro.CREADA])
+        self.assertEqual(self.stock_actual(), 5)
+        self.assertEqual(ItemVenta.objects.count(), 2)
+        self.assertEqual(MovimientoStock.objects.filter(origen='venta').count(), 2)
+        self.assertEqual(Venta.objects.get(codigo='A1').total, Decimal('30.00'))
+
+    def test_reenviar_el_lote_no_duplica_ventas(self):
+        lote = [self.venta('A1', 3)]
+        primero = registro.registrar_lote(lote)
+        segundo = registro.registrar_lote(lote)
+        self.assertEqual(segundo[0]['estado'], registro.DUPLICADA)
+        self.assertEqual(segundo[0]['venta_id'], primero[0]['venta_id'])
+        self.assertEqual(Venta.objects.count(), 1)
+        self.assertEqual(self.stock_actual(), 7)
+
+    def test_codigo_repetido_en_el_lote(self):
+        resultados = registro.registrar_lote([self.venta('A1', 1), self.venta('A1', 1)])
+        self.assertEqual([r['estado'] for r in resultados], [registro.CREADA, registro.DUPLICADA])
+        self.assertEqual(self.stock_actual(), 9)
+
+    def test_sin_stock_rechaza_la_venta_sin_dejar_negativo(self):
+        resultados = registro.registrar_lote([self.venta('A1', 6), self.venta('A2', 6)])
+        self.assertEqual([r['estado'] for r in resultados], [registro.CREADA, registro.RECHAZADA])
+        self.assertEqual(self.stock_actual(), 4)
+        self.assertFalse(Venta.objects.filter(codigo='A2').exists())
+
+    def test_items_invalidos(self):
+        lote = [
+            {'codigo': 'A1', 'cliente': self.cliente.pk, 'items': {'producto': self.producto.pk}},
+            {'codigo': 'A2', 'cliente': self.cliente.pk, 'items': ['x']},
+            self.venta('A3', 0),
+        ]
+        resultados = registro.registrar_lote(lote)
+        self.assertEqual([r['estado'] for r in resultados], [registro.RECHAZADA] * 3)
+        self.assertIn("Los items deben ser una lista", resultados[0]['errores'])
+        self.assertIn("Item 1: datos inválidos", resultados[1]['errores'])
+        self.assertEqual(self.stock_actual(), 10)
+
+    def test_precio_cantidad_y_totales_fuera_de_rango(self):
+        lote = [
+            self.venta('A1', 1, items=[{'producto': self.producto.pk, 'cantidad': 1, 'precio_unitario': '1e30'}]),
+            self.venta('A2', 1, items=[{'producto': self.producto.pk, 'cantidad': 1, 'precio_unitario': 'NaN'}]),
+            self.venta('A3', 1, items=[
+                {'producto': self.producto.pk, 'cantidad': 1, 'precio_unitario': '100000000.00'},
+            ]),
+            self.venta('A4', 1, items=[{'producto': self.producto.pk, 'cantidad': 2 ** 63, 'precio_unitario': '1'}]),
+            self.venta('A5', 1, items=[
+                {'producto': self.producto.pk, 'cantidad': 2, 'precio_unitario': '60000000.00'},
+            ]),
+            self.venta('A6', 1, items=[
+                {'producto': self.producto.pk, 'cantidad': 1, 'precio_unitario': '60000000.00'},
+                {'producto': self.producto.pk, 'cantidad': 1, 'precio_unitario': '60000000.00'},
+            ]),
+            self.venta('A7', 2),
+        ]
+        resultados = registro.registrar_lote(lote)
+        self.assertEqual([r['estado'] for r in resultados], [registro.RECHAZADA] * 6 + [registro.CREADA])
+        self.assertEqual(resultados[0]['errores'], ["Item 1: datos inválidos"])
+        self.assertEqual(resultados[1]['errores'], ["Item 1: precio inválido"])
+        self.assertEqual(resultados[2]['errores'], ["Item 1: precio inválido"])
+        self.assertIn("la cantidad no puede superar", resultados[3]['errores'][0])
+        self.assertIn("el subtotal no puede llegar", resultados[4]['errores'][0])
+        self.assertIn("El total de la venta no puede llegar", resultados[5]['errores'][0])
+        # Las rechazadas no tomaron stock
+        self.assertEqual(self.stock_actual(), 8)
+
+    def test_descuenta_del_deposito_indicado(self):
+        sucursal = Deposito.objects.create(nombre='Sucursal', codigo='SUC')
+        stock.transferir(self.producto, None, sucursal, 4)
+        resultados = registro.registrar_lote(
+            [self.venta('A1', 3, deposito=sucursal.pk), self.venta('A2', 2, deposito=sucursal.pk)]
+        )
+        self.assertEqual([r['estado'] for r in resultados], [registro.CREADA, registro.RECHAZADA])
+        self.assertEqual(StockDeposito.objects.get(producto=self.producto, deposito=sucursal).stock, 1)
+        self.assertEqual(self.stock_actual(), 7)
+
+    def test_productos_fragmentados(self):
+        stock.activar_fragmentos(self.producto, 4)
+        resultados = registro.registrar_lote([self.venta('A1', 7), self.venta('A2', 4)])
+        self.assertEqual([r['estado'] for r in resultados], [registro.CREADA, registro.RECHAZADA])
+        cache.clear()
+        self.assertEqual(stock.stock_total(Producto.objects.get(pk=self.producto.pk)), 3)
+
+
+class RegistroLoteVistaTests(BaseVentasTest):
+    def setUp(self):
+        super().setUp()
+        usuario = User.objects.create_user('terminal', password='x')
+        usuario.user_permissions.add(Permission.objects.get(codename='add_venta'))
+        self.client.force_login(usuario)
+
+    def enviar(self, datos):
+        return self.client.post(reverse('ventas:registrar_lote'), json.dumps(datos), content_type='application/json')
+
+    def test_registra_el_lote(self):
+        respuesta = self.enviar({'ventas': [self.venta('A1', 2)]})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['resultados'][0]['estado'], registro.CREADA)
+
+    def test_rechaza_un_cuerpo_invalido(self):
+        self.assertEqual(self.enviar({'otra': []}).status_code, 400)
+        self.assertEqual(self.enviar({'ventas': ['x']}).status_code, 400)
+        self.assertEqual(self.enviar({'ventas': [{}] * (registro.MAX_VENTAS_POR_LOTE + 1)}).status_code, 400)
+
+
+class ListasPreciosTests(BaseVentasTest):
+    def setUp(self):
+        super().setUp()
+        self.otro = Cliente.objects.create(nombre='Luis', apellido='Gómez', documento='2', email='luis@example.com')
+        # 10% para todos desde 5 unidades; precio fijo de 8 para Ana
+        ReglaPrecio.objects.create(producto=self.producto, cantidad_minima=5, valor=Decimal('10'))
+        ReglaPrecio.objects.create(
+            cliente=self.cliente, producto=self.producto, tipo=ReglaPrecio.PRECIO_FIJO, valor=Decimal('8'),
+        )
+        listas_precios.recompilar()
+
+    def precio(self, cliente, cantidad):
+        pedido = (cliente.pk, self.producto.pk, cantidad)
+        return listas_precios.buscar([pedido])[pedido]
+
+    def test_escalones_por_cantidad_y_por_cliente(self):
+        self.assertEqual(self.precio(self.otro, 1), Decimal('10.00'))
+        self.assertEqual(self.precio(self.otro, 5), Decimal('9.00'))
+        self.assertEqual(self.precio(self.cliente, 1), Decimal('8.00'))
+
+    def test_solo_compila_escalas_por_cliente_donde_cambian_algo(self):
+        self.assertFalse(PrecioEfectivo.objects.filter(cliente=self.otro).exists())
+        self.assertTrue(PrecioEfectivo.objects.filter(cliente=self.cliente).exists())
+
+    def test_ignora_filas_compiladas_con_otro_precio(self):
+        # Sin recompilar: se calcula con el precio nuevo
+        Producto.objects.filter(pk=self.producto.pk).update(precio=Decimal('20.00'))
+        self.assertEqual(self.precio(self.otro, 1), Decimal('20.00'))
+        self.assertEqual(self.precio(self.otro, 5), Decimal('18.00'))
 
-# Create your tests here.
+    def test_el_lote_usa_el_precio_de_lista(self):
+        venta = self.venta('A1', 5)
+        del venta['items'][0]['precio_unitario']
+        resultado = registro.registrar_lote([venta])[0]
+        self.assertEqual(resultado['estado'], registro.CREADA)
+        self.assertEqual(Decimal(resultado['total']), Decimal('40.00'))
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import crear_venta, VentaListView, VentaDetailView
+from .views import crear_venta, registrar_lote, reservar_item, VentaListView, VentaDetailView
 
 app_name = 'ventas'
 
@@ -7,4 +7,6 @@ urlpatterns = [
     path('crear/', crear_venta, name='crear_venta'),
     path('lista/', VentaListView.as_view(), name='lista_ventas'),
     path('detalle/<int:pk>/', VentaDetailView.as_view(), name='detalle_venta'),
+    path('api/lote/', registrar_lote, name='registrar_lote'),
+    path('reservar/', reservar_item, name='reservar_item'),
 ]
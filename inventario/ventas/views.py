@@ -1,42 +1,133 @@
+import json
+import re
+import uuid
+from collections import defaultdict
+
+from django.contrib.auth.decorators import login_required, permission_required
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
+from django.views.decorators.http import require_POST
 from .models import Venta, ItemVenta
 from .forms import VentaForm, ItemVentaFormSet
-from productos.models import Producto
+from productos.models import Deposito, Producto, MovimientoStock
+from clientes import estadisticas
+from inventario import metricas
+from productos import cargador, kpis, reservas, stock
+from . import listas_precios, registro
 from django.views.generic import ListView, DetailView
+from django.db import transaction
 from django.db.models import Q
 
+def _carrito(valor):
+    """Identificador de la venta en curso para sus reservas de stock (ver productos/reservas.py)."""
+    return valor if valor and re.fullmatch(r'[0-9a-f]{32}', valor) else None
+
+
+def _completar_precios(cliente_id, items):
+    """Pone el precio de lista del cliente en las líneas sin precio, con una consulta para toda la venta."""
+    cantidades = defaultdict(int)
+    for item in items:
+        cantidades[item.producto_id] += item.cantidad
+    precios = listas_precios.buscar(
+        (cliente_id, producto_id, cantidad) for producto_id, cantidad in cantidades.items()
+    )
+    for item in items:
+        if item.precio_unitario is None:
+            item.precio_unitario = precios[cliente_id, item.producto_id, cantidades[item.producto_id]]
+
+
 def crear_venta(request):
+    carrito = _carrito(request.POST.get('carrito')) or uuid.uuid4().hex
     if request.method == 'POST':
         venta_form = VentaForm(request.POST)
         formset = ItemVentaFormSet(request.POST)
         if venta_form.is_valid() and formset.is_valid():
-            venta = venta_form.save()
-            items = formset.save(commit=False)
-            total_venta = 0
-            for item in items:
-                item.venta = venta
-                item.subtotal = item.cantidad * item.precio_unitario
-                item.save()
-
-                # Descontar stock
-                producto = item.producto
-                producto.stock -= item.cantidad
-                producto.save()
-
-                total_venta += item.subtotal
-
-            venta.total = total_venta
-            venta.save()
-            return redirect('ventas:lista_ventas')
+            try:
+                # Si falta stock de algún item se deshace la venta completa
+                with transaction.atomic():
+                    # Las reservas de esta venta se convierten en descuentos
+                    reservas.liberar_carrito(carrito)
+                    venta = venta_form.save()
+                    items = formset.save(commit=False)
+                    # Items del mismo producto comparten la instancia, así el
+                    # stock descontado por uno lo ve el siguiente
+                    productos = cargador.de(request)
+                    for item in items:
+                        item.producto = productos.registrar(item.producto)
+                    if any(item.precio_unitario is None for item in items):
+                        _completar_precios(venta.cliente_id, items)
+                    total_venta = 0
+                    movimientos = []
+                    for item in items:
+                        item.venta = venta
+                        item.subtotal = item.cantidad * item.precio_unitario
+                        item.deposito_id = item.deposito_id or Deposito.id_principal()
+                        item.save()
+
+                        # Descontar stock del depósito (condicional, nunca queda
+                        # negativo ni toma lo reservado por otras ventas en curso)
+                        stock.decrementar(
+                            item.producto, item.cantidad, respetar_reservas=True, deposito=item.deposito_id
+                        )
+                        # Cada venta queda también en el historial de movimientos
+                        movimientos.append(MovimientoStock(
+                            producto=item.producto,
+                            tipo="salida",
+                            cantidad=item.cantidad,
+                            motivo=f"Venta {venta.codigo}",
+                            usuario=request.user.username if request.user.is_authenticated else "Sistema",
+                            origen="venta",
+                            deposito_id=item.deposito_id,
+                        ))
+
+                        total_venta += item.subtotal
+
+                    MovimientoStock.objects.bulk_create(movimientos)
+                    venta.total = total_venta
+                    venta.save()
+                    kpis.registrar_venta(venta, items)
+                    estadisticas.registrar_venta(venta)
+                    metricas.registrar_venta('formulario', len(items))
+                return redirect('ventas:lista_ventas')
+            except stock.StockInsuficiente as e:
+                venta_form.add_error(None, str(e))
     else:
         venta_form = VentaForm()
         formset = ItemVentaFormSet()
     
     return render(request, 'ventas/crear_venta.html', {
         'venta_form': venta_form,
-        'formset': formset
+        'formset': formset,
+        'carrito': carrito,
     })
 
+
+@require_POST
+@login_required
+@permission_required('ventas.add_venta', raise_exception=True)
+def reservar_item(request):
+    """
+    Reserva el stock de una línea de la venta en curso: {"carrito", "producto", "cantidad"}.
+    Cantidad 0 libera la reserva. Responde el disponible o 409 si no alcanza.
+    """
+    carrito = _carrito(request.POST.get('carrito'))
+    try:
+        producto_id = int(request.POST.get('producto'))
+        cantidad = int(request.POST.get('cantidad') or 0)
+    except (TypeError, ValueError):
+        carrito = None
+    if carrito is None or cantidad < 0:
+        return JsonResponse({"error": "Datos inválidos"}, status=400)
+    try:
+        disponible = reservas.reservar(carrito, producto_id, cantidad, usuario=request.user.username)
+    except Producto.DoesNotExist:
+        return JsonResponse({"error": "No existe el producto"}, status=404)
+    except stock.StockInsuficiente:
+        return JsonResponse(
+            {"error": "No hay stock suficiente", "disponible": reservas.disponible(producto_id)}, status=409
+        )
+    return JsonResponse({"reservado": cantidad, "disponible": disponible})
+
 class VentaListView(ListView):
     model = Venta
     template_name = 'ventas/lista_ventas.html'
@@ -54,4 +145,32 @@ class VentaListView(ListView):
     
 class VentaDetailView(DetailView):
     model = Venta
-    template_name = 'ventas/detalle_venta.html'
\ No newline at end of file
+    template_name = 'ventas/detalle_venta.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Los productos de todos los items se leen con una sola consulta
+        context['items'] = cargador.de(self.request).asignar(self.object.items.select_related('deposito'))
+        return context
+
+
+@require_POST
+@login_required
+@permission_required('ventas.add_venta', raise_exception=True)
+def registrar_lote(request):
+    """
+    Recibe en JSON las ventas acumuladas por una terminal sin conexión:
+    {"ventas": [{"codigo", "cliente", "deposito" (opcional), "items": [{"producto", "cantidad", "precio_unitario" (opcional)}]}]}
+    Reenviar el mismo lote no duplica ventas: se informan como 'duplicada'.
+    """
+    try:
+        ventas = json.loads(request.body)["ventas"]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Se esperaba un JSON con la lista 'ventas'"}, status=400)
+    if not isinstance(ventas, list) or not all(isinstance(v, dict) for v in ventas):
+        return JsonResponse({"error": "'ventas' debe ser una lista de objetos"}, status=400)
+    if len(ventas) > registro.MAX_VENTAS_POR_LOTE:
+        return JsonResponse({"error": f"Máximo {registro.MAX_VENTAS_POR_LOTE} ventas por lote"}, status=400)
+
+    resultados = registro.registrar_lote(ventas, usuario=request.user.username)
+    return JsonResponse({"resultados": resultados})